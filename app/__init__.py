@@ -14,7 +14,13 @@ login_manager.login_view = 'auth.login'
 mail = Mail()
 scheduler = APScheduler()
 
-def create_app():
+def create_app(start_scheduler=True):
+    """创建Flask应用
+
+    Args:
+        start_scheduler: 是否立即参与定时任务主进程选举。多进程部署且预加载应用时，
+            应在工作进程fork之后再调用 start_scheduler_leader(app)
+    """
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(Config)
 
@@ -39,12 +45,91 @@ def create_app():
     app.register_blueprint(main)
 
     # 导入所有模型以确保它们在创建数据库表之前被定义
-    from app.models import User, ClientMapping, OperationLog, AdGuardConfig, Feedback, VerificationCode, EmailConfig, DonationConfig
+    from app.models import User, ClientMapping, ClientRequestCount, OperationLog, AdGuardConfig, Feedback, VerificationCode, EmailConfig, DonationConfig
     from app.models.query_log_analysis import QueryLogAnalysis, QueryLogExport
 
-    # 在应用上下文中创建所有数据库表
-    with app.app_context():
-        db.create_all()
+    # 在应用上下文中创建所有数据库表，并初始化单行配置缓存的版本记录
+    # （多个工作进程同时启动时通过文件锁串行执行）
+    from app.utils.file_lock import file_lock
+    from app.utils.config_cache import config_cache
+    with file_lock(os.path.join(app.instance_path, 'init.lock')):
+        with app.app_context():
+            db.create_all()
+            # 旧版本的DNS导入规则快照迁移为规则来源记录
+            from app.models.dns_import_rule import DnsImportRule
+            DnsImportRule.migrate_snapshots()
+            # 旧版本没有捐赠者汇总表，根据已有的捐赠记录生成
+            from app.models.donation_donor import DonationDonor
+            DonationDonor.ensure_built()
+            # create_all不会为已存在的表补建索引，操作日志分页索引、验证码查找索引和客户端映射的用户索引单独检查创建
+            for index in list(OperationLog.__table__.indexes) + list(VerificationCode.__table__.indexes) + \
+                    list(ClientMapping.__table__.indexes):
+                index.create(db.engine, checkfirst=True)
+        config_cache.init_app(app)
+    
+    # 初始化运行指标采集（/metrics 端点）
+    from app.utils.metrics import metrics
+    metrics.init_app(app)
+    
+    # 初始化操作日志缓冲写入
+    from app.utils.audit_log import audit_log
+    audit_log.init_app(app)
+    
+    # 初始化操作日志归档
+    from app.services.operation_log_archive_service import operation_log_archive
+    operation_log_archive.init_app(app)
+    
+    # 初始化上游服务熔断器
+    from app.utils.circuit_breaker import circuit_breakers
+    circuit_breakers.init_app(app)
+    
+    # 初始化HTTP条件缓存（ETag/304）与响应压缩
+    from app.utils.http_cache import http_cache_middleware
+    http_cache_middleware.init_app(app)
+    
+    # 初始化匿名页面整页缓存
+    from app.utils.page_cache import page_cache
+    page_cache.init_app(app)
+    
+    # 初始化请求预算追踪（REQUEST_TRACE_ENABLED开启时生效）
+    from app.utils.request_tracer import request_tracer
+    request_tracer.init_app(app)
+    
+    # 初始化实时统计（仪表板轮询和SSE推送共用的统计快照）
+    from app.services.live_stats_service import live_stats
+    live_stats.init_app(app)
+    
+    # 初始化查询日志分页缓存
+    from app.services.query_log_paging_service import query_log_pager
+    query_log_pager.init_app(app)
+    
+    # 初始化查询日志高级搜索执行器
+    from app.services.log_search_service import log_search
+    log_search.init_app(app)
+    
+    # 初始化捐赠排行榜缓存
+    from app.services.donation_leaderboard_service import donation_leaderboard
+    donation_leaderboard.init_app(app)
+    
+    # 初始化OpenList令牌管理（单飞刷新）
+    from app.services.openlist_token_service import openlist_tokens
+    openlist_tokens.init_app(app)
+    
+    # 初始化OpenList用户目录缓存
+    from app.services.openlist_directory_service import openlist_directory
+    openlist_directory.init_app(app)
+    
+    # 初始化可阻止服务目录缓存
+    from app.services.blocked_services_catalog_service import blocked_services_catalog
+    blocked_services_catalog.init_app(app)
+    
+    # 初始化管理后台用户列表
+    from app.services.user_list_service import user_list
+    user_list.init_app(app)
+    
+    # 初始化苹果描述文件生成缓存
+    from app.services.mobileconfig_service import mobileconfig_service
+    mobileconfig_service.init_app(app)
     
     # 添加全局模板上下文处理器
     @app.context_processor
@@ -62,10 +147,23 @@ def create_app():
     
     # 初始化调度器
     scheduler.init_app(app)
-    scheduler.start()
+    metrics.instrument_scheduler(scheduler)
     
     # 添加自动更新IP地址的定时任务
     from app.tasks import init_scheduler_tasks
     init_scheduler_tasks(app)
+    
+    if start_scheduler:
+        start_scheduler_leader(app)
+
+    return app
+
+
+def start_scheduler_leader(app):
+    """参与定时任务主进程选举，只有获得锁的进程会运行定时任务
 
-    return app
\ No newline at end of file
+    Args:
+        app: Flask应用实例
+    """
+    from app.utils.scheduler_leader import scheduler_leader
+    scheduler_leader.start(app, scheduler)
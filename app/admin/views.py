@@ -3,11 +3,13 @@ from flask import render_template, redirect, url_for, flash, request, jsonify, c
 from flask_login import login_required, current_user
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.audit_log import audit_log
 from app.models.user import User
 from app.models.client_mapping import ClientMapping
 from app.models.operation_log import OperationLog
 from app.models.announcement import Announcement
 from app.models.dns_import_source import DnsImportSource
+from app.models.dns_import_rule import DnsImportRule
 
 from app.models.feedback import Feedback
 from app.models.email_config import EmailConfig
@@ -17,6 +19,7 @@ from app.models.system_config import SystemConfig
 from app.models.openlist_config import OpenListConfig
 from app.models.donation_config import DonationConfig
 from app.models.donation_record import DonationRecord
+from app.models.donation_donor import DonationDonor
 from app.models.vip_config import VipConfig
 from app.models.sdk import Sdk
 from app.models.query_log_analysis import QueryLogAnalysis, QueryLogExport
@@ -24,9 +27,13 @@ from app.models.query_log_analysis import QueryLogAnalysis, QueryLogExport
 from app.services.email_service import EmailService
 
 from app.services.query_log_service import QueryLogService
+from app.services.query_log_paging_service import query_log_pager
 from app.services.ai_analysis_service import AIAnalysisService
 from app.services.adguard_service import AdGuardService
 from app.services.openlist_service import OpenListService
+from app.services.user_deletion_service import UserDeletionService
+from app.services.vip_bulk_service import VipBulkService
+from app.services.user_list_service import user_list, UserListService
 from . import admin
 from functools import wraps
 
@@ -55,37 +62,57 @@ def index():
 @login_required
 @admin_required
 def users():
-    """用户管理页面"""
-    users = User.query.all()
-    
-    # 获取每个用户的DNS请求数
-    user_stats = {}
+    """用户管理页面
+
+    页面只包含表格框架，用户数据由 /admin/api/users 按页加载。
+    """
+    return render_template('admin/users.html')
+
+@admin.route('/api/users')
+@login_required
+@admin_required
+def api_users():
+    """分页获取用户列表
+
+    查询参数：
+        q: 在用户名、邮箱、客户端名称（以及纯数字时的用户ID）中查找
+        vip: vip / normal
+        dns: zero / active
+        sort: id / username / email / created_at / client_count / request_count
+        order: asc / desc
+        cursor: 上一页返回的 next_cursor
+        per_page: 每页条数（最多200）
+
+    Returns:
+        JSON: 包含 users、next_cursor、counts_updated_at，首页还包含 total
+    """
     try:
-        adguard_service = AdGuardService()
-        stats = adguard_service.get_stats()
-        
-        if stats and 'top_clients' in stats:
-            for user in users:
-                user_request_count = 0
-                # 获取用户的客户端映射
-                user_clients = ClientMapping.query.filter_by(user_id=user.id).all()
-                user_client_names = [client.client_name for client in user_clients]
-                user_client_ids = []
-                for client in user_clients:
-                    user_client_ids.extend(client.client_ids)
-                
-                # 在top_clients中查找用户的客户端请求数
-                for client_stat in stats['top_clients']:
-                    for client_name, request_count in client_stat.items():
-                        if client_name in user_client_names or client_name in user_client_ids:
-                            user_request_count += request_count
-                
-                user_stats[user.id] = user_request_count
+        result = user_list.page(
+            search=request.args.get('q'),
+            vip=request.args.get('vip'),
+            dns=request.args.get('dns'),
+            sort=request.args.get('sort', 'id'),
+            order=request.args.get('order', 'asc'),
+            cursor=request.args.get('cursor') or None,
+            per_page=request.args.get('per_page', UserListService.DEFAULT_PER_PAGE, type=int)
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    result['success'] = True
+    return jsonify(result)
+
+@admin.route('/api/users/refresh-request-counts', methods=['POST'])
+@login_required
+@admin_required
+def refresh_user_request_counts():
+    """立即从{{ project_name }}统计数据更新客户端DNS请求数"""
+    try:
+        saved = user_list.refresh_request_counts()
     except Exception as e:
-        print(f"获取用户DNS请求统计失败: {str(e)}")
-        user_stats = {}
-    
-    return render_template('admin/users.html', users=users, user_stats=user_stats)
+        return jsonify({'success': False, 'error': f'更新DNS请求数失败：{str(e)}'}), 500
+    if saved is None:
+        return jsonify({'success': False, 'error': '获取{{ project_name }}统计数据失败'}), 502
+    return jsonify({'success': True, 'clients': saved})
 
 @admin.route('/users/<int:user_id>', methods=['DELETE'])
 @login_required
@@ -145,27 +172,14 @@ def delete_user(user_id):
         try:
             if user.openlist_username:
                 openlist_service = OpenListService()
-                # 根据用户名查找OpenList用户ID
-                users_response = openlist_service.get_users()
-                if users_response.get('success') and users_response.get('data'):
-                    openlist_users = users_response['data']
-                    target_user_id = None
-                    
-                    for openlist_user in openlist_users:
-                        if openlist_user.get('username') == user.openlist_username:
-                            target_user_id = openlist_user.get('id')
-                            break
-                    
-                    if target_user_id:
-                        delete_response = openlist_service.delete_user(target_user_id)
-                        if delete_response.get('success'):
-                            print(f"已删除用户 {user.username} 的OpenList账户: {user.openlist_username}")
-                        else:
-                            client_delete_errors.append(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
-                    else:
-                        client_delete_errors.append(f"未找到OpenList用户: {user.openlist_username}")
+                # 通过用户目录缓存按用户名查找OpenList用户ID并删除
+                delete_response = openlist_service.delete_user_by_username(user.openlist_username)
+                if delete_response.get('success'):
+                    print(f"已删除用户 {user.username} 的OpenList账户: {user.openlist_username}")
+                elif delete_response.get('not_found'):
+                    client_delete_errors.append(f"未找到OpenList用户: {user.openlist_username}")
                 else:
-                    client_delete_errors.append(f"获取OpenList用户列表失败")
+                    client_delete_errors.append(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
         except Exception as e:
             client_delete_errors.append(f"删除OpenList账户时发生错误: {str(e)}")
         
@@ -265,29 +279,16 @@ def delete_single_user(user_id):
         try:
             if user.openlist_username:
                 openlist_service = OpenListService()
-                # 根据用户名查找OpenList用户ID
-                users_response = openlist_service.get_users()
-                if users_response.get('success') and users_response.get('data'):
-                    openlist_users = users_response['data']
-                    target_user_id = None
-                    
-                    for openlist_user in openlist_users:
-                        if openlist_user.get('username') == user.openlist_username:
-                            target_user_id = openlist_user.get('id')
-                            break
-                    
-                    if target_user_id:
-                        delete_response = openlist_service.delete_user(target_user_id)
-                        if delete_response.get('success'):
-                            print(f"已删除用户 {user.username} 的OpenList账户: {user.openlist_username}")
-                        else:
-                            client_delete_errors.append(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
-                    else:
-                        client_delete_errors.append(f"未找到OpenList用户: {user.openlist_username}")
+                # 通过用户目录缓存按用户名查找OpenList用户ID并删除
+                delete_response = openlist_service.delete_user_by_username(user.openlist_username)
+                if delete_response.get('success'):
+                    print(f"已删除用户 {user.username} 的OpenList账户: {user.openlist_username}")
+                elif delete_response.get('not_found'):
+                    errors.append(f"未找到OpenList用户: {user.openlist_username}")
                 else:
-                    client_delete_errors.append(f"获取OpenList用户列表失败")
+                    errors.append(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
         except Exception as e:
-            client_delete_errors.append(f"删除OpenList账户时发生错误: {str(e)}")
+            errors.append(f"删除OpenList账户时发生错误: {str(e)}")
         
         # 处理用户的反馈记录
         from app.models.feedback import Feedback
@@ -300,14 +301,14 @@ def delete_single_user(user_id):
         db.session.commit()
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='delete_user',
             target_type='User',
             target_id=str(user_id),
-            details=f'删除用户：{user.username}'
+            details=f'删除用户：{user.username}',
+            sync=True
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -327,9 +328,9 @@ def delete_single_user(user_id):
 @login_required
 @admin_required
 def bulk_delete_users():
-    """批量删除用户（逐个删除方式）
+    """批量删除用户（逐个结果方式）
     
-    逐个删除选中的用户，提供详细的删除进度和结果
+    批量删除选中的用户，并返回每个用户的删除结果
     """
     try:
         data = request.get_json()
@@ -342,21 +343,10 @@ def bulk_delete_users():
         if not user_ids:
             return jsonify({'success': False, 'message': '请选择要删除的用户'}), 400
         
-        # 获取选中的用户
-        users = User.query.filter(User.id.in_(user_ids)).all()
-        if not users:
-            return jsonify({'success': False, 'message': '未找到选中的用户'}), 400
-        
         # 检查是否包含当前用户或管理员
-        invalid_users = []
-        valid_users = []
-        for user in users:
-            if user.id == current_user.id:
-                invalid_users.append(f'用户{user.username}：不能删除当前登录的管理员账号')
-            elif user.is_admin:
-                invalid_users.append(f'用户{user.username}：不能删除其他管理员账号')
-            else:
-                valid_users.append(user)
+        valid_users, invalid_users = UserDeletionService.partition_users(user_ids, current_user.id)
+        if not valid_users and not invalid_users:
+            return jsonify({'success': False, 'message': '未找到选中的用户'}), 400
         
         if invalid_users and not valid_users:
             return jsonify({
@@ -364,111 +354,25 @@ def bulk_delete_users():
                 'message': '包含无法删除的用户：\n' + '\n'.join(invalid_users)
             }), 400
         
-        # 初始化统计
-        success_count = 0
-        failed_count = 0
-        errors = []
-        results = []
-        
         # 如果有无效用户，添加到错误列表
-        if invalid_users:
-            errors.extend(invalid_users)
-            failed_count += len(invalid_users)
+        errors = list(invalid_users)
+        failed_count = len(invalid_users)
         
-        adguard = AdGuardService()
+        result = UserDeletionService().delete_users(valid_users, current_user.id, log_suffix='（批量删除）')
+        success_count = result['success_count']
         
-        # 逐个删除用户
-        for i, user in enumerate(valid_users, 1):
-            user_result = {
-                'username': user.username,
-                'success': False,
-                'errors': []
-            }
-            
-            try:
-                client_delete_errors = []
-                
-                # 删除用户的{{ project_name }}客户端
-                for mapping in user.client_mappings:
-                    try:
-                        adguard.delete_client(mapping.client_name)
-                    except Exception as e:
-                        client_delete_errors.append(f"客户端 {mapping.client_name} 删除失败：{str(e)}")
-                
-                # 从{{ project_name }}的允许客户端列表中移除用户的客户端ID
-                try:
-                    access_list = adguard._make_request('GET', '/access/list')
-                    allowed_clients = access_list.get('allowed_clients', [])
-                    
-                    clients_to_remove = []
-                    for mapping in user.client_mappings:
-                        for client_id in mapping.client_ids:
-                            if client_id in allowed_clients:
-                                allowed_clients.remove(client_id)
-                                clients_to_remove.append(client_id)
-                    
-                    if clients_to_remove:
-                        access_data = {
-                            'allowed_clients': allowed_clients,
-                            'disallowed_clients': access_list.get('disallowed_clients', []),
-                            'blocked_hosts': access_list.get('blocked_hosts', [])
-                        }
-                        adguard._make_request('POST', '/access/set', json=access_data)
-                except Exception as e:
-                    client_delete_errors.append(f"从允许列表移除客户端ID失败：{str(e)}")
-                
-                # 删除所有关联的客户端映射记录
-                for mapping in user.client_mappings:
-                    db.session.delete(mapping)
-                
-                # 处理用户的反馈记录
-                from app.models.feedback import Feedback
-                feedbacks = Feedback.query.filter_by(user_id=user.id).all()
-                for feedback in feedbacks:
-                    db.session.delete(feedback)
-                
-                # 删除用户记录
-                db.session.delete(user)
-                db.session.commit()  # 每个用户单独提交
-                
-                success_count += 1
-                user_result['success'] = True
-                
-                # 如果有客户端删除失败，记录警告
-                if client_delete_errors:
-                    user_result['errors'] = client_delete_errors
-                    errors.extend([f'用户{user.username}：' + error for error in client_delete_errors])
-                
-                # 记录单个用户的操作日志
-                log = OperationLog(
-                    user_id=current_user.id,
-                    operation_type='delete_user',
-                    target_type='User',
-                    target_id=str(user.id),
-                    details=f'删除用户：{user.username}（批量删除第{i}个）'
-                )
-                db.session.add(log)
-                db.session.commit()
-                
-            except Exception as e:
-                db.session.rollback()  # 回滚当前用户的操作
-                failed_count += 1
-                error_msg = f'用户{user.username}删除失败：{str(e)}'
-                errors.append(error_msg)
-                user_result['errors'] = [str(e)]
-                # 继续处理下一个用户
-            
-            results.append(user_result)
+        for user_result in result['results']:
+            errors.extend([f'用户{user_result["username"]}：' + error for error in user_result['errors']])
         
         # 记录批量操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='bulk_delete_users',
             target_type='User',
             target_id='bulk',
-            details=f'批量删除用户：成功{success_count}个，失败{failed_count}个'
+            details=f'批量删除用户：成功{success_count}个，失败{failed_count}个',
+            sync=True
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -477,7 +381,7 @@ def bulk_delete_users():
             'success_count': success_count,
             'failed_count': failed_count,
             'errors': errors,
-            'results': results,
+            'results': result['results'],
             'total_processed': len(valid_users)
         })
         
@@ -495,7 +399,7 @@ def bulk_delete_users():
 def bulk_delete_users_optimized():
     """批量删除用户（优化版本）
     
-    使用批量操作优化的删除方式，提供更好的性能
+    使用集合查询和批量DELETE语句删除用户，可通过job_id查询删除进度
     """
     try:
         # 验证AJAX请求
@@ -507,26 +411,16 @@ def bulk_delete_users_optimized():
             return jsonify({'success': False, 'message': '请求数据格式错误'}), 400
         
         user_ids = data.get('user_ids', [])
+        job_id = data.get('job_id')
         
         # 验证必填字段
         if not user_ids:
             return jsonify({'success': False, 'message': '请选择要删除的用户'}), 400
         
-        # 获取选中的用户
-        users = User.query.filter(User.id.in_(user_ids)).all()
-        if not users:
-            return jsonify({'success': False, 'message': '未找到选中的用户'}), 400
-        
         # 检查是否包含当前用户或管理员
-        invalid_users = []
-        valid_users = []
-        for user in users:
-            if user.id == current_user.id:
-                invalid_users.append(f'用户{user.username}：不能删除当前登录的管理员账号')
-            elif user.is_admin:
-                invalid_users.append(f'用户{user.username}：不能删除其他管理员账号')
-            else:
-                valid_users.append(user)
+        valid_users, invalid_users = UserDeletionService.partition_users(user_ids, current_user.id)
+        if not valid_users and not invalid_users:
+            return jsonify({'success': False, 'message': '未找到选中的用户'}), 400
         
         if invalid_users and not valid_users:
             return jsonify({
@@ -534,104 +428,32 @@ def bulk_delete_users_optimized():
                 'message': '包含无法删除的用户：\n' + '\n'.join(invalid_users)
             }), 400
         
-        # 初始化统计
-        success_count = 0
-        failed_count = 0
-        errors = []
-        
-        # 如果有无效用户，添加到错误列表
-        if invalid_users:
-            errors.extend(invalid_users)
-            failed_count += len(invalid_users)
-        
-        if not valid_users:
-            return jsonify({
-                'success': False,
-                'message': '没有可删除的有效用户',
-                'errors': errors
-            }), 400
-        
-        adguard = AdGuardService()
-        
-        # 收集所有需要删除的客户端名称
-        all_client_names = []
-        for user in valid_users:
-            for mapping in user.client_mappings:
-                all_client_names.append(mapping.client_name)
-        
-        # 批量删除{{ project_name }}客户端
-        client_delete_errors = []
-        if all_client_names:
-            try:
-                # 使用批量删除API
-                result = adguard.batch_delete_clients(all_client_names, skip_missing=True)
-                if result.get('errors'):
-                    client_delete_errors.extend(result['errors'])
-            except Exception as e:
-                client_delete_errors.append(f"批量删除AdGuard客户端失败：{str(e)}")
-        
-        # 从{{ project_name }}的允许客户端列表中移除所有客户端ID
-        try:
-            access_list = adguard._make_request('GET', '/access/list')
-            allowed_clients = access_list.get('allowed_clients', [])
-            
-            clients_to_remove = []
-            for user in valid_users:
-                for mapping in user.client_mappings:
-                    for client_id in mapping.client_ids:
-                        if client_id in allowed_clients:
-                            allowed_clients.remove(client_id)
-                            clients_to_remove.append(client_id)
-            
-            if clients_to_remove:
-                access_data = {
-                    'allowed_clients': allowed_clients,
-                    'disallowed_clients': access_list.get('disallowed_clients', []),
-                    'blocked_hosts': access_list.get('blocked_hosts', [])
-                }
-                adguard._make_request('POST', '/access/set', json=access_data)
-        except Exception as e:
-            client_delete_errors.append(f"从允许列表移除客户端ID失败：{str(e)}")
+        progress_callback = UserDeletionService.start_progress(job_id, len(valid_users)) if job_id else None
         
-        # 批量删除数据库记录
         try:
-            # 删除所有关联的客户端映射记录
-            for user in valid_users:
-                for mapping in user.client_mappings:
-                    db.session.delete(mapping)
-            
-            # 删除所有关联的反馈记录
-            from app.models.feedback import Feedback
-            for user in valid_users:
-                feedbacks = Feedback.query.filter_by(user_id=user.id).all()
-                for feedback in feedbacks:
-                    db.session.delete(feedback)
-            
-            # 删除用户记录
-            for user in valid_users:
-                db.session.delete(user)
-            
-            # 提交所有更改
-            db.session.commit()
-            success_count = len(valid_users)
-            
-            # 提交所有更改
-            db.session.commit()
-            success_count = len(valid_users)
-            
-            # 返回成功结果
-            return jsonify({
-                'success': True,
-                'message': f'成功删除 {success_count} 个用户',
-                'client_delete_errors': client_delete_errors if client_delete_errors else None
-            })
-            
+            result = UserDeletionService().delete_users(
+                valid_users,
+                current_user.id,
+                log_suffix='（批量删除）',
+                progress_callback=progress_callback
+            )
         except Exception as e:
-            db.session.rollback()
             return jsonify({
                 'success': False,
                 'message': f'删除数据库记录失败：{str(e)}'
             }), 500
+        
+        success_count = result['success_count']
+        client_delete_errors = result['client_errors']
+        
+        return jsonify({
+            'success': True,
+            'message': f'成功删除 {success_count} 个用户',
+            'success_count': success_count,
+            'failed_count': len(invalid_users),
+            'errors': invalid_users,
+            'client_delete_errors': client_delete_errors if client_delete_errors else None
+        })
     
     except Exception as e:
         db.session.rollback()
@@ -641,6 +463,15 @@ def bulk_delete_users_optimized():
         }), 500
 
 
+@admin.route('/bulk-delete-users/progress/<job_id>')
+@login_required
+@admin_required
+def bulk_delete_users_progress(job_id):
+    """查询批量删除用户的进度"""
+    progress = UserDeletionService.get_progress(job_id)
+    if progress is None:
+        return jsonify({'success': False, 'message': '未找到删除任务'}), 404
+    return jsonify({'success': True, **progress})
 
 
 @admin.route('/adguard-clients')
@@ -651,8 +482,20 @@ def adguard_clients():
     try:
         adguard_service = AdGuardService()
         
-        # 获取所有客户端信息
-        clients_data = adguard_service._make_request('GET', '/clients')
+        # 并发获取所有客户端信息和允许的客户端ID列表
+        results = adguard_service.fetch_concurrently({
+            'clients': ('GET', '/clients'),
+            'access_list': ('GET', '/access/list')
+        })
+        clients_data = results['clients']
+        if isinstance(clients_data, Exception):
+            raise clients_data
+        
+        access_list = results['access_list']
+        if isinstance(access_list, Exception):
+            allowed_client_ids = set()
+        else:
+            allowed_client_ids = set(access_list.get('allowed_clients', []))
         
         # 获取所有用户的客户端映射
         all_user_mappings = ClientMapping.query.all()
@@ -661,13 +504,6 @@ def adguard_clients():
         for mapping in all_user_mappings:
             user_client_ids.update(mapping.client_ids)
         
-        # 获取允许的客户端ID列表
-        try:
-            access_list = adguard_service._make_request('GET', '/access/list')
-            allowed_client_ids = set(access_list.get('allowed_clients', []))
-        except Exception:
-            allowed_client_ids = set()
-        
         # 格式化客户端数据并进行匹配
         all_clients = []
         matched_clients = set()
@@ -805,14 +641,13 @@ def delete_unmatched_clients():
         
         # 记录操作日志
         try:
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='delete_unmatched_clients',
                 target_type='AdGuard',
                 target_id='unmatched',
                 details=f'删除未匹配项：{deleted_clients}个客户端，{deleted_allowed_ids}个允许ID'
             )
-            db.session.add(log)
             db.session.commit()
         except Exception as e:
             # 日志记录失败不影响主要操作
@@ -834,14 +669,13 @@ def delete_unmatched_clients():
         
         # 记录批量操作日志
         try:
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='bulk_delete_users_optimized',
                 target_type='User',
                 target_id='bulk',
                 details=f'批量删除用户（优化版）：成功{success_count}个，失败{failed_count}个'
             )
-            db.session.add(log)
             db.session.commit()
         except Exception as e:
             # 日志记录失败不影响主要操作
@@ -879,97 +713,27 @@ def delete_user_progressive(user_id):
     try:
         # 获取用户
         user = User.query.get_or_404(user_id)
+        username = user.username
         
         # 检查是否为当前用户或管理员
         if user.id == current_user.id:
             return jsonify({
                 'success': False, 
                 'message': '不能删除当前登录的管理员账号',
-                'username': user.username
+                'username': username
             }), 200  # 改为200状态码，避免前端认为是服务器错误
         elif user.is_admin:
             return jsonify({
                 'success': False, 
-                'message': f'不能删除管理员账号：{user.username}',
-                'username': user.username
+                'message': f'不能删除管理员账号：{username}',
+                'username': username
             }), 200  # 改为200状态码，避免前端认为是服务器错误
         
-        user_result = {
-            'username': user.username,
-            'success': False,
-            'errors': []
-        }
-        
-        client_delete_errors = []
-        
-        # 优化{{ project_name }}操作，增加超时处理
-        try:
-            adguard = AdGuardService()
-            
-            # 删除用户的{{ project_name }}客户端（增加超时处理）
-            for mapping in user.client_mappings:
-                try:
-                    # 设置较短的超时时间，避免长时间等待
-                    adguard.delete_client(mapping.client_name)
-                except Exception as e:
-                    # 记录错误但不阻止删除流程
-                    client_delete_errors.append(f"客户端 {mapping.client_name} 删除失败：{str(e)}")
-            
-            # 从{{ project_name }}的允许客户端列表中移除用户的客户端ID
-            try:
-                access_list = adguard._make_request('GET', '/access/list')
-                allowed_clients = access_list.get('allowed_clients', [])
-                
-                clients_to_remove = []
-                for mapping in user.client_mappings:
-                    for client_id in mapping.client_ids:
-                        if client_id in allowed_clients:
-                            allowed_clients.remove(client_id)
-                            clients_to_remove.append(client_id)
-                
-                if clients_to_remove:
-                    access_data = {
-                        'allowed_clients': allowed_clients,
-                        'disallowed_clients': access_list.get('disallowed_clients', []),
-                        'blocked_hosts': access_list.get('blocked_hosts', [])
-                    }
-                    adguard._make_request('POST', '/access/set', json=access_data)
-            except Exception as e:
-                client_delete_errors.append(f"从允许列表移除客户端ID失败：{str(e)}")
-        except Exception as e:
-            # {{ project_name }}服务完全不可用时，记录错误但继续删除用户
-            client_delete_errors.append(f"{{ project_name }}服务不可用：{str(e)}")
+        result = UserDeletionService().delete_users([(user.id, username)], current_user.id)
         
-        # 删除所有关联的客户端映射记录
-        for mapping in user.client_mappings:
-            db.session.delete(mapping)
-        
-        # 处理用户的反馈记录
-        from app.models.feedback import Feedback
-        feedbacks = Feedback.query.filter_by(user_id=user.id).all()
-        for feedback in feedbacks:
-            db.session.delete(feedback)
-        
-        # 删除用户记录
-        db.session.delete(user)
-        db.session.commit()
-        
-        user_result['success'] = True
-        
-        # 如果有客户端删除失败，记录警告
-        if client_delete_errors:
-            user_result['errors'] = client_delete_errors
-        
-        # 记录操作日志
-        log = OperationLog(
-            user_id=current_user.id,
-            operation_type='delete_user',
-            target_type='User',
-            target_id=str(user.id),
-            details=f'删除用户：{user.username}'
-        )
-        db.session.add(log)
-        db.session.commit()
+        user_result = result['results'][0]
+        if result['client_errors']:
+            user_result['errors'] = result['client_errors']
         
         return jsonify(user_result)
         
@@ -978,7 +742,7 @@ def delete_user_progressive(user_id):
         return jsonify({
             'success': False, 
             'message': f'删除用户失败：{str(e)}',
-            'username': user.username if 'user' in locals() else 'Unknown',
+            'username': username if 'username' in locals() else 'Unknown',
             'errors': [str(e)]
         }), 200  # 改为200状态码，让前端正常处理错误
 
@@ -1016,14 +780,13 @@ def update_client(user_id, mapping_id):
         mapping.client_ids = client_ids
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='update_client',
             target_type='client',
             target_id=mapping.client_name,
             details=f'更新用户{user.username}的客户端{mapping.client_name}配置'
         )
-        db.session.add(log)
         
         db.session.commit()
         return jsonify({'message': '客户端更新成功'})
@@ -1094,14 +857,13 @@ def admin_delete_client(mapping_id):
         db.session.delete(mapping)
         
         # 记录操作日志
-        operation_log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='DELETE',
             target_type='CLIENT',
             target_id=client_name,
             details=f'管理员删除用户 {user.username} 的客户端: {client_name}'
         )
-        db.session.add(operation_log)
         db.session.commit()
         
         print(f"管理员 {current_user.username} 成功删除用户 {user.username} 的客户端: {client_name}")
@@ -1124,13 +886,51 @@ def admin_delete_client(mapping_id):
 @login_required
 @admin_required
 def operation_logs():
-    """操作日志页面"""
-    page = request.args.get('page', 1, type=int)
-    pagination = OperationLog.query.order_by(OperationLog.created_at.desc()).paginate(
-        page=page, per_page=current_app.config['ITEMS_PER_PAGE'], error_out=False
-    )
-    logs = pagination.items
-    return render_template('admin/operation_logs.html', logs=logs, pagination=pagination)
+    """操作日志页面
+
+    按 (created_at, id) 键集分页，翻页不再对全表计数和OFFSET扫描；总数为估算值。
+    """
+    from app.services.operation_log_archive_service import operation_log_archive
+
+    # 先写入本进程缓冲区中的日志，使刚执行的操作能够显示出来
+    audit_log.flush()
+    try:
+        result = operation_log_archive.page(
+            current_app.config['ITEMS_PER_PAGE'],
+            before=request.args.get('before'),
+            after=request.args.get('after')
+        )
+    except ValueError:
+        return redirect(url_for('admin.operation_logs'))
+    return render_template('admin/operation_logs.html',
+                           logs=result['logs'],
+                           next_cursor=result['next_cursor'],
+                           prev_cursor=result['prev_cursor'],
+                           approximate_total=operation_log_archive.approximate_count(),
+                           retention_days=operation_log_archive.retention_days)
+
+@admin.route('/operation-logs/archive')
+@login_required
+@admin_required
+def operation_log_archive_search():
+    """搜索已归档的操作日志"""
+    from app.services.operation_log_archive_service import operation_log_archive
+
+    filters = {
+        'keyword': request.args.get('keyword', '').strip(),
+        'operation_type': request.args.get('operation_type', '').strip(),
+        'target_type': request.args.get('target_type', '').strip(),
+        'username': request.args.get('username', '').strip(),
+        'month_from': request.args.get('month_from', '').strip(),
+        'month_to': request.args.get('month_to', '').strip()
+    }
+    result = None
+    if request.args.get('search'):
+        result = operation_log_archive.search(**{key: value or None for key, value in filters.items()})
+    return render_template('admin/operation_log_archive.html',
+                           archives=operation_log_archive.list_archives(),
+                           filters=filters,
+                           result=result)
 
 @admin.route('/email-config', methods=['GET', 'POST'])
 @login_required
@@ -1320,14 +1120,14 @@ def update_adguard_config():
             return jsonify({'error': '无法连接到AdGuard Home服务器，请检查URL、端口和认证信息是否正确'}), 400
             
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='update_config',
             target_type='adguard_config',
             target_id='1',
-            details=f'更新AdGuard Home配置：{api_base_url}'
+            details=f'更新AdGuard Home配置：{api_base_url}',
+            sync=True
         )
-        db.session.add(log)
         
         db.session.commit()
         return jsonify({
@@ -1347,9 +1147,8 @@ def update_adguard_config():
 def query_log():
     """查询 AdGuard Home 的日志
     
-    实现分页功能，每页显示50条记录
+    实现分页功能，每页显示50条记录；前后页游标保存在会话中，页面由分页服务缓存和预取
     """
-    adguard_service = AdGuardService()
     page = request.args.get('page', 1, type=int)
     older_than = request.args.get('older_than')
     
@@ -1357,32 +1156,8 @@ def query_log():
     per_page = 50
     
     try:
-        # 获取日志数据，限制为每页记录数
-        logs_data = adguard_service.get_query_log(older_than=older_than, limit=per_page)
-        logs = logs_data.get('data', [])
-        
-        # 计算分页信息
-        total_logs = len(logs)
-        has_next = total_logs == per_page  # 如果返回的记录数等于限制数，说明可能还有更多记录
-        
-        # 获取下一页的older_than参数
-        next_older_than = None
-        if has_next and logs:
-            next_older_than = logs[-1].get('time')
-        
-        # 获取上一页的older_than参数（这里简化处理，实际应该维护一个页面历史）
-        prev_older_than = request.args.get('prev_older_than')
-        
-        print(f"传递给模板的日志数据: {logs[:5]}") # 打印前5条日志以供调试
-        
-        return render_template('admin/query_log.html', 
-                             logs=logs, 
-                             page=page,
-                             has_next=has_next,
-                             has_prev=page > 1,
-                             next_older_than=next_older_than,
-                             prev_older_than=prev_older_than,
-                             per_page=per_page)
+        result = query_log_pager.get_page(page, older_than, per_page)
+        return render_template('admin/query_log.html', **result)
     except Exception as e:
         flash(f'获取查询日志失败: {str(e)}', 'error')
         return render_template('admin/query_log.html', 
@@ -1443,7 +1218,6 @@ def query_log_api():
     
     返回 JSON 格式的日志数据，用于 AJAX 刷新
     """
-    adguard_service = AdGuardService()
     page = request.args.get('page', 1, type=int)
     older_than = request.args.get('older_than')
     
@@ -1451,32 +1225,8 @@ def query_log_api():
     per_page = 50
     
     try:
-        # 获取日志数据，限制为每页记录数
-        logs_data = adguard_service.get_query_log(older_than=older_than, limit=per_page)
-        logs = logs_data.get('data', [])
-        
-        # 计算分页信息
-        total_logs = len(logs)
-        has_next = total_logs == per_page  # 如果返回的记录数等于限制数，说明可能还有更多记录
-        
-        # 获取下一页的older_than参数
-        next_older_than = None
-        if has_next and logs:
-            next_older_than = logs[-1].get('time')
-        
-        # 获取上一页的older_than参数
-        prev_older_than = request.args.get('prev_older_than')
-        
-        return jsonify({
-            'success': True,
-            'logs': logs,
-            'page': page,
-            'has_next': has_next,
-            'has_prev': page > 1,
-            'next_older_than': next_older_than,
-            'prev_older_than': prev_older_than,
-            'per_page': per_page
-        })
+        result = query_log_pager.get_page(page, older_than, per_page)
+        return jsonify({'success': True, **result})
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1744,14 +1494,13 @@ def sdk_generate():
             db.session.commit()
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='generate_sdk',
                 target_type='SDK',
                 target_id='batch',
                 details=f'生成{count}个SDK充值码，每个{vip_days}天VIP'
             )
-            db.session.add(log)
             db.session.commit()
             
             # 返回结果
@@ -1940,14 +1689,13 @@ def sdk_delete(sdk_id):
             })
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='delete_sdk',
             target_type='SDK',
             target_id=str(sdk_id),
             details=f'删除SDK充值码：{sdk.sdk_code}'
         )
-        db.session.add(log)
         
         db.session.delete(sdk)
         db.session.commit()
@@ -2003,14 +1751,13 @@ def sdk_export():
         response.headers['Content-Disposition'] = f'attachment; filename=sdk_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='export_sdk',
             target_type='SDK',
             target_id='export',
             details=f'导出{len(sdks)}个未使用的SDK充值码'
         )
-        db.session.add(log)
         db.session.commit()
         
         return response
@@ -2068,14 +1815,14 @@ def openlist_config():
             db.session.commit()
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_openlist_config',
                 target_type='OPENLIST',
                 target_id='openlist_config',
-                details=f'更新OpenList配置：启用={enabled}, 服务器={server_url}'
+                details=f'更新OpenList配置：启用={enabled}, 服务器={server_url}',
+                sync=True
             )
-            db.session.add(log)
             db.session.commit()
             
         except Exception as e:
@@ -2129,14 +1876,14 @@ def manage_openlist_config():
             db.session.commit()
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_openlist_config_api',
                 target_type='OPENLIST',
                 target_id='openlist_config',
-                details='通过API更新OpenList配置'
+                details='通过API更新OpenList配置',
+                sync=True
             )
-            db.session.add(log)
             db.session.commit()
             
             return jsonify({
@@ -2169,14 +1916,13 @@ def test_openlist_connection():
         result = service.test_connection()
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='test_openlist_connection',
             target_type='OPENLIST',
             target_id='openlist_config',
             details=f'测试OpenList连接: {result["message"]}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify(result)
@@ -2204,14 +1950,13 @@ def sync_openlist_data():
         result = service.sync_data()
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='sync_openlist_data',
             target_type='OPENLIST',
             target_id='openlist_config',
             details=f'同步数据到OpenList: {result["message"]}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify(result)
@@ -2300,14 +2045,13 @@ def edit_user_vip():
         db.session.commit()
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='UPDATE',
             target_type='USER',
             target_id=str(user.id),
             details=f"修改用户 {user.username} 的VIP状态: {old_vip_status} -> {new_vip_status}"
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -2352,24 +2096,17 @@ def bulk_vip_upgrade():
                 'message': 'VIP天数不能为空'
             }), 400
             
-        # 验证用户标识并获取用户信息（支持ID和用户名）
-        valid_users = []
-        invalid_users = []
-        
-        for identifier in user_identifiers:
-            user = None
-            # 首先尝试作为ID查询
-            if str(identifier).isdigit():
-                user = User.query.get(int(identifier))
-            
-            # 如果ID查询失败，尝试作为用户名查询
-            if not user:
-                user = User.query.filter_by(username=str(identifier)).first()
+        try:
+            vip_days = int(vip_days)
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'VIP天数格式错误'
+            }), 400
             
-            if user:
-                valid_users.append(user)
-            else:
-                invalid_users.append(identifier)
+        # 验证用户标识并获取用户信息（支持ID和用户名，两次IN查询完成）
+        vip_bulk = VipBulkService()
+        valid_users, invalid_users = vip_bulk.resolve_users(user_identifiers)
         
         if not valid_users:
             return jsonify({
@@ -2377,107 +2114,37 @@ def bulk_vip_upgrade():
                 'message': '没有找到有效的用户'
             }), 400
             
-        # 计算新的VIP到期时间
-        from datetime import datetime, timedelta
-        now = datetime.now()
-        
-        preview_data = {
-            'valid_users': [],
-            'invalid_users': invalid_users,
-            'summary': ''
-        }
-        
-        success_count = 0
-        failed_count = 0
-        
-        for user in valid_users:
-            try:
-                # 计算新的到期时间
-                if vip_days == -1:
-                    # 永久VIP
-                    new_expire_time = datetime(2099, 12, 31, 23, 59, 59)
-                    new_expire_str = '永久VIP'
-                elif vip_days == 0:
-                    # 取消VIP
-                    new_expire_time = None
-                    new_expire_str = '取消VIP'
-                else:
-                    # 设置指定天数的VIP
-                    if extend_existing and user.vip_expire_time and user.vip_expire_time > now:
-                        # 在现有VIP基础上延长
-                        base_time = user.vip_expire_time
-                    else:
-                        # 从现在开始计算
-                        base_time = now
-                    
-                    new_expire_time = base_time + timedelta(days=vip_days)
-                    new_expire_str = new_expire_time.strftime('%Y-%m-%d %H:%M:%S')
-                
-                # 添加到预览数据
-                user_preview = {
-                    'id': user.id,
-                    'username': user.username,
-                    'current_vip_expire': user.vip_expire_time.strftime('%Y-%m-%d %H:%M:%S') if user.vip_expire_time else None,
-                    'new_expire_time': new_expire_str
-                }
-                preview_data['valid_users'].append(user_preview)
-                
-                # 如果不是预览模式，执行实际更新
-                if not preview_only:
-                    old_vip_status = f"VIP到期时间: {user.vip_expire_time}" if user.vip_expire_time else "非VIP用户"
-                    
-                    if new_expire_time:
-                        user.vip_expire_time = new_expire_time
-                        user.is_vip_user = True
-                    else:
-                        user.vip_expire_time = None
-                        user.is_vip_user = False
-                    
-                    # 记录操作日志
-                    log = OperationLog(
-                        user_id=current_user.id,
-                        operation_type='BULK_UPDATE',
-                        target_type='USER',
-                        target_id=str(user.id),
-                        details=f"批量修改用户 {user.username} 的VIP状态: {old_vip_status} -> {new_expire_str}"
-                    )
-                    db.session.add(log)
-                    success_count += 1
-                    
-            except Exception as e:
-                current_app.logger.error(f"处理用户 {user.id} 时出错: {str(e)}")
-                failed_count += 1
-                continue
-        
-        # 生成操作摘要
-        if vip_days == -1:
-            operation_desc = "设为永久VIP"
-        elif vip_days == 0:
-            operation_desc = "取消VIP状态"
-        else:
-            if extend_existing:
-                operation_desc = f"延长VIP {vip_days} 天（在现有基础上）"
-            else:
-                operation_desc = f"设置VIP {vip_days} 天（从现在开始）"
-        
-        preview_data['summary'] = f"将为 {len(valid_users)} 个用户{operation_desc}"
+        # 在内存中计算新的VIP到期时间，预览和执行使用同一份结果
+        changes = vip_bulk.plan(valid_users, vip_days, extend_existing)
         
         if preview_only:
             return jsonify({
                 'success': True,
-                'preview': preview_data
-            })
-        else:
-            # 提交数据库更改
-            db.session.commit()
-            
-            return jsonify({
-                'success': True,
-                'message': f'批量VIP升级完成',
-                'success_count': success_count,
-                'failed_count': failed_count,
-                'total_count': len(valid_users)
+                'preview': {
+                    'valid_users': [
+                        {
+                            'id': change['id'],
+                            'username': change['username'],
+                            'current_vip_expire': change['old_expire_time'].strftime('%Y-%m-%d %H:%M:%S') if change['old_expire_time'] else None,
+                            'new_expire_time': vip_bulk.format_expire_time(change['new_expire_time'], vip_days)
+                        }
+                        for change in changes
+                    ],
+                    'invalid_users': invalid_users,
+                    'summary': f"将为 {len(valid_users)} 个用户{vip_bulk.describe_operation(vip_days, extend_existing)}"
+                }
             })
+        
+        # 批量UPDATE和批量插入操作日志在同一事务中提交
+        success_count = vip_bulk.apply(changes, vip_days, current_user.id)
+        
+        return jsonify({
+            'success': True,
+            'message': f'批量VIP升级完成',
+            'success_count': success_count,
+            'failed_count': 0,
+            'total_count': len(valid_users)
+        })
             
     except Exception as e:
         db.session.rollback()
@@ -2616,14 +2283,13 @@ def add_vip_filter_rule():
             }), 500
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='add_vip_filter_rule',
             target_type='FilterRule',
             target_id=rule,
             details=f'添加VIP专属过滤规则：{rule}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -2709,14 +2375,13 @@ def update_vip_filter_rule(rule_index):
             }), 500
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='update_vip_filter_rule',
             target_type='FilterRule',
             target_id=rule,
             details=f'更新VIP专属过滤规则：{rule}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -2785,14 +2450,13 @@ def delete_vip_filter_rule(rule_index):
             }), 500
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='delete_vip_filter_rule',
             target_type='FilterRule',
             target_id=str(rule_index),
             details=f'删除VIP专属过滤规则：{rule_to_delete}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -2843,14 +2507,13 @@ def vip_config():
             db.session.commit()
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_vip_config',
                 target_type='SYSTEM',
                 target_id='vip_config',
                 details=f'更新VIP配置：价格={vip_price}，时长={vip_duration_days}天，最小金额={min_vip_amount}，启用={enabled}'
             )
-            db.session.add(log)
             db.session.commit()
             
             flash('VIP配置已更新', 'success')
@@ -2898,16 +2561,13 @@ def send_bulk_email():
             return jsonify({'success': False, 'message': '选中的用户中没有设置邮箱的用户'}), 400
         
         # 记录操作日志
-        operation_log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='bulk_email',
-             target_type='User',
-             target_id='bulk_email',
-             details=f'批量发送邮件给 {len(users_with_email)} 个用户，主题：{subject}',
-            
-            created_at=beijing_time()
+            target_type='User',
+            target_id='bulk_email',
+            details=f'批量发送邮件给 {len(users_with_email)} 个用户，主题：{subject}'
         )
-        db.session.add(operation_log)
         db.session.commit()
         
         # 发送邮件统计
@@ -3069,25 +2729,24 @@ def add_donation_record():
             amount=amount,
             payment_type=payment_type,
             trade_no=trade_no if trade_no else None,
-            status='success',  # 手动添加的记录直接设为成功状态
-            user_id=user_id,
-            paid_at=beijing_time()  # 设置支付时间为当前时间
+            user_id=user_id
         )
         db.session.add(donation_record)
+        # 手动添加的记录直接设为成功状态（支付时间为当前时间），并计入捐赠者汇总
+        donation_record.mark_success(paid_at=beijing_time())
         db.session.flush()  # 获取记录ID
         
         # 处理VIP升级逻辑
         donation_record.process_vip_upgrade()
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='add_donation_record',
             target_type='donation_record',
             target_id=str(donation_record.id),
             details=f'手动添加捐赠记录：用户={user.username}，捐赠者={donor_name}，金额={amount}，支付方式={payment_type}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -3129,19 +2788,19 @@ def clear_donation_records():
                 'deleted_count': 0
             })
         
-        # 删除所有捐赠记录
+        # 删除所有捐赠记录及捐赠者汇总
         DonationRecord.query.delete()
+        DonationDonor.query.delete()
         db.session.commit()
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='clear_donation_records',
             target_type='donation_record',
             target_id='all',
             details=f'清空所有捐赠记录，共删除 {record_count} 条记录'
         )
-        db.session.add(log)
         db.session.commit()
         
         return jsonify({
@@ -3214,14 +2873,13 @@ def dns_rewrite_add():
         svc = AdGuardService()
         result = svc.add_rewrite_rule(domain, answer)
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_rewrite_add',
             target_type='dns_rewrite',
             target_id=domain,
             details=f'添加DNS重写：{domain} -> {answer}'
         )
-        db.session.add(log)
         db.session.commit()
         return jsonify({'success': True, 'result': result})
     except Exception as e:
@@ -3241,15 +2899,15 @@ def dns_rewrite_delete():
             return jsonify({'success': False, 'error': '参数不完整'}), 400
         svc = AdGuardService()
         result = svc.delete_rewrite_rule(domain, answer)
+        DnsImportRule.release([(domain, answer)])
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_rewrite_delete',
             target_type='dns_rewrite',
             target_id=domain,
             details=f'删除DNS重写：{domain} -> {answer}'
         )
-        db.session.add(log)
         db.session.commit()
         return jsonify({'success': True, 'result': result})
     except Exception as e:
@@ -3269,14 +2927,13 @@ def dns_rewrite_import():
         svc = AdGuardService()
         result = svc.import_rewrite_rules_from_url(url)
         # 记录日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_rewrite_import',
             target_type='dns_rewrite',
             target_id='import',
             details=f'从URL导入DNS重写：{url}，解析{result.get("rules_parsed",0)}条'
         )
-        db.session.add(log)
         db.session.commit()
         return jsonify({'success': result.get('success', False), 'result': result}), (200 if result.get('success') else 400)
     except Exception as e:
@@ -3300,15 +2957,16 @@ def dns_rewrite_update():
             return jsonify({'success': False, 'error': '参数不完整'}), 400
         svc = AdGuardService()
         result = svc.update_rewrite_rule(target_domain, target_answer, new_domain, new_answer)
+        # 手动修改后的规则不再属于原来的导入源
+        DnsImportRule.release([(target_domain, target_answer)])
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_rewrite_update',
             target_type='dns_rewrite',
             target_id=target_domain,
             details=f'更新DNS重写：{target_domain} -> {target_answer} 到 {new_domain} -> {new_answer}'
         )
-        db.session.add(log)
         db.session.commit()
         return jsonify({'success': True, 'result': result})
     except Exception as e:
@@ -3332,14 +2990,13 @@ def dns_rewrite_batch_add():
             return jsonify({'success': False, 'error': '未提供有效规则'}), 400
         result = svc.batch_add_rewrite_rules(rules)
         # 记录日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_rewrite_batch_add',
             target_type='dns_rewrite',
             target_id='batch',
             details=f'批量添加DNS重写：成功{result.get("success",0)}条，失败{result.get("failed",0)}条'
         )
-        db.session.add(log)
         db.session.commit()
         return jsonify({'success': True, 'result': result})
     except Exception as e:
@@ -3358,15 +3015,18 @@ def dns_rewrite_batch_delete():
             return jsonify({'success': False, 'error': '未提供有效规则'}), 400
         svc = AdGuardService()
         result = svc.batch_delete_rewrite_rules(rules)
+        DnsImportRule.release(
+            ((rule.get('domain') or '').strip(), (rule.get('answer') or '').strip())
+            for rule in rules if isinstance(rule, dict)
+        )
         # 记录日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_rewrite_batch_delete',
             target_type='dns_rewrite',
             target_id='batch',
             details=f'批量删除DNS重写：成功{result.get("success",0)}条，失败{result.get("failed",0)}条'
         )
-        db.session.add(log)
         db.session.commit()
         return jsonify({'success': True, 'result': result})
     except Exception as e:
@@ -3442,14 +3102,14 @@ def system_config():
         db.session.commit()
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='update_system_config',
             target_type='SYSTEM',
             target_id='system_config',
-            details=f'更新系统设置：允许注册={allow_registration}，系统名称={project_name}'
+            details=f'更新系统设置：允许注册={allow_registration}，系统名称={project_name}',
+            sync=True
         )
-        db.session.add(log)
         db.session.commit()
         
         flash('系统设置已更新', 'success')
@@ -3538,14 +3198,13 @@ def manage_dns_config():
             db.session.commit()
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_dns_config',
                 target_type='config',
                 target_id='dns',
                 details='更新DNS配置信息'
             )
-            db.session.add(log)
             db.session.commit()
             
             return jsonify({
@@ -3706,35 +3365,68 @@ def get_dns_import_sources():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@admin.route('/api/dns-rewrite/owners', methods=['GET'])
+@login_required
+@admin_required
+def dns_rewrite_owners():
+    """查询某条DNS重写规则来自哪些导入源"""
+    domain = (request.args.get('domain') or '').strip()
+    answer = (request.args.get('answer') or '').strip()
+    if not domain or not answer:
+        return jsonify({'success': False, 'error': '参数不完整'}), 400
+    try:
+        source_ids = DnsImportRule.owners(domain, answer)
+        sources = DnsImportSource.query.filter(DnsImportSource.id.in_(source_ids)).all() if source_ids else []
+        return jsonify({
+            'success': True,
+            'sources': [{
+                'id': source.id,
+                'source_url': source.source_url,
+                'source_name': source.source_name
+            } for source in sources]
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @admin.route('/api/dns-import-sources/<int:source_id>/delete-rules', methods=['POST'])
 @login_required
 @admin_required
 def delete_rules_by_source(source_id):
-    """根据导入源删除相关的DNS重写规则"""
+    """根据导入源删除相关的DNS重写规则
+    
+    只删除不再属于其他导入源的规则，同时被其他导入源导入的规则保留。
+    """
     try:
         source = DnsImportSource.query.get_or_404(source_id)
         
-        if not source.rules_snapshot:
-            return jsonify({'success': False, 'error': '该导入源没有规则快照，无法删除'}), 400
+        owned_count = DnsImportRule.count_for_source(source_id)
+        if not owned_count:
+            return jsonify({'success': False, 'error': '该导入源没有导入记录，无法删除'}), 400
         
-        # 从快照中获取规则并删除
+        # 只属于该导入源的规则才需要从AdGuard Home中删除
         svc = AdGuardService()
-        rules_to_delete = source.get_rules_snapshot()  # 使用模型方法解析JSON
+        rules_to_delete = [
+            {'domain': domain, 'answer': answer}
+            for domain, answer in sorted(DnsImportRule.exclusive_rules(source_id))
+        ]
+        shared_count = owned_count - len(rules_to_delete)
         
         # 批量删除规则
         result = svc.batch_delete_rewrite_rules(rules_to_delete)
+        result['shared_rules'] = shared_count
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_rewrite_batch_delete',
             target_type='dns_import_source',
             target_id=str(source_id),
-            details=f'删除导入源规则：{source.source_url}，成功{result.get("success", 0)}条，失败{result.get("failed", 0)}条'
+            details=f'删除导入源规则：{source.source_url}，成功{result.get("success", 0)}条，失败{result.get("failed", 0)}条，'
+                    f'保留其他导入源共用的规则{shared_count}条'
         )
-        db.session.add(log)
         
-        # 删除导入源记录
+        # 删除导入源记录及其来源记录
+        DnsImportRule.release_source(source_id)
         db.session.delete(source)
         db.session.commit()
         
@@ -3757,16 +3449,16 @@ def delete_import_source(source_id):
         source = DnsImportSource.query.get_or_404(source_id)
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='dns_import_source_delete',
             target_type='dns_import_source',
             target_id=str(source_id),
             details=f'删除导入源记录：{source.source_url}'
         )
-        db.session.add(log)
         
-        # 删除导入源记录
+        # 删除导入源记录（规则保留，不再属于该导入源）
+        DnsImportRule.release_source(source_id)
         db.session.delete(source)
         db.session.commit()
         
@@ -3823,14 +3515,14 @@ def donation_config():
             db.session.commit()
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_donation_config',
                 target_type='SYSTEM',
                 target_id='donation_config',
-                details=f'更新捐赠配置：启用={enabled}，排行榜显示={show_ranking}，隐藏金额={hide_amount}，商户ID={merchant_id}'
+                details=f'更新捐赠配置：启用={enabled}，排行榜显示={show_ranking}，隐藏金额={hide_amount}，商户ID={merchant_id}',
+                sync=True
             )
-            db.session.add(log)
             db.session.commit()
             
             flash('捐赠配置已更新', 'success')
@@ -3908,14 +3600,14 @@ def manage_donation_config():
             db.session.commit()
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_donation_config',
                 target_type='config',
                 target_id='donation',
-                details='更新捐赠配置信息'
+                details='更新捐赠配置信息',
+                sync=True
             )
-            db.session.add(log)
             db.session.commit()
             
             return jsonify({
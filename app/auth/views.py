@@ -724,27 +724,14 @@ def delete_account():
         try:
             if current_user.openlist_username:
                 openlist_service = OpenListService()
-                # 根据用户名查找OpenList用户ID
-                users_response = openlist_service.get_users()
-                if users_response.get('success') and users_response.get('data'):
-                    openlist_users = users_response['data']
-                    target_user_id = None
-                    
-                    for openlist_user in openlist_users:
-                        if openlist_user.get('username') == current_user.openlist_username:
-                            target_user_id = openlist_user.get('id')
-                            break
-                    
-                    if target_user_id:
-                        delete_response = openlist_service.delete_user(target_user_id)
-                        if delete_response.get('success'):
-                            print(f"已删除用户 {username} 的OpenList账户: {current_user.openlist_username}")
-                        else:
-                            print(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
-                    else:
-                        print(f"未找到OpenList用户: {current_user.openlist_username}")
+                # 通过用户目录缓存按用户名查找OpenList用户ID并删除
+                delete_response = openlist_service.delete_user_by_username(current_user.openlist_username)
+                if delete_response.get('success'):
+                    print(f"已删除用户 {username} 的OpenList账户: {current_user.openlist_username}")
+                elif delete_response.get('not_found'):
+                    print(f"未找到OpenList用户: {current_user.openlist_username}")
                 else:
-                    print(f"获取OpenList用户列表失败")
+                    print(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
         except Exception as e:
             print(f"删除OpenList账户时发生错误: {str(e)}")
         
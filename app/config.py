@@ -27,5 +27,83 @@ class Config:
     # 验证码配置
     VERIFICATION_CODE_EXPIRE_MINUTES = int(os.environ.get('VERIFICATION_CODE_EXPIRE_MINUTES') or 10)
 
+    # 配置缓存：检查其他进程是否修改了配置的最小间隔（秒）
+    CONFIG_CACHE_CHECK_INTERVAL = float(os.environ.get('CONFIG_CACHE_CHECK_INTERVAL') or 1.0)
+
+    # 运行指标：多进程共享的指标目录、写入间隔（秒）以及访问 /metrics 所需的令牌
+    # （未配置令牌时不提供 /metrics 端点）
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL') or 5.0)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # 请求预算追踪：记录每个请求的上游API调用和SQL语句，超出预算时输出警告
+    REQUEST_TRACE_ENABLED = os.environ.get('REQUEST_TRACE_ENABLED', 'false').lower() in ['true', 'on', '1']
+    REQUEST_TRACE_UPSTREAM_BUDGET = int(os.environ.get('REQUEST_TRACE_UPSTREAM_BUDGET') or 3)
+    REQUEST_TRACE_SQL_BUDGET = int(os.environ.get('REQUEST_TRACE_SQL_BUDGET') or 30)
+    REQUEST_TRACE_RAISE = os.environ.get('REQUEST_TRACE_RAISE', 'false').lower() in ['true', 'on', '1']
+
+    # 定时任务主进程选举：锁文件路径（默认为实例目录下的scheduler.lock）和接管重试间隔（秒）
+    SCHEDULER_LOCK_FILE = os.environ.get('SCHEDULER_LOCK_FILE')
+    SCHEDULER_LEADER_RETRY_INTERVAL = float(os.environ.get('SCHEDULER_LEADER_RETRY_INTERVAL') or 15.0)
+
+    # 实时统计快照的刷新间隔（秒）
+    LIVE_STATS_INTERVAL = float(os.environ.get('LIVE_STATS_INTERVAL') or 2.0)
+    # 每个工作进程同时保持的实时统计推送（SSE）连接数上限，超出的页面改为轮询
+    LIVE_STATS_MAX_STREAMS = int(os.environ.get('LIVE_STATS_MAX_STREAMS') or 1)
+
+    # 响应压缩：超过该大小（字节）的文本类响应才压缩，以及压缩级别
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 1024)
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)
+
+    # 匿名页面整页缓存：是否启用、进程内缓存页面数、有效期（秒）以及多进程共享的磁盘目录（可选）
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE') or 128)
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL') or 600)
+    PAGE_CACHE_DIR = os.environ.get('PAGE_CACHE_DIR')
+
+    # 苹果.mobileconfig描述文件缓存的最大条目数
+    MOBILECONFIG_CACHE_SIZE = int(os.environ.get('MOBILECONFIG_CACHE_SIZE') or 1024)
+
+    # 上游服务熔断：连续失败多少次后熔断、熔断后等待多久（秒）再探测，以及只读接口旧数据的最长保留时间（秒）
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD') or 3)
+    CIRCUIT_BREAKER_RECOVERY_TIMEOUT = float(os.environ.get('CIRCUIT_BREAKER_RECOVERY_TIMEOUT') or 30.0)
+    ADGUARD_STALE_MAX_AGE = int(os.environ.get('ADGUARD_STALE_MAX_AGE') or 3600)
+
+    # 查询日志分页：进程内缓存的页面数量，以及是否在后台预取下一页
+    QUERY_LOG_PAGE_CACHE_SIZE = int(os.environ.get('QUERY_LOG_PAGE_CACHE_SIZE') or 64)
+    QUERY_LOG_PREFETCH = os.environ.get('QUERY_LOG_PREFETCH', 'true').lower() in ['true', 'on', '1']
+
+    # 查询日志高级搜索：单次搜索最多扫描的日志条数、单次请求最多拉取的条数和最多请求次数
+    QUERY_LOG_SEARCH_SCAN_BUDGET = int(os.environ.get('QUERY_LOG_SEARCH_SCAN_BUDGET') or 5000)
+    QUERY_LOG_SEARCH_MAX_BATCH = int(os.environ.get('QUERY_LOG_SEARCH_MAX_BATCH') or 1000)
+    QUERY_LOG_SEARCH_MAX_REQUESTS = int(os.environ.get('QUERY_LOG_SEARCH_MAX_REQUESTS') or 10)
+
+    # 操作日志缓冲写入：是否启用（关闭时与业务修改同步写入）、达到多少条立即写入、定时写入间隔（秒）
+    AUDIT_LOG_ASYNC = os.environ.get('AUDIT_LOG_ASYNC', 'true').lower() in ['true', 'on', '1']
+    AUDIT_LOG_BATCH_SIZE = int(os.environ.get('AUDIT_LOG_BATCH_SIZE') or 100)
+    AUDIT_LOG_FLUSH_INTERVAL = float(os.environ.get('AUDIT_LOG_FLUSH_INTERVAL') or 2.0)
+
+    # 操作日志归档：数据库中保留的天数（0表示不归档）、归档目录（默认实例目录下的 operation_log_archive）、每批归档条数
+    OPERATION_LOG_RETENTION_DAYS = int(os.environ.get('OPERATION_LOG_RETENTION_DAYS') or 180)
+    OPERATION_LOG_ARCHIVE_DIR = os.environ.get('OPERATION_LOG_ARCHIVE_DIR')
+    OPERATION_LOG_ARCHIVE_BATCH_SIZE = int(os.environ.get('OPERATION_LOG_ARCHIVE_BATCH_SIZE') or 5000)
+
+    # 验证码清理：过期多少小时后删除（清理任务每小时运行一次）
+    VERIFICATION_CODE_PURGE_GRACE_HOURS = int(os.environ.get('VERIFICATION_CODE_PURGE_GRACE_HOURS') or 24)
+
+    # OpenList用户目录缓存：有效期（秒）、因查找不到用户而重新拉取的最小间隔（秒）
+    OPENLIST_DIRECTORY_TTL = float(os.environ.get('OPENLIST_DIRECTORY_TTL') or 300)
+    OPENLIST_DIRECTORY_MIN_REFRESH = float(os.environ.get('OPENLIST_DIRECTORY_MIN_REFRESH') or 10)
+
+    # OpenList令牌：到期前多少秒主动刷新（定时任务每30分钟检查一次）
+    OPENLIST_TOKEN_REFRESH_MARGIN = int(os.environ.get('OPENLIST_TOKEN_REFRESH_MARGIN') or 3600)
+
+    # 可阻止服务目录缓存：最长有效期（秒）、检查{{ project_name }}版本号的间隔（秒）
+    BLOCKED_SERVICES_CATALOG_TTL = float(os.environ.get('BLOCKED_SERVICES_CATALOG_TTL') or 86400)
+    BLOCKED_SERVICES_VERSION_CHECK_INTERVAL = float(os.environ.get('BLOCKED_SERVICES_VERSION_CHECK_INTERVAL') or 300)
+
+    # 用户管理页面的DNS请求数：从统计数据更新客户端请求数表的间隔（秒）
+    CLIENT_REQUEST_COUNTS_INTERVAL = int(os.environ.get('CLIENT_REQUEST_COUNTS_INTERVAL') or 300)
+
     # 分页配置
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE') or 20)
\ No newline at end of file
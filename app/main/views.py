@@ -14,7 +14,13 @@ from app.models.vip_config import VipConfig
 from app.models.sdk import Sdk
 from app.services.adguard_service import AdGuardService
 from app.services.openlist_service import OpenListService
+from app.services.live_stats_service import live_stats
+from app.services.blocked_services_catalog_service import blocked_services_catalog
+from app.services.mobileconfig_service import mobileconfig_service
 from app.utils.seo_config import get_page_seo, get_structured_data
+from app.utils.http_cache import http_cache, http_cache_middleware
+from app.utils.page_cache import page_cache
+from app.utils.audit_log import audit_log
 
 from app.admin.views import admin_required
 from . import main
@@ -44,30 +50,17 @@ def remove_expired_vip_clients(user_id):
         try:
             openlist_service = OpenListService()
             if user.openlist_username:
-                # 根据用户名查找OpenList用户ID
-                users_response = openlist_service.get_users()
-                if users_response.get('success') and users_response.get('users'):
-                    openlist_users = users_response['users']
-                    target_user_id = None
-                    
-                    for openlist_user in openlist_users:
-                        if openlist_user.get('username') == user.openlist_username:
-                            target_user_id = openlist_user.get('id')
-                            break
-                    
-                    if target_user_id:
-                        delete_response = openlist_service.delete_user(target_user_id)
-                        if delete_response.get('success'):
-                            logging.info(f"已删除用户 {user.username} 的OpenList账户: {user.openlist_username}")
-                            # 清除数据库中的OpenList用户名记录
-                            user.openlist_username = None
-                            db.session.add(user)
-                        else:
-                            logging.warning(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
-                    else:
-                        logging.warning(f"未找到OpenList用户: {user.openlist_username}")
+                # 通过用户目录缓存按用户名查找OpenList用户ID并删除
+                delete_response = openlist_service.delete_user_by_username(user.openlist_username)
+                if delete_response.get('success'):
+                    logging.info(f"已删除用户 {user.username} 的OpenList账户: {user.openlist_username}")
+                    # 清除数据库中的OpenList用户名记录
+                    user.openlist_username = None
+                    db.session.add(user)
+                elif delete_response.get('not_found'):
+                    logging.warning(f"未找到OpenList用户: {user.openlist_username}")
                 else:
-                    logging.warning(f"获取OpenList用户列表失败")
+                    logging.warning(f"删除OpenList账户失败: {delete_response.get('message', '未知错误')}")
         except Exception as e:
             logging.warning(f"删除OpenList账户时发生错误: {str(e)}")
         
@@ -132,14 +125,13 @@ def remove_expired_vip_clients(user_id):
             db.session.delete(mapping)
             
             # 记录操作日志
-            operation_log = OperationLog(
+            audit_log.record(
                 user_id=user_id,
                 operation_type='AUTO_DELETE',
                 target_type='CLIENT',
                 target_id=client_name,
                 details=f'VIP过期自动删除客户端: {client_name}'
             )
-            db.session.add(operation_log)
         
         # 提交数据库更改
         db.session.commit()
@@ -208,7 +200,7 @@ def dashboard():
         total_blocked_queries = 0
     
     # 获取捐赠配置以显示排行榜入口
-    donation_config = DonationConfig.query.first()
+    donation_config = DonationConfig.get_config()
     
     seo_config = get_page_seo('dashboard')
     structured_data = get_structured_data('dashboard')
@@ -221,6 +213,7 @@ def dashboard():
                          structured_data=structured_data)
 
 @main.route('/')
+@page_cache.cached
 def index():
     """主页
     
@@ -231,7 +224,7 @@ def index():
     if current_user.is_authenticated:
         return redirect(url_for('main.dashboard'))
     # 获取捐赠配置以显示排行榜入口
-    donation_config = DonationConfig.query.first()
+    donation_config = DonationConfig.get_config()
     seo_config = get_page_seo('landing')
     structured_data = get_structured_data('landing')
     return render_template('main/landing.html', 
@@ -240,13 +233,14 @@ def index():
                          structured_data=structured_data)
 
 @main.route('/landing')
+@page_cache.cached
 def landing():
     """宣传页面首页
     
     显示产品介绍和功能特性
     """
     # 获取捐赠配置以显示排行榜入口
-    donation_config = DonationConfig.query.first()
+    donation_config = DonationConfig.get_config()
     seo_config = get_page_seo('landing')
     structured_data = get_structured_data('landing')
     return render_template('main/landing.html', 
@@ -255,13 +249,14 @@ def landing():
                          structured_data=structured_data)
 
 @main.route('/about')
+@page_cache.cached
 def about():
     """关于我们页面
     
     显示公司介绍、团队信息和联系方式
     """
     # 获取捐赠配置以显示排行榜入口
-    donation_config = DonationConfig.query.first()
+    donation_config = DonationConfig.get_config()
     seo_config = get_page_seo('about')
     structured_data = get_structured_data('about')
     return render_template('main/about.html', 
@@ -270,13 +265,14 @@ def about():
                          structured_data=structured_data)
 
 @main.route('/features')
+@page_cache.cached
 def features():
     """功能特性页面
     
     详细展示产品功能和技术优势
     """
     # 获取捐赠配置以显示排行榜入口
-    donation_config = DonationConfig.query.first()
+    donation_config = DonationConfig.get_config()
     seo_config = get_page_seo('features')
     structured_data = get_structured_data('features')
     return render_template('main/features.html', 
@@ -285,6 +281,7 @@ def features():
                          structured_data=structured_data)
 
 @main.route('/guide')
+@page_cache.cached
 def guide():
     """使用指南页面
     
@@ -300,6 +297,7 @@ def guide():
                          structured_data=structured_data)
 
 @main.route('/guide/android-guide')
+@page_cache.cached
 def android_guide():
     """Android配置指南页面
     
@@ -337,6 +335,7 @@ def android_guide():
                          user_clients=user_clients)
 
 @main.route('/guide/harmonyos-guide')
+@page_cache.cached
 def harmonyos_guide():
     """鸿蒙OS配置指南页面
     
@@ -374,6 +373,7 @@ def harmonyos_guide():
                          user_clients=user_clients)
 
 @main.route('/guide/ios-guide')
+@page_cache.cached
 def ios_guide():
     """iOS配置指南页面
     
@@ -411,6 +411,7 @@ def ios_guide():
                          user_clients=user_clients)
 
 @main.route('/guide/windows-guide')
+@page_cache.cached
 def windows_guide():
     """Windows配置指南页面
     
@@ -448,6 +449,7 @@ def windows_guide():
                          user_clients=user_clients)
 
 @main.route('/guide/macos-guide')
+@page_cache.cached
 def macos_guide():
     """macOS配置指南页面
     
@@ -485,6 +487,7 @@ def macos_guide():
                          user_clients=user_clients)
 
 @main.route('/guide/chrome-guide')
+@page_cache.cached
 def chrome_guide():
     """Chrome配置指南页面
     
@@ -522,6 +525,7 @@ def chrome_guide():
                          user_clients=user_clients)
 
 @main.route('/pricing')
+@page_cache.cached
 def pricing():
     """价格方案页面
     
@@ -575,90 +579,59 @@ def change_email_page():
     return render_template('auth/change_email.html')
 
 @main.route('/api/stats')
+@http_cache()
 @login_required
 def api_stats():
     """获取{{ project_name }}统计数据的API接口
     
-    返回JSON格式的统计数据，用于前端动态更新
+    返回JSON格式的统计数据，用于前端动态更新。数据来自实时统计快照，
+    多个用户同时轮询时只会向{{ project_name }}请求一次。
     
     Returns:
         JSON: 包含用户请求数、总DNS查询数和用户排名的统计数据
     """
-    user_request_count = 0
-    total_dns_queries = 0
-    total_blocked_queries = 0
-    user_ranking = 0
-    total_clients = 0
-    
     try:
-        adguard_service = AdGuardService()
-        
-        # 获取统计数据
-        stats = adguard_service.get_stats()
-        
-        if stats:
-            # 获取总DNS查询数量
-            total_dns_queries = stats.get('num_dns_queries', 0)
-            
-            # 获取总拦截数量（包括所有类型的拦截）
-            total_blocked_queries = (
-                stats.get('num_blocked_filtering', 0) +
-                stats.get('num_replaced_safebrowsing', 0) +
-                stats.get('num_replaced_safesearch', 0) +
-                stats.get('num_replaced_parental', 0)
-            )
-            
-            # 获取用户客户端请求数量和排名
-            if 'top_clients' in stats:
-                # 查找当前用户的客户端
-                user_clients = ClientMapping.query.filter_by(user_id=current_user.id).all()
-                user_client_names = [client.client_name for client in user_clients]
-                user_client_ids = []
-                for client in user_clients:
-                    user_client_ids.extend(client.client_ids)
-                
-                # 构建所有客户端的请求数列表，用于排名计算
-                all_clients_requests = []
-                
-                # 在top_clients中查找用户的客户端请求数
-                for client_stat in stats['top_clients']:
-                    # top_clients格式: {"client_name": request_count}
-                    for client_name, request_count in client_stat.items():
-                        all_clients_requests.append(request_count)
-                        # 检查客户端名称或客户端ID是否匹配
-                        if client_name in user_client_names or client_name in user_client_ids:
-                            user_request_count += request_count
-                
-                # 计算用户排名
-                if all_clients_requests:
-                    # 按请求数降序排序
-                    all_clients_requests.sort(reverse=True)
-                    total_clients = len(all_clients_requests)
-                    
-                    # 查找用户请求数在排序列表中的位置
-                    if user_request_count > 0:
-                        for i, count in enumerate(all_clients_requests):
-                            if count <= user_request_count:
-                                user_ranking = i + 1
-                                break
-                        if user_ranking == 0:  # 如果没找到，说明用户排在最后
-                            user_ranking = total_clients
-                        
+        snapshot = live_stats.get_snapshot()
+        client_keys = live_stats.load_user_clients(current_user.id)
+        return jsonify(live_stats.user_stats(snapshot, client_keys))
     except Exception as e:
         logging.error(f"API获取{{ project_name }}统计数据失败: {str(e)}")
-        user_request_count = 0
-        total_dns_queries = 0
-        total_blocked_queries = 0
-        user_ranking = 0
-        total_clients = 0
+        return jsonify({
+            'user_request_count': 0,
+            'total_dns_queries': 0,
+            'total_blocked_queries': 0,
+            'user_ranking': 0,
+            'total_clients': 0
+        })
+
+
+@main.route('/api/stats/stream')
+@login_required
+def api_stats_stream():
+    """实时统计推送（Server-Sent Events）
     
-    return jsonify({
-        'user_request_count': user_request_count,
-        'total_dns_queries': total_dns_queries,
-        'total_blocked_queries': total_blocked_queries,
-        'user_ranking': user_ranking,
-        'total_clients': total_clients
-    })
+    推送 stats 和 ranking 两种事件，数据格式分别与 /api/stats 和 /api/client_ranking 相同，
+    只在当前用户的数据发生变化时推送。每个连接占用一个工作线程，本进程的连接数达到上限时
+    返回503，页面改为轮询 /api/stats 和 /api/client_ranking。
+    """
+    if not live_stats.acquire_stream():
+        response = Response('实时推送连接数已满，请使用轮询接口', status=503, mimetype='text/plain')
+        response.headers['Retry-After'] = '60'
+        return response
+    
+    try:
+        user_id = current_user.id
+        client_keys = live_stats.load_user_clients(user_id)
+    except Exception:
+        live_stats.release_stream()
+        raise
+    response = Response(live_stats.stream(user_id, client_keys), mimetype='text/event-stream')
+    # 无论事件流是否开始迭代，连接关闭时都释放名额
+    response.call_on_close(live_stats.release_stream)
+    response.headers['Cache-Control'] = 'no-cache'
+    # 禁止反向代理缓冲事件流
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @main.route('/api/client_list')
 @login_required
@@ -669,6 +642,7 @@ def client_list():
 
 
 @main.route('/api/client_ranking')
+@http_cache()
 @login_required
 def api_client_ranking():
     """获取{{ project_name }}客户端排行数据的API接口
@@ -678,70 +652,9 @@ def api_client_ranking():
     Returns:
         JSON: 包含客户端排行数据的列表
     """
-    client_ranking = []
-    
     try:
-        import ipaddress
-        adguard_service = AdGuardService()
-        
-        # 获取统计数据和所有客户端信息
-        stats = adguard_service.get_stats()
-        all_clients = adguard_service.get_all_clients()
-
-        # 构建客户端IP到名称的映射
-        client_map = {}
-        client_cidrs = {}
-        if all_clients:
-            for client in all_clients:
-                for cidr in client.get('ids', []):
-                    try:
-                        # 区分普通IP和CIDR
-                        if '/' in cidr:
-                            client_cidrs[ipaddress.ip_network(cidr, strict=False)] = client.get('name')
-                        else:
-                            client_map[cidr] = client.get('name')
-                    except ValueError:
-                        # 处理无效的CIDR或IP
-                        client_map[cidr] = client.get('name')
-
-        if stats and 'top_clients' in stats:
-            # 处理top_clients数据
-            for client_stat in stats['top_clients']:
-                for client_ip, request_count in client_stat.items():
-                    # 默认客户端名称为IP
-                    client_name_from_map = client_ip
-                    
-                    # 首先在普通IP映射中查找
-                    if client_ip in client_map:
-                        client_name_from_map = client_map[client_ip]
-                    else:
-                        # 如果不在普通IP映射中，则检查CIDR范围
-                        try:
-                            ip = ipaddress.ip_address(client_ip)
-                            for network, name in client_cidrs.items():
-                                if ip in network:
-                                    client_name_from_map = name
-                                    break
-                        except ValueError:
-                            pass  # 不是有效的IP地址，保持原样
-
-                    # 查找客户端对应的用户信息
-                    client_mapping = ClientMapping.query.filter_by(client_name=client_name_from_map).first()
-                    
-                    client_info = {
-                        'client_name': client_name_from_map,
-                        'request_count': request_count,
-                        'user_name': client_mapping.user.username if client_mapping else '未知用户',
-                        'is_current_user': client_mapping.user_id == current_user.id if client_mapping else False
-                    }
-                    client_ranking.append(client_info)
-            
-            # 按请求数量降序排序
-            client_ranking.sort(key=lambda x: x['request_count'], reverse=True)
-            
-            # 只返回前10名
-            client_ranking = client_ranking[:10]
-                        
+        snapshot = live_stats.get_snapshot()
+        client_ranking = live_stats.user_ranking(snapshot, current_user.id)
     except Exception as e:
         logging.error(f"API获取客户端排行数据失败: {str(e)}")
         client_ranking = []
@@ -751,6 +664,7 @@ def api_client_ranking():
     })
 
 @main.route('/api/blocked_services')
+@http_cache(max_age=300)
 @login_required
 def get_blocked_services():
     """获取可用的阻止服务列表
@@ -761,18 +675,12 @@ def get_blocked_services():
         JSON响应，包含可用的阻止服务列表
     """
     try:
-        # 从{{ project_name }} API获取可用的阻止服务列表
-        adguard = AdGuardService()
-        response = adguard.get_blocked_services_all()
-        
-        # 提取服务信息，只保留id和name字段
-        services = []
-        if response and isinstance(response, dict) and 'blocked_services' in response:
-            for service in response['blocked_services']:
-                services.append({
-                    "id": service.get('id', ''),
-                    "name": service.get('name', '')
-                })
+        # 从缓存的服务目录获取可用的阻止服务列表（只包含id和name，图标通过图标接口获取）
+        try:
+            services = list(blocked_services_catalog.services(AdGuardService()))
+        except Exception as e:
+            logging.warning(f"获取{{ project_name }}可阻止服务目录失败: {str(e)}")
+            services = []
         
         # 如果API返回为空，使用备用静态列表
         if not services:
@@ -920,14 +828,13 @@ def api_global_blocked_services():
             response = adguard.update_blocked_services(schedule=schedule, ids=blocked_services)
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_global_blocked_services',
                 target_type='GLOBAL_SETTING',
                 target_id='blocked_services',
                 details=f"更新全局阻止服务设置，阻止的服务数量：{len(blocked_services)}"
             )
-            db.session.add(log)
             db.session.commit()
             
             return jsonify({
@@ -1035,14 +942,13 @@ def client_details(mapping_id):
             mapping.client_ids = client_ids
 
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='update_client',
                 target_type='client',
                 target_id=mapping.client_name,
                 details=f'更新客户端{mapping.client_name}配置'
             )
-            db.session.add(log)
 
             db.session.commit()
             return jsonify({'message': '客户端更新成功'})
@@ -1123,14 +1029,13 @@ def api_feedback():
             db.session.add(feedback)
             
             # 记录操作日志
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='create_feedback',
                 target_type='feedback',
                 target_id=str(feedback.id),
                 details=f'创建留言: {title}'
             )
-            db.session.add(log)
             
             db.session.commit()
             
@@ -1149,6 +1054,7 @@ def api_feedback():
 
 
 @main.route('/api/dns-config')
+@http_cache()
 @login_required
 def api_dns_config():
     """获取DNS配置信息的API接口
@@ -1254,6 +1160,7 @@ def api_dns_config():
 
 
 @main.route('/api/apple/doh.mobileconfig')
+@http_cache()
 @login_required
 def apple_doh_mobileconfig():
     """生成DNS-over-HTTPS的苹果配置文件
@@ -1286,112 +1193,25 @@ def apple_doh_mobileconfig():
                 'error': '管理员已禁用苹果设备DoH配置文件下载功能'
             }), 403
         
-        # 获取客户端ID参数，如果没有提供则使用用户的第一个客户端ID
-        requested_client_id = request.args.get('client_id')
-        client_mappings = ClientMapping.query.filter_by(user_id=current_user.id).all()
-        
-        if not client_mappings:
-            return jsonify({
-                'error': '用户没有关联的客户端ID'
-            }), 400
-        
-        # 收集所有用户的客户端ID
-        all_user_client_ids = []
-        for mapping in client_mappings:
-            all_user_client_ids.extend(mapping.client_ids)
-        
-        if not all_user_client_ids:
-            return jsonify({
-                'error': '用户没有关联的客户端ID'
-            }), 400
-        
-        # 如果指定了客户端ID，验证用户是否有权限使用该客户端ID
-        if requested_client_id:
-            if requested_client_id not in all_user_client_ids:
-                return jsonify({
-                    'error': f'用户无权限使用客户端ID: {requested_client_id}'
-                }), 403
-            client_id = requested_client_id
-        else:
-            # 使用用户的第一个客户端ID作为默认值
-            client_id = all_user_client_ids[0]
-        
-        # 验证客户端ID格式（{{ project_name }}要求：[0-9a-z-]{1,64}）
-        import re
-        if not re.match(r'^[0-9a-z-]{1,64}$', client_id):
-            return jsonify({
-                'error': f'客户端ID格式无效：{client_id}，必须是1-64位的小写字母、数字或连字符'
-            }), 400
-        
-        # 构建DoH服务器地址（使用host参数）
-        doh_server = host.strip()
-        doh_port = config.doh_port or 443
-        doh_path = config.doh_path or '/dns-query'
-        
-        # 构建DoH URL
-        if doh_port == 443:
-            doh_url = f"https://{doh_server}{doh_path}"
-        else:
-            doh_url = f"https://{doh_server}:{doh_port}{doh_path}"
-        
-        # 生成.mobileconfig文件内容
-        import uuid
-        from datetime import datetime
-        
-        payload_uuid = str(uuid.uuid4())
-        payload_identifier_uuid = str(uuid.uuid4())
-        profile_uuid = str(uuid.uuid4())
-        profile_identifier_uuid = str(uuid.uuid4())
-        
-        mobileconfig_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
-<plist version="1.0">
-<dict>
-    <key>PayloadContent</key>
-    <array>
-        <dict>
-            <key>DNSSettings</key>
-            <dict>
-                <key>DNSProtocol</key>
-                <string>HTTPS</string>
-                <key>ServerURL</key>
-                <string>{doh_url}</string>
-            </dict>
-            <key>PayloadDescription</key>
-            <string>Configures device to use {{ project_name }} DNS-over-HTTPS</string>
-            <key>PayloadDisplayName</key>
-            <string>{{ project_name }} DoH</string>
-            <key>PayloadIdentifier</key>
-            <string>com.{{ project_name }}.doh.{client_id}</string>
-            <key>PayloadType</key>
-            <string>com.apple.dnsSettings.managed</string>
-            <key>PayloadUUID</key>
-            <string>{payload_uuid}</string>
-            <key>PayloadVersion</key>
-            <integer>1</integer>
-        </dict>
-    </array>
-    <key>PayloadDescription</key>
-    <string>{{ project_name }} DNS-over-HTTPS configuration for {current_user.username}</string>
-    <key>PayloadDisplayName</key>
-    <string>{{ project_name }} DoH - {current_user.username}</string>
-    <key>PayloadIdentifier</key>
-    <string>com.{{ project_name }}.profile.doh.{client_id}</string>
-    <key>PayloadRemovalDisallowed</key>
-    <false/>
-    <key>PayloadType</key>
-    <string>Configuration</string>
-    <key>PayloadUUID</key>
-    <string>{profile_uuid}</string>
-    <key>PayloadVersion</key>
-    <integer>1</integer>
-</dict>
-</plist>'''
+        # 获取客户端ID参数，如果没有提供则使用用户的第一个客户端ID，并验证权限和格式
+        try:
+            client_id = mobileconfig_service.resolve_client_id(current_user.id, request.args.get('client_id'))
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 400
+        except PermissionError as e:
+            return jsonify({'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 生成（或从缓存获取）.mobileconfig文件内容，重复下载时直接返回304
+        profile = mobileconfig_service.doh_profile(config, current_user.id, current_user.username, client_id, host.strip())
+        matched_etag = http_cache_middleware.matching_etag(profile.etag)
+        if matched_etag:
+            return http_cache_middleware.not_modified(matched_etag)
         
         # 创建响应
-        from flask import Response
         response = Response(
-            mobileconfig_content,
+            profile.content,
             mimetype='application/x-apple-aspen-config',
             headers={
                 'Content-Disposition': f'attachment; filename="{{ project_name }}-DoH-{client_id}.mobileconfig"'
@@ -1399,14 +1219,13 @@ def apple_doh_mobileconfig():
         )
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='download_apple_config',
             target_type='mobileconfig',
             target_id=f'doh-{client_id}',
-            details=f'下载DoH配置文件: {doh_url}'
+            details=f'下载DoH配置文件: {profile.server}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return response
@@ -1419,6 +1238,7 @@ def apple_doh_mobileconfig():
 
 
 @main.route('/api/apple/dot.mobileconfig')
+@http_cache()
 @login_required
 def apple_dot_mobileconfig():
     """生成DNS-over-TLS的苹果配置文件
@@ -1451,108 +1271,25 @@ def apple_dot_mobileconfig():
                 'error': '管理员已禁用苹果设备DoT配置文件下载功能'
             }), 403
         
-        # 获取客户端ID参数，如果没有提供则使用用户的第一个客户端ID
-        requested_client_id = request.args.get('client_id')
-        client_mappings = ClientMapping.query.filter_by(user_id=current_user.id).all()
-        
-        if not client_mappings:
-            return jsonify({
-                'error': '用户没有关联的客户端ID'
-            }), 400
-        
-        # 收集所有客户端ID
-        all_client_ids = []
-        for mapping in client_mappings:
-            if mapping.client_ids:
-                all_client_ids.extend(mapping.client_ids)
-        
-        if not all_client_ids:
-            return jsonify({
-                'error': '用户没有关联的客户端ID'
-            }), 400
-        
-        # 如果指定了客户端ID，验证用户是否有权限使用该客户端ID
-        if requested_client_id:
-            if requested_client_id not in all_client_ids:
-                return jsonify({
-                    'error': f'用户无权限使用客户端ID: {requested_client_id}'
-                }), 403
-            client_id = requested_client_id
-        else:
-            # 使用用户的第一个客户端ID作为默认值
-            client_id = all_client_ids[0]
-        
-        # 验证客户端ID格式（{{ project_name }}要求：[0-9a-z-]{1,64}）
-        import re
-        if not re.match(r'^[0-9a-z-]{1,64}$', client_id):
-            return jsonify({
-                'error': f'客户端ID格式无效：{client_id}，必须是1-64位的小写字母、数字或连字符'
-            }), 400
-        
-        # 构建DoT服务器地址（使用host参数）
-        # 注意：与DoH不同，DoT协议不支持路径参数，因此无法使用路径格式 (server:port/path/client_id)
-        # 根据{{ project_name }}的实际格式，DoT使用客户端ID+域名格式 (client_id.server:port)
-        dot_server = f"{client_id}.{host.strip()}"
-        dot_port = config.dot_port or 853
-        
-        # 生成.mobileconfig文件内容
-        import uuid
-        from datetime import datetime
-        
-        payload_uuid = str(uuid.uuid4())
-        payload_identifier_uuid = str(uuid.uuid4())
-        profile_uuid = str(uuid.uuid4())
-        profile_identifier_uuid = str(uuid.uuid4())
-        
-        mobileconfig_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
-<plist version="1.0">
-	<dict>
-		<key>PayloadContent</key>
-		<array>
-			<dict>
-				<key>DNSSettings</key>
-				<dict>
-					<key>DNSProtocol</key>
-					<string>TLS</string>
-					<key>ServerName</key>
-					<string>{dot_server}</string>
-				</dict>
-				<key>PayloadDescription</key>
-				<string>Configures device to use {{ project_name }}</string>
-				<key>PayloadDisplayName</key>
-				<string>{host.strip()} DoT</string>
-				<key>PayloadIdentifier</key>
-				<string>com.apple.dnsSettings.managed.{payload_identifier_uuid.lower()}</string>
-				<key>PayloadType</key>
-				<string>com.apple.dnsSettings.managed</string>
-				<key>PayloadUUID</key>
-				<string>{payload_uuid.lower()}</string>
-				<key>PayloadVersion</key>
-				<integer>1</integer>
-			</dict>
-		</array>
-		<key>PayloadDescription</key>
-		<string>Adds {{ project_name }} to macOS Big Sur and iOS 14 or newer systems</string>
-		<key>PayloadDisplayName</key>
-		<string>{host.strip()} DoT</string>
-		<key>PayloadIdentifier</key>
-		<string>{profile_identifier_uuid.lower()}</string>
-		<key>PayloadRemovalDisallowed</key>
-		<false/>
-		<key>PayloadType</key>
-		<string>Configuration</string>
-		<key>PayloadUUID</key>
-		<string>{profile_uuid.lower()}</string>
-		<key>PayloadVersion</key>
-		<integer>1</integer>
-	</dict>
-</plist>'''
+        # 获取客户端ID参数，如果没有提供则使用用户的第一个客户端ID，并验证权限和格式
+        try:
+            client_id = mobileconfig_service.resolve_client_id(current_user.id, request.args.get('client_id'))
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 400
+        except PermissionError as e:
+            return jsonify({'error': str(e)}), 403
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        # 生成（或从缓存获取）.mobileconfig文件内容，重复下载时直接返回304
+        profile = mobileconfig_service.dot_profile(config, current_user.id, client_id, host.strip())
+        matched_etag = http_cache_middleware.matching_etag(profile.etag)
+        if matched_etag:
+            return http_cache_middleware.not_modified(matched_etag)
         
         # 创建响应
-        from flask import Response
         response = Response(
-            mobileconfig_content,
+            profile.content,
             mimetype='application/x-apple-aspen-config',
             headers={
                 'Content-Disposition': f'attachment; filename="{{ project_name }}-DoT-{client_id}.mobileconfig"'
@@ -1560,14 +1297,13 @@ def apple_dot_mobileconfig():
         )
         
         # 记录操作日志
-        log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='download_apple_config',
             target_type='mobileconfig',
             target_id=f'dot-{client_id}',
-            details=f'下载DoT配置文件: {dot_server}:{dot_port}'
+            details=f'下载DoT配置文件: {profile.server}'
         )
-        db.session.add(log)
         db.session.commit()
         
         return response
@@ -1579,6 +1315,7 @@ def apple_dot_mobileconfig():
         }), 500
 
 @main.route('/api/announcements/active')
+@http_cache(max_age=60)
 @login_required
 def get_announcements():
     """获取首页公告"""
@@ -1773,14 +1510,13 @@ def create_donation():
         
         # 记录操作日志
         if current_user.is_authenticated:
-            log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='create_donation',
                 target_type='donation',
                 target_id=order_id,
                 details=f'创建捐赠订单：金额={amount}，支付方式={payment_type}，捐赠者={donor_name}'
             )
-            db.session.add(log)
         
         db.session.commit()
         
@@ -1837,17 +1573,12 @@ def api_adguard_blocked_services():
         JSON响应，包含可用的阻止服务列表
     """
     try:
-        adguard = AdGuardService()
-        response = adguard.get_blocked_services_all()
-        
-        # 提取服务信息，只保留id和name字段
-        services = []
-        if response and isinstance(response, dict) and 'blocked_services' in response:
-            for service in response['blocked_services']:
-                services.append({
-                    "id": service.get('id', ''),
-                    "name": service.get('name', '')
-                })
+        # 从缓存的服务目录获取（只包含id和name）
+        try:
+            services = blocked_services_catalog.services(AdGuardService())
+        except Exception as e:
+            logging.warning(f"获取{{ project_name }}可阻止服务目录失败: {str(e)}")
+            services = []
         
         # 如果API返回为空，使用备用静态列表
         if not services:
@@ -1876,6 +1607,35 @@ def api_adguard_blocked_services():
         }), 500
 
 
+@main.route('/api/blocked_services/<service_id>/icon.svg')
+@http_cache(max_age=86400, must_revalidate=False)
+@login_required
+def blocked_service_icon(service_id):
+    """获取可阻止服务的图标
+    
+    图标来自缓存的服务目录，只随{{ project_name }}版本变化，浏览器可以缓存一天。
+    
+    Args:
+        service_id: 服务ID
+        
+    Returns:
+        SVG图标，服务不存在或没有图标时返回404
+    """
+    try:
+        icon = blocked_services_catalog.icon(AdGuardService(), service_id)
+    except Exception as e:
+        logging.warning(f"获取阻止服务图标失败: {str(e)}")
+        icon = None
+    if icon is None:
+        return Response(status=404)
+    
+    response = Response(icon, mimetype='image/svg+xml')
+    # 图标内容来自上游服务器，禁止其中的脚本执行
+    response.headers['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'"
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
 @main.route('/api/adguard/clients/<client_name>')
 @login_required
 @admin_required
@@ -2104,14 +1864,13 @@ def api_update_client_upstreams(client_name):
         # AdGuard API调用成功（即使返回空字典也表示成功）
         if result is not None:
             # 记录操作日志
-            operation_log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='UPDATE',
                 target_type='CLIENT_UPSTREAMS',
                 target_id=client_name,
                 details=f'VIP用户更新客户端上游DNS配置: {client_name}, 上游数量: {len(upstreams)}'
             )
-            db.session.add(operation_log)
             db.session.commit()
             
             logging.info(f"VIP用户 {current_user.username} 成功更新客户端 {client_name} 的上游DNS配置")
@@ -2141,7 +1900,7 @@ def donation_success():
     用户支付完成后的跳转页面
     """
     # 获取捐赠配置以显示排行榜入口
-    donation_config = DonationConfig.query.first()
+    donation_config = DonationConfig.get_config()
     return render_template('main/donation_success.html', donation_config=donation_config)
 
 
@@ -2302,15 +2061,14 @@ def donation_callback():
         amount = data.get('money')
         
         if trade_status == 'TRADE_SUCCESS':
-            # 支付成功，更新捐赠记录
-            from app.utils.timezone import beijing_time
+            # 支付成功，更新捐赠记录并在同一事务中计入捐赠者汇总（重复通知不会重复计入）
             donation_record = DonationRecord.query.filter_by(order_id=order_id).first()
             if donation_record:
-                donation_record.status = 'success'
-                donation_record.trade_no = data.get('trade_no', '')
-                donation_record.paid_at = beijing_time()
-                db.session.commit()
-                logging.info(f"捐赠支付成功：订单ID={order_id}，金额={amount}，捐赠者={donation_record.donor_name}")
+                if donation_record.mark_success(trade_no=data.get('trade_no', '')):
+                    db.session.commit()
+                    logging.info(f"捐赠支付成功：订单ID={order_id}，金额={amount}，捐赠者={donation_record.donor_name}")
+                else:
+                    logging.info(f"捐赠订单已处理：订单ID={order_id}")
             else:
                 logging.warning(f"未找到捐赠记录：订单ID={order_id}")
             return 'SUCCESS'
@@ -2318,7 +2076,7 @@ def donation_callback():
             # 支付失败或其他状态，更新记录状态
             donation_record = DonationRecord.query.filter_by(order_id=order_id).first()
             if donation_record:
-                donation_record.status = 'failed'
+                donation_record.mark_failed()
                 db.session.commit()
             logging.warning(f"捐赠支付状态异常：订单ID={order_id}，状态={trade_status}")
             return 'FAIL'
@@ -2329,6 +2087,7 @@ def donation_callback():
 
 
 @main.route('/sitemap.xml')
+@http_cache(max_age=3600, private=False, must_revalidate=False)
 def sitemap():
     """提供XML网站地图"""
     try:
@@ -2338,6 +2097,7 @@ def sitemap():
 
 
 @main.route('/robots.txt')
+@http_cache(max_age=3600, private=False, must_revalidate=False)
 def robots():
     """提供robots.txt文件"""
     try:
@@ -2560,14 +2320,13 @@ def api_create_client():
             db.session.commit()
             
             # 记录操作日志
-            operation_log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='CREATE',
                 target_type='CLIENT',
                 target_id=client_id,
                 details=f'VIP用户创建新客户端: {client_name} ({client_id})'
             )
-            db.session.add(operation_log)
             db.session.commit()
             
             logging.info(f"VIP用户 {current_user.username} 成功创建客户端: {client_name} ({client_id})")
@@ -2678,14 +2437,13 @@ def api_delete_client(mapping_id):
         db.session.delete(mapping)
         
         # 记录操作日志
-        operation_log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='DELETE',
             target_type='CLIENT',
             target_id=client_name,
             details=f'VIP用户删除客户端: {client_name}'
         )
-        db.session.add(operation_log)
         db.session.commit()
         
         logging.info(f"VIP用户 {current_user.username} 成功删除客户端: {client_name}")
@@ -2793,14 +2551,13 @@ def api_add_client_custom_rule(client_id):
         adguard.add_client_custom_rule(client_id, rule)
         
         # 记录操作日志
-        operation_log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='CREATE',
             target_type='CUSTOM_RULE',
             target_id=f'{client_id}:{rule}',
             details=f'VIP用户为客户端 {client_id} 添加自定义规则: {rule}'
         )
-        db.session.add(operation_log)
         db.session.commit()
         
         logging.info(f"VIP用户 {current_user.username} 为客户端 {client_id} 添加自定义规则: {rule}")
@@ -2865,14 +2622,13 @@ def api_remove_client_custom_rule(client_id):
         adguard.remove_client_custom_rule(client_id, rule)
         
         # 记录操作日志
-        operation_log = OperationLog(
+        audit_log.record(
             user_id=current_user.id,
             operation_type='DELETE',
             target_type='CUSTOM_RULE',
             target_id=f'{client_id}:{rule}',
             details=f'VIP用户为客户端 {client_id} 删除自定义规则: {rule}'
         )
-        db.session.add(operation_log)
         db.session.commit()
         
         logging.info(f"VIP用户 {current_user.username} 为客户端 {client_id} 删除自定义规则: {rule}")
@@ -3011,14 +2767,15 @@ def api_openlist_register():
                 }), 400
             
             # 记录操作日志
-            log_entry = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='CREATE',
                 target_type='OPENLIST_USER',
                 target_id=username,
-                details=f'用户 {current_user.username} 为 {username} 创建OpenList账户，权限: {user_permissions}，根目录: {root_path}'
+                details=f'用户 {current_user.username} 为 {username} 创建OpenList账户，权限: {user_permissions}，根目录: {root_path}',
+                # 账户信息接口从这条日志读取，需要立即写入
+                sync=True
             )
-            db.session.add(log_entry)
             db.session.commit()
             
             # 发送注册成功邮件
@@ -3134,14 +2891,14 @@ def api_sdk_redeem():
         result = sdk.use_sdk(current_user.id)
         if result['success']:
             # 记录操作日志
-            operation_log = OperationLog(
+            audit_log.record(
                 user_id=current_user.id,
                 operation_type='SDK_REDEEM',
                 target_type='SDK',
                 target_id=sdk_code,
-                details=f'用户 {current_user.username} 成功兑换SDK: {sdk_code}，获得 {sdk.vip_days} 天VIP'
+                details=f'用户 {current_user.username} 成功兑换SDK: {sdk_code}，获得 {sdk.vip_days} 天VIP',
+                sync=True
             )
-            db.session.add(operation_log)
             db.session.commit()
             
             logging.info(f"用户 {current_user.username} 成功兑换SDK: {sdk_code}，获得 {sdk.vip_days} 天VIP")
@@ -1,12 +1,15 @@
 from .user import User
 from .client_mapping import ClientMapping
+from .client_request_count import ClientRequestCount
 from .operation_log import OperationLog
 from .adguard_config import AdGuardConfig
 from .dns_config import DnsConfig
 from .announcement import Announcement
 from .dns_import_source import DnsImportSource
+from .dns_import_rule import DnsImportRule
 from .donation_config import DonationConfig
 from .donation_record import DonationRecord
+from .donation_donor import DonationDonor
 from .vip_config import VipConfig
 from .sdk import Sdk
 
@@ -14,5 +17,6 @@ from .feedback import Feedback
 from .verification_code import VerificationCode
 from .email_config import EmailConfig
 from .system_config import SystemConfig
+from .config_version import ConfigVersion
 
-__all__ = ['User', 'ClientMapping', 'OperationLog', 'AdGuardConfig', 'DnsConfig', 'Announcement', 'DnsImportSource', 'DonationConfig', 'DonationRecord', 'VipConfig', 'Sdk', 'Feedback', 'VerificationCode', 'EmailConfig', 'SystemConfig']
\ No newline at end of file
+__all__ = ['User', 'ClientMapping', 'ClientRequestCount', 'OperationLog', 'AdGuardConfig', 'DnsConfig', 'Announcement', 'DnsImportSource', 'DnsImportRule', 'DonationConfig', 'DonationRecord', 'DonationDonor', 'VipConfig', 'Sdk', 'Feedback', 'VerificationCode', 'EmailConfig', 'SystemConfig', 'ConfigVersion']
\ No newline at end of file
@@ -1,7 +1,9 @@
 from app import db
 from urllib.parse import urlparse
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
+@config_cache.register
 class AdGuardConfig(db.Model):
     """{{ project_name }}配置模型
     
@@ -72,14 +74,9 @@ class AdGuardConfig(db.Model):
 
     @classmethod
     def get_config(cls):
-        """获取配置，如果不存在则返回空配置
+        """获取配置，如果不存在则返回空配置（进程内缓存）
         
         Returns:
             AdGuardConfig: 配置对象
         """
-        config = cls.query.first()
-        if not config:
-            config = cls()
-            db.session.add(config)
-            db.session.commit()
-        return config
\ No newline at end of file
+        return config_cache.get(cls)
\ No newline at end of file
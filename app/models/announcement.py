@@ -1,6 +1,8 @@
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
+@config_cache.track
 class Announcement(db.Model):
     """公告模型"""
     __tablename__ = 'announcements'
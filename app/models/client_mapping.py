@@ -1,13 +1,15 @@
 import json
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
+@config_cache.track
 class ClientMapping(db.Model):
     """{{ project_name }}客户端映射模型"""
     __tablename__ = 'client_mappings'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     client_name = db.Column(db.String(100), nullable=False)
     _client_ids = db.Column('client_ids', db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=beijing_time)
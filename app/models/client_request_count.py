@@ -0,0 +1,101 @@
+import json
+from typing import Dict, Iterable, List, Tuple
+from app import db
+from app.models.client_mapping import ClientMapping
+from app.utils.timezone import beijing_time
+
+
+class ClientRequestCount(db.Model):
+    """客户端DNS请求数模型
+
+    保存{{ project_name }}统计数据 top_clients 中每个客户端（名称或IP）的请求数，
+    以及按客户端映射解析出的所属用户。由定时任务整体替换，用户管理页面直接按用户汇总该表，
+    不再在打开页面时请求统计数据并为每个用户匹配客户端。
+    """
+    __tablename__ = 'client_request_counts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    client_key = db.Column(db.String(255), unique=True, nullable=False, comment='客户端名称或ID')
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True,
+                        index=True, comment='所属用户ID')
+    request_count = db.Column(db.Integer, default=0, nullable=False, comment='DNS请求数')
+    updated_at = db.Column(db.DateTime, default=beijing_time, comment='统计时间')
+
+    @classmethod
+    def replace_all(cls, top_clients: Iterable[Tuple[str, int]]) -> int:
+        """用新的统计数据替换全部请求数（提交事务）
+
+        客户端名称或任一客户端ID与统计中的客户端一致时计入该映射的用户，
+        与用户管理页面原先的匹配规则相同。
+
+        Args:
+            top_clients: (客户端名称或IP, 请求数) 列表
+
+        Returns:
+            int: 保存的客户端数量
+        """
+        counts = {}
+        for client_key, request_count in top_clients:
+            if client_key:
+                counts[str(client_key)] = counts.get(str(client_key), 0) + int(request_count or 0)
+
+        owners = cls._owners(set(counts))
+        now = beijing_time()
+        try:
+            cls.query.delete(synchronize_session=False)
+            if counts:
+                db.session.execute(cls.__table__.insert(), [
+                    {'client_key': client_key, 'user_id': owners.get(client_key),
+                     'request_count': request_count, 'updated_at': now}
+                    for client_key, request_count in counts.items()
+                ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return len(counts)
+
+    @classmethod
+    def totals_for(cls, user_ids: List[int]) -> Dict[int, int]:
+        """按用户汇总请求数
+
+        Args:
+            user_ids: 用户ID列表
+
+        Returns:
+            Dict[int, int]: 用户ID -> 请求数（没有请求的用户不包含在内）
+        """
+        if not user_ids:
+            return {}
+        rows = db.session.query(cls.user_id, db.func.sum(cls.request_count)) \
+            .filter(cls.user_id.in_(user_ids)).group_by(cls.user_id).all()
+        return {user_id: int(total or 0) for user_id, total in rows}
+
+    @classmethod
+    def last_updated(cls):
+        """最近一次统计的时间，从未统计过时返回None"""
+        return db.session.query(db.func.max(cls.updated_at)).scalar()
+
+    @staticmethod
+    def _owners(client_keys):
+        """按客户端名称或ID解析所属用户"""
+        owners = {}
+        if not client_keys:
+            return owners
+        # 客户端ID以JSON保存，只读取必要的列在内存中匹配
+        rows = db.session.query(ClientMapping.user_id, ClientMapping.client_name, ClientMapping._client_ids) \
+            .order_by(ClientMapping.id).all()
+        for user_id, client_name, client_ids in rows:
+            if client_name in client_keys:
+                owners.setdefault(client_name, user_id)
+            try:
+                ids = json.loads(client_ids) if client_ids else []
+            except ValueError:
+                continue
+            for client_id in ids:
+                if client_id in client_keys:
+                    owners.setdefault(client_id, user_id)
+        return owners
+
+    def __repr__(self):
+        return f'<ClientRequestCount {self.client_key}: {self.request_count}>'
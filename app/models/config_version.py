@@ -0,0 +1,17 @@
+from app import db
+from app.utils.timezone import beijing_time
+
+class ConfigVersion(db.Model):
+    """配置版本模型
+
+    为每个单行配置表记录一个递增的版本号，配置被修改时版本号加一，
+    各工作进程据此判断本地缓存的配置是否已过期。
+    """
+    __tablename__ = 'config_cache_versions'
+
+    name = db.Column(db.String(50), primary_key=True, comment='配置表名')
+    version = db.Column(db.Integer, default=1, nullable=False, comment='配置版本号')
+    updated_at = db.Column(db.DateTime, default=beijing_time, onupdate=beijing_time)
+
+    def __repr__(self):
+        return f'<ConfigVersion {self.name}: {self.version}>'
@@ -1,6 +1,8 @@
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
+@config_cache.register
 class DnsConfig(db.Model):
     """DNS配置模型
     
@@ -155,17 +157,12 @@ class DnsConfig(db.Model):
     
     @classmethod
     def get_config(cls):
-        """获取DNS配置，如果不存在则创建默认配置
+        """获取DNS配置，如果不存在则创建默认配置（进程内缓存）
         
         Returns:
             DnsConfig: DNS配置对象
         """
-        config = cls.query.first()
-        if not config:
-            config = cls()
-            db.session.add(config)
-            db.session.commit()
-        return config
+        return config_cache.get(cls)
     
     def to_dict(self):
         """将配置转换为字典格式
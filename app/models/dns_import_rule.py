@@ -0,0 +1,168 @@
+import json
+from app import db
+from app.utils.timezone import beijing_time
+from sqlalchemy import func, tuple_
+
+# 按(域名, 地址)成对查询时每批的规则数量（每条规则占两个参数，SQLite对单条语句的参数数量有限制）
+CHUNK_SIZE = 400
+
+
+def _chunked(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class DnsImportRule(db.Model):
+    """DNS重写规则来源模型
+
+    记录每条重写规则由哪些导入源导入（同一条规则可以同时属于多个导入源），
+    按导入源删除或重新同步规则时，只有不再属于任何导入源的规则才会从{{ project_name }}中删除。
+    """
+    __tablename__ = 'dns_import_rules'
+    __table_args__ = (
+        db.UniqueConstraint('source_id', 'domain', 'answer', name='uq_dns_import_rules_source_rule'),
+        db.Index('ix_dns_import_rules_rule', 'domain', 'answer'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_id = db.Column(db.Integer, db.ForeignKey('dns_import_source.id', ondelete='CASCADE'),
+                          nullable=False, index=True, comment='导入源ID')
+    domain = db.Column(db.String(255), nullable=False, comment='域名')
+    answer = db.Column(db.String(255), nullable=False, comment='重写地址')
+    imported_at = db.Column(db.DateTime, default=beijing_time, nullable=False, comment='导入时间')
+
+    @classmethod
+    def rules_for_source(cls, source_id):
+        """获取导入源拥有的全部规则
+
+        Args:
+            source_id: 导入源ID
+
+        Returns:
+            set: (域名, 地址) 集合
+        """
+        rows = db.session.query(cls.domain, cls.answer).filter(cls.source_id == source_id)
+        return {(domain, answer) for domain, answer in rows}
+
+    @classmethod
+    def count_for_source(cls, source_id):
+        """导入源拥有的规则数量"""
+        return db.session.query(func.count(cls.id)).filter(cls.source_id == source_id).scalar() or 0
+
+    @classmethod
+    def owned_rules(cls, rules, exclude_source_id=None):
+        """筛选出属于某个导入源的规则
+
+        Args:
+            rules: (域名, 地址) 列表
+            exclude_source_id: 不计入的导入源ID
+
+        Returns:
+            set: 其中至少属于一个（其他）导入源的规则
+        """
+        owned = set()
+        for chunk in _chunked(set(rules)):
+            query = db.session.query(cls.domain, cls.answer).filter(tuple_(cls.domain, cls.answer).in_(chunk))
+            if exclude_source_id is not None:
+                query = query.filter(cls.source_id != exclude_source_id)
+            owned.update((domain, answer) for domain, answer in query.distinct())
+        return owned
+
+    @classmethod
+    def exclusive_rules(cls, source_id):
+        """只属于指定导入源的规则（删除该导入源时需要从{{ project_name }}中删除的规则）
+
+        Args:
+            source_id: 导入源ID
+
+        Returns:
+            set: (域名, 地址) 集合
+        """
+        rules = cls.rules_for_source(source_id)
+        return rules - cls.owned_rules(rules, exclude_source_id=source_id)
+
+    @classmethod
+    def owners(cls, domain, answer):
+        """查询拥有某条规则的导入源ID
+
+        Args:
+            domain: 域名
+            answer: 重写地址
+
+        Returns:
+            list: 导入源ID列表
+        """
+        rows = db.session.query(cls.source_id).filter_by(domain=domain, answer=answer).order_by(cls.source_id)
+        return [source_id for source_id, in rows]
+
+    @classmethod
+    def sync_source(cls, source_id, rules):
+        """把导入源拥有的规则更新为给定集合（只插入新增的、删除不再拥有的）
+
+        Args:
+            source_id: 导入源ID
+            rules: 导入源现在拥有的 (域名, 地址) 集合
+
+        Returns:
+            tuple: (新增的规则集合, 不再拥有的规则集合)
+        """
+        rules = set(rules)
+        current = cls.rules_for_source(source_id)
+        added = rules - current
+        removed = current - rules
+        cls.release(removed, source_id=source_id)
+        if added:
+            now = beijing_time()
+            db.session.execute(cls.__table__.insert(), [
+                {'source_id': source_id, 'domain': domain, 'answer': answer, 'imported_at': now}
+                for domain, answer in added
+            ])
+        return added, removed
+
+    @classmethod
+    def release(cls, rules, source_id=None):
+        """删除规则的来源记录
+
+        Args:
+            rules: (域名, 地址) 列表
+            source_id: 只删除该导入源的记录；不提供时删除所有导入源的记录（规则已被删除时）
+        """
+        for chunk in _chunked(set(rules)):
+            query = cls.query.filter(tuple_(cls.domain, cls.answer).in_(chunk))
+            if source_id is not None:
+                query = query.filter(cls.source_id == source_id)
+            query.delete(synchronize_session=False)
+
+    @classmethod
+    def release_source(cls, source_id):
+        """删除导入源的全部来源记录"""
+        cls.query.filter(cls.source_id == source_id).delete(synchronize_session=False)
+
+    @classmethod
+    def migrate_snapshots(cls):
+        """把旧版本保存在 DnsImportSource.rules_snapshot 中的JSON快照迁移为来源记录
+
+        Returns:
+            int: 迁移的导入源数量
+        """
+        from app.models.dns_import_source import DnsImportSource
+
+        sources = DnsImportSource.query.filter(DnsImportSource.rules_snapshot.isnot(None)).all()
+        for source in sources:
+            try:
+                snapshot = json.loads(source.rules_snapshot) or []
+            except ValueError:
+                snapshot = []
+            rules = {
+                ((rule.get('domain') or '').strip(), (rule.get('answer') or '').strip())
+                for rule in snapshot if isinstance(rule, dict)
+            }
+            cls.sync_source(source.id, {(domain, answer) for domain, answer in rules if domain and answer})
+            source.rules_snapshot = None
+        if sources:
+            db.session.commit()
+        return len(sources)
+
+    def __repr__(self):
+        return f'<DnsImportRule {self.source_id}: {self.domain} -> {self.answer}>'
@@ -22,8 +22,8 @@ class DnsImportSource(db.Model):
     success_rules = db.Column(db.Integer, default=0, nullable=False, comment='成功导入规则数')
     failed_rules = db.Column(db.Integer, default=0, nullable=False, comment='失败规则数')
     
-    # 规则内容快照（用于删除时匹配）
-    rules_snapshot = db.Column(db.Text, nullable=True, comment='规则内容快照，JSON格式')
+    # 旧版本的规则内容快照（JSON格式），启动时迁移到 dns_import_rules 表后清空
+    rules_snapshot = db.Column(db.Text, nullable=True, comment='规则内容快照，JSON格式（已迁移到dns_import_rules）')
     
     # 状态信息
     status = db.Column(db.String(20), default='active', nullable=False, comment='状态：active/deleted')
@@ -73,38 +73,33 @@ class DnsImportSource(db.Model):
         except:
             return 'Unknown Source'
     
-    def update_import_stats(self, total, success, failed, rules_data=None):
+    def update_import_stats(self, total, success, failed):
         """更新导入统计信息
         
+        导入的规则本身记录在 DnsImportRule 中。
+        
         Args:
             total: 总规则数
             success: 成功规则数
             failed: 失败规则数
-            rules_data: 规则数据（用于快照）
         """
         self.total_rules = total
         self.success_rules = success
         self.failed_rules = failed
         self.last_import_time = beijing_time()
         self.last_sync_at = beijing_time()
-        
-        if rules_data:
-            import json
-            self.rules_snapshot = json.dumps(rules_data, ensure_ascii=False)
     
-    def get_rules_snapshot(self):
-        """获取规则快照
+    def get_rules(self):
+        """获取导入源拥有的规则
         
         Returns:
-            list: 规则列表
+            list: 规则列表，每个规则包含domain和answer字段
         """
-        if self.rules_snapshot:
-            try:
-                import json
-                return json.loads(self.rules_snapshot)
-            except:
-                return []
-        return []
+        from app.models.dns_import_rule import DnsImportRule
+        return [
+            {'domain': domain, 'answer': answer}
+            for domain, answer in sorted(DnsImportRule.rules_for_source(self.id))
+        ]
     
     def mark_as_deleted(self):
         """标记为已删除"""
@@ -1,6 +1,8 @@
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
+@config_cache.register
 class DonationConfig(db.Model):
     """捐赠配置模型
     
@@ -58,17 +60,12 @@ class DonationConfig(db.Model):
     
     @classmethod
     def get_config(cls):
-        """获取捐赠配置，如果不存在则创建默认配置
+        """获取捐赠配置，如果不存在则创建默认配置（进程内缓存）
         
         Returns:
             DonationConfig: 捐赠配置对象
         """
-        config = cls.query.first()
-        if not config:
-            config = cls()
-            db.session.add(config)
-            db.session.commit()
-        return config
+        return config_cache.get(cls)
     
     def is_configured(self):
         """检查捐赠功能是否已正确配置
@@ -0,0 +1,106 @@
+from decimal import Decimal
+from sqlalchemy import func
+from app import db
+from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
+
+
+@config_cache.track
+class DonationDonor(db.Model):
+    """捐赠者汇总模型
+
+    按捐赠者姓名汇总成功的捐赠（累计金额、次数、最近捐赠时间），在支付成功的同一事务中更新，
+    排行榜和捐赠统计直接读取该表，不再对 donation_records 做分组汇总。
+    表的版本号由配置缓存维护，排行榜缓存据此判断是否需要重新加载。
+    """
+    __tablename__ = 'donation_donors'
+
+    id = db.Column(db.Integer, primary_key=True)
+    donor_name = db.Column(db.String(100), unique=True, nullable=False, comment='捐赠者姓名')
+    total_amount = db.Column(db.Numeric(12, 2), default=0, nullable=False, index=True, comment='累计捐赠金额')
+    donation_count = db.Column(db.Integer, default=0, nullable=False, comment='捐赠次数')
+    latest_donation = db.Column(db.DateTime, comment='最近捐赠时间')
+    updated_at = db.Column(db.DateTime, default=beijing_time, onupdate=beijing_time, comment='更新时间')
+
+    @classmethod
+    def record_payment(cls, record):
+        """把一笔成功的捐赠计入汇总（不提交事务）
+
+        Args:
+            record: 状态刚变为成功的 DonationRecord
+        """
+        donor = cls.query.filter_by(donor_name=record.donor_name).first()
+        if donor is None:
+            donor = cls(donor_name=record.donor_name, total_amount=Decimal('0'), donation_count=0)
+            db.session.add(donor)
+        donor.total_amount = Decimal(str(donor.total_amount or 0)) + Decimal(str(record.amount))
+        donor.donation_count = (donor.donation_count or 0) + 1
+        if record.paid_at and (donor.latest_donation is None or record.paid_at > donor.latest_donation):
+            donor.latest_donation = record.paid_at
+
+    @classmethod
+    def revoke_payment(cls, record):
+        """从汇总中扣除一笔之前成功、现在不再成功的捐赠（不提交事务）
+
+        Args:
+            record: 状态由成功变为其他状态的 DonationRecord
+        """
+        from app.models.donation_record import DonationRecord
+
+        donor = cls.query.filter_by(donor_name=record.donor_name).first()
+        if donor is None:
+            return
+        if (donor.donation_count or 0) <= 1:
+            db.session.delete(donor)
+            return
+        donor.total_amount = Decimal(str(donor.total_amount)) - Decimal(str(record.amount))
+        donor.donation_count -= 1
+        # 最近捐赠时间可能正是被扣除的这笔，重新取该捐赠者其余成功捐赠的最大值
+        donor.latest_donation = db.session.query(func.max(DonationRecord.paid_at)).filter(
+            DonationRecord.donor_name == record.donor_name,
+            DonationRecord.status == 'success',
+            DonationRecord.id != record.id
+        ).scalar()
+
+    @classmethod
+    def rebuild(cls):
+        """根据 donation_records 重新生成全部汇总（不提交事务）
+
+        Returns:
+            int: 汇总的捐赠者数量
+        """
+        from app.models.donation_record import DonationRecord
+
+        cls.query.delete(synchronize_session=False)
+        rows = db.session.query(
+            DonationRecord.donor_name,
+            func.sum(DonationRecord.amount),
+            func.count(DonationRecord.id),
+            func.max(DonationRecord.paid_at)
+        ).filter(DonationRecord.status == 'success').group_by(DonationRecord.donor_name).all()
+        db.session.add_all([
+            cls(donor_name=donor_name, total_amount=total_amount, donation_count=donation_count,
+                latest_donation=latest_donation)
+            for donor_name, total_amount, donation_count, latest_donation in rows
+        ])
+        return len(rows)
+
+    @classmethod
+    def ensure_built(cls):
+        """汇总表为空但已有成功的捐赠时（升级自旧版本）生成汇总
+
+        Returns:
+            bool: 是否重新生成了汇总
+        """
+        from app.models.donation_record import DonationRecord
+
+        if db.session.query(cls.id).first() is not None:
+            return False
+        if db.session.query(DonationRecord.id).filter(DonationRecord.status == 'success').first() is None:
+            return False
+        cls.rebuild()
+        db.session.commit()
+        return True
+
+    def __repr__(self):
+        return f'<DonationDonor {self.donor_name}: {self.total_amount}>'
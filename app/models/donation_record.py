@@ -29,7 +29,7 @@ class DonationRecord(db.Model):
     
     @classmethod
     def get_leaderboard(cls, limit=50):
-        """获取捐赠排行榜
+        """获取捐赠排行榜（读取捐赠者汇总的进程内缓存）
         
         Args:
             limit: 返回记录数量限制
@@ -37,23 +37,8 @@ class DonationRecord(db.Model):
         Returns:
             list: 按捐赠总额排序的捐赠者列表
         """
-        from sqlalchemy import func
-        
-        # 按捐赠者姓名分组，计算总捐赠金额和次数
-        result = db.session.query(
-            cls.donor_name,
-            func.sum(cls.amount).label('total_amount'),
-            func.count(cls.id).label('donation_count'),
-            func.max(cls.paid_at).label('latest_donation')
-        ).filter(
-            cls.status == 'success'
-        ).group_by(
-            cls.donor_name
-        ).order_by(
-            func.sum(cls.amount).desc()
-        ).limit(limit).all()
-        
-        return result
+        from app.services.donation_leaderboard_service import donation_leaderboard
+        return donation_leaderboard.leaderboard(limit)
     
     @classmethod
     def get_recent_donations(cls, limit=10):
@@ -65,11 +50,8 @@ class DonationRecord(db.Model):
         Returns:
             list: 最近的捐赠记录
         """
-        return cls.query.filter(
-            cls.status == 'success'
-        ).order_by(
-            cls.paid_at.desc()
-        ).limit(limit).all()
+        from app.services.donation_leaderboard_service import donation_leaderboard
+        return donation_leaderboard.recent(limit)
     
     @classmethod
     def get_total_amount(cls):
@@ -78,15 +60,8 @@ class DonationRecord(db.Model):
         Returns:
             Decimal: 总捐赠金额
         """
-        from sqlalchemy import func
-        
-        result = db.session.query(
-            func.sum(cls.amount)
-        ).filter(
-            cls.status == 'success'
-        ).scalar()
-        
-        return result or 0
+        from app.services.donation_leaderboard_service import donation_leaderboard
+        return donation_leaderboard.total_amount()
     
     @classmethod
     def get_total_count(cls):
@@ -95,9 +70,37 @@ class DonationRecord(db.Model):
         Returns:
             int: 总捐赠次数
         """
-        return cls.query.filter(
-            cls.status == 'success'
-        ).count()
+        from app.services.donation_leaderboard_service import donation_leaderboard
+        return donation_leaderboard.total_count()
+    
+    def mark_success(self, trade_no=None, paid_at=None):
+        """把捐赠标记为成功并计入捐赠者汇总（不提交事务）
+        
+        已经成功的记录不会重复计入，支付平台重复通知时不影响汇总。
+        
+        Args:
+            trade_no: 支付平台交易号
+            paid_at: 支付完成时间，默认当前北京时间
+            
+        Returns:
+            bool: 状态是否由未成功变为成功
+        """
+        if self.status == 'success':
+            return False
+        from app.models.donation_donor import DonationDonor
+        self.status = 'success'
+        if trade_no is not None:
+            self.trade_no = trade_no
+        self.paid_at = paid_at or beijing_time()
+        DonationDonor.record_payment(self)
+        return True
+    
+    def mark_failed(self):
+        """把捐赠标记为失败，之前已计入汇总的从汇总中扣除（不提交事务）"""
+        if self.status == 'success':
+            from app.models.donation_donor import DonationDonor
+            DonationDonor.revoke_payment(self)
+        self.status = 'failed'
     
     def process_vip_upgrade(self):
         """处理VIP升级逻辑
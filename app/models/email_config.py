@@ -1,10 +1,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
 # 避免循环导入，直接从app获取db实例
 from app import db
 
 
+@config_cache.register
 class EmailConfig(db.Model):
     """邮箱配置模型
     
@@ -73,17 +75,12 @@ class EmailConfig(db.Model):
 
     @classmethod
     def get_config(cls):
-        """获取配置，如果不存在则返回空配置
+        """获取配置，如果不存在则返回空配置（进程内缓存）
         
         Returns:
             EmailConfig: 配置对象
         """
-        config = cls.query.first()
-        if not config:
-            config = cls()
-            db.session.add(config)
-            db.session.commit()
-        return config
+        return config_cache.get(cls)
     
     def to_dict(self):
         """转换为字典格式
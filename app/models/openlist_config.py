@@ -1,6 +1,8 @@
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
+@config_cache.register
 class OpenListConfig(db.Model):
     """OpenList配置模型
     
@@ -46,17 +48,12 @@ class OpenListConfig(db.Model):
     
     @classmethod
     def get_config(cls):
-        """获取OpenList配置，如果不存在则创建默认配置
+        """获取OpenList配置，如果不存在则创建默认配置（进程内缓存）
         
         Returns:
             OpenListConfig: OpenList配置对象
         """
-        config = cls.query.first()
-        if not config:
-            config = cls()
-            db.session.add(config)
-            db.session.commit()
-        return config
+        return config_cache.get(cls)
     
     def to_dict(self):
         """将配置对象转换为字典
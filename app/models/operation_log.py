@@ -4,6 +4,10 @@ from app.utils.timezone import beijing_time
 class OperationLog(db.Model):
     """操作日志模型"""
     __tablename__ = 'operation_logs'
+    __table_args__ = (
+        # 日志页面按 (created_at, id) 键集分页，归档按同一顺序取出过期日志
+        db.Index('ix_operation_logs_created_at_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
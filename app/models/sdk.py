@@ -94,15 +94,15 @@ class Sdk(db.Model):
             user.extend_vip(self.vip_days)
             
             # 记录操作日志
-            from app.models.operation_log import OperationLog
-            log = OperationLog(
+            from app.utils.audit_log import audit_log
+            audit_log.record(
                 user_id=user_id,
                 operation_type='use_sdk',
                 target_type='SDK',
                 target_id=str(self.id),
-                details=f'使用SDK充值码：{self.sdk_code}，获得{self.vip_days}天VIP'
+                details=f'使用SDK充值码：{self.sdk_code}，获得{self.vip_days}天VIP',
+                sync=True
             )
-            db.session.add(log)
             
             return {
                 'success': True,
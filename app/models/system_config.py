@@ -1,6 +1,8 @@
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
+@config_cache.register
 class SystemConfig(db.Model):
     """系统配置模型
     
@@ -25,14 +27,9 @@ class SystemConfig(db.Model):
     
     @classmethod
     def get_config(cls):
-        """获取系统配置，如果不存在则创建默认配置
+        """获取系统配置，如果不存在则创建默认配置（进程内缓存）
         
         Returns:
             SystemConfig: 系统配置对象
         """
-        config = cls.query.first()
-        if not config:
-            config = cls()
-            db.session.add(config)
-            db.session.commit()
-        return config
\ No newline at end of file
+        return config_cache.get(cls)
\ No newline at end of file
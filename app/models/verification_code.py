@@ -7,6 +7,11 @@ import string
 class VerificationCode(db.Model):
     """邮箱验证码模型"""
     __tablename__ = 'verification_codes'
+    __table_args__ = (
+        # 发送和验证都按 (邮箱, 类型, 验证码) 查找；定期清理按过期时间删除
+        db.Index('ix_verification_codes_lookup', 'email', 'code_type', 'code'),
+        db.Index('ix_verification_codes_expires_at', 'expires_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), nullable=False, index=True)
@@ -72,64 +77,76 @@ class VerificationCode(db.Model):
         if code:
             code = ''.join(c for c in str(code) if c.isdigit())
         
-        logger.info(f"验证码验证尝试: email={email}, code={code}, code_type={code_type}")
+        logger.info(f"验证码验证尝试: email={email}, code_type={code_type}")
         
-        # 查找所有该邮箱的验证码记录（用于调试）
-        all_codes = cls.query.filter_by(
-            email=email,
-            code_type=code_type
-        ).order_by(cls.created_at.desc()).all()
+        # 用一条带条件的UPDATE完成查找和标记，同一验证码被并发提交时只有一次能成功
+        now = datetime.now()
+        updated = cls.query.filter(
+            cls.email == email,
+            cls.code_type == code_type,
+            cls.code == code,
+            cls.used.is_(False),
+            cls.expires_at >= now
+        ).update({cls.used: True}, synchronize_session=False)
+        db.session.commit()
         
-        logger.info(f"找到 {len(all_codes)} 条验证码记录")
-        for i, vc in enumerate(all_codes):
-            logger.info(f"记录{i+1}: code={vc.code}, used={vc.used}, expires_at={vc.expires_at}")
+        if updated:
+            logger.info(f"验证码验证成功: email={email}")
+            return True, '验证成功'
         
-        # 查找匹配的未使用验证码
-        verification_code = cls.query.filter_by(
+        # 验证失败时再查询具体原因
+        matched = cls.query.filter_by(
             email=email,
             code=code,
-            code_type=code_type,
-            used=False
-        ).first()
-        
-        if not verification_code:
-            # 检查是否存在该验证码但已被使用
-            used_code = cls.query.filter_by(
-                email=email,
-                code=code,
-                code_type=code_type,
-                used=True
-            ).first()
-            
-            if used_code:
-                logger.warning(f"验证码已被使用: {code}")
-                return False, '验证码已被使用，请重新获取验证码'
-            
-            # 检查是否有未过期的验证码
-            valid_codes = cls.query.filter_by(
-                email=email,
-                code_type=code_type,
-                used=False
-            ).filter(cls.expires_at > datetime.now()).all()
-            
-            if valid_codes:
-                logger.warning(f"验证码不匹配，但存在有效验证码: {[vc.code for vc in valid_codes]}")
-                return False, '验证码不正确，请检查输入的验证码'
-            else:
-                logger.warning(f"没有找到有效的验证码")
-                return False, '验证码不正确或已过期，请重新获取验证码'
-        
-        # 检查验证码是否过期
-        if verification_code.expires_at < datetime.now():
-            logger.warning(f"验证码已过期: {code}, expires_at={verification_code.expires_at}")
+            code_type=code_type
+        ).order_by(cls.used.asc()).first()
+        
+        if matched and matched.used:
+            logger.warning(f"验证码已被使用: email={email}")
+            return False, '验证码已被使用，请重新获取验证码'
+        
+        if matched:
+            logger.warning(f"验证码已过期: email={email}, expires_at={matched.expires_at}")
             return False, '验证码已过期，请重新获取验证码'
         
-        # 标记为已使用
-        verification_code.used = True
-        db.session.commit()
+        # 检查是否有未过期的验证码
+        has_valid_code = db.session.query(cls.id).filter(
+            cls.email == email,
+            cls.code_type == code_type,
+            cls.used.is_(False),
+            cls.expires_at > now
+        ).first() is not None
+        
+        if has_valid_code:
+            logger.warning(f"验证码不匹配，但存在有效验证码: email={email}")
+            return False, '验证码不正确，请检查输入的验证码'
+        logger.warning(f"没有找到有效的验证码: email={email}")
+        return False, '验证码不正确或已过期，请重新获取验证码'
+
+    @classmethod
+    def purge(cls, grace_hours=24, batch_size=2000):
+        """删除过期超过指定时间的验证码（包括已使用的）
+        
+        过期后保留一段时间，期间重复提交已使用的验证码仍能得到准确的提示。
+        分批删除并逐批提交，积压较多时也不会长时间占用数据库写锁。
         
-        logger.info(f"验证码验证成功: {code}")
-        return True, '验证成功'
+        Args:
+            grace_hours: 过期后保留的小时数
+            batch_size: 每批删除的记录数量
+            
+        Returns:
+            int: 删除的记录数量
+        """
+        cutoff = datetime.now() - timedelta(hours=grace_hours)
+        deleted = 0
+        while True:
+            batch = db.session.query(cls.id).filter(cls.expires_at < cutoff).limit(batch_size).scalar_subquery()
+            count = cls.query.filter(cls.id.in_(batch)).delete(synchronize_session=False)
+            db.session.commit()
+            deleted += count
+            if count < batch_size:
+                break
+        return deleted
 
     def is_expired(self):
         """检查验证码是否过期"""
@@ -1,7 +1,9 @@
 from app import db
 from app.utils.timezone import beijing_time
+from app.utils.config_cache import config_cache
 
 
+@config_cache.register
 class VipConfig(db.Model):
     """VIP配置模型
     
@@ -47,17 +49,12 @@ class VipConfig(db.Model):
 
     @classmethod
     def get_config(cls):
-        """获取VIP配置，如果不存在则创建默认配置
+        """获取VIP配置，如果不存在则创建默认配置（进程内缓存）
         
         Returns:
             VipConfig: VIP配置对象
         """
-        config = cls.query.first()
-        if not config:
-            config = cls()
-            db.session.add(config)
-            db.session.commit()
-        return config
+        return config_cache.get(cls)
 
     def calculate_vip_days(self, amount):
         """根据捐赠金额计算VIP天数
@@ -1,16 +1,44 @@
+import asyncio
+import json as jsonlib
+import threading
+import time
+import httpx
 import requests
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from app.models.adguard_config import AdGuardConfig
+from app.services.log_search_service import log_search
+from flask import current_app, has_app_context
+from app.utils.circuit_breaker import UpstreamUnavailableError, circuit_breakers, mark_stale
+from app.utils.log_filter import compile_log_filter, domain_search_term, has_wildcard, is_blocked
+from app.utils.metrics import MeteredRetry, metrics
 
 class AdGuardService:
     """{{ project_name }} API服务类
     
     用于处理所有与{{ project_name }}的API交互，包括客户端管理、过滤规则配置等。
     所有方法都会自动从数据库获取API配置信息。
+    
+    所有请求经过按服务器地址划分的熔断器：服务器连续不可用时直接快速失败；
+    统计、客户端、阻止服务和重写规则等只读接口在服务器不可用时返回最近一次成功的数据，
+    并把 ``stale`` 标记为True。
     """
     
+    # 服务器不可用时可以返回最近一次成功数据的只读接口
+    STALE_ENDPOINTS = {
+        '/control/stats',
+        '/control/clients',
+        '/control/blocked_services/all',
+        '/control/blocked_services/get',
+        '/control/rewrite/list',
+    }
+    # 最近一次成功数据的默认最长保留时间（秒）
+    STALE_MAX_AGE = 3600
+    
+    # 各只读接口最近一次成功的响应内容：{(服务器地址, 端点, 参数): (响应内容, 时间)}
+    _last_known_good = {}
+    _last_known_good_lock = threading.Lock()
+    
     def __init__(self, config: Optional[AdGuardConfig] = None):
         """
         初始化{{ project_name }}服务实例
@@ -46,15 +74,146 @@ class AdGuardService:
         self.session = requests.Session()
         
         # 配置重试策略
-        retry_strategy = Retry(
+        retry_strategy = MeteredRetry(
             total=3,  # 最多重试3次
             backoff_factor=0.5,  # 重试间隔时间
-            status_forcelist=[500, 502, 503, 504]  # 这些状态码会触发重试
+            status_forcelist=[500, 502, 503, 504],  # 这些状态码会触发重试
+            service='adguard'
         )
         adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount('http://', adapter)
         self.session.mount('https://', adapter)
+        
+        # 熔断器按服务器地址共享；stale表示本实例是否返回过缓存的旧数据
+        self.breaker = circuit_breakers.get('adguard', self.base_url)
+        self.stale = False
     
+    @staticmethod
+    def _control_endpoint(endpoint: str) -> str:
+        """规范化API端点路径，确保以/control/开头"""
+        # 确保endpoint以/开头
+        if not endpoint.startswith('/'):
+            endpoint = '/' + endpoint
+            
+        # 对于所有API，添加/control前缀（除非已经有了）
+        if not endpoint.startswith('/control/'):
+            endpoint = '/control' + endpoint
+        return endpoint
+
+    @staticmethod
+    def _parse_response(response, endpoint: str) -> Dict:
+        """检查响应状态并解析JSON数据（兼容requests和httpx的响应对象）
+        
+        Args:
+            response: HTTP响应对象
+            endpoint: API端点路径，用于错误信息
+            
+        Returns:
+            API响应的JSON数据
+            
+        Raises:
+            Exception: 当响应状态异常或无法解析时
+        """
+        # 处理常见的HTTP错误
+        if response.status_code == 401:
+            raise Exception("认证失败：请检查用户名和密码是否正确")
+        elif response.status_code == 403:
+            raise Exception("权限不足：当前用户没有执行此操作的权限")
+        elif response.status_code == 404:
+            raise Exception(f"API端点不存在：{endpoint}")
+        elif response.status_code >= 500:
+            raise UpstreamUnavailableError(f"{{ project_name }}服务器错误（状态码：{response.status_code}）")
+            
+        # 尝试解析响应数据
+        try:
+            if response.content:
+                data = response.json()
+                if isinstance(data, dict) and 'error' in data:
+                    raise Exception(f"API错误：{data['error']}")
+                return data
+            return {}
+        except ValueError:
+            # 对于成功的响应，即使不是JSON格式也返回空字典
+            if 200 <= response.status_code < 300:
+                # 静默处理非JSON响应
+                return {}
+            # 对于错误响应，提供更详细的错误信息
+            error_content = response.content.decode('utf-8', errors='replace')[:200]
+            raise Exception(f"无法解析服务器响应：响应不是有效的JSON格式。状态码：{response.status_code}，内容：{error_content}...")
+
+    def fetch_concurrently(self, calls: Dict[str, Tuple]) -> Dict[str, Union[Dict, List, Exception]]:
+        """并发发送多个互不依赖的API请求
+        
+        基于httpx的异步客户端同时发出所有请求，总耗时接近其中最慢的一个请求，
+        而不是所有请求耗时之和。
+        
+        Args:
+            calls: {结果键: (HTTP方法, API端点[, 查询参数])} 字典
+            
+        Returns:
+            {结果键: 响应数据}，单个请求失败时对应的值为异常对象
+        """
+        if not calls:
+            return {}
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self._fetch_all(calls))
+
+        # 已经处于事件循环中时无法再启动新的循环，退化为顺序请求
+        results = {}
+        for key, call in calls.items():
+            method, endpoint, params = (tuple(call) + (None,))[:3]
+            try:
+                results[key] = self._make_request(method, endpoint, params=params)
+            except Exception as e:
+                results[key] = e
+        return results
+
+    async def _fetch_all(self, calls: Dict[str, Tuple]) -> Dict:
+        transport = httpx.AsyncHTTPTransport(retries=3)
+        async with httpx.AsyncClient(headers=self.headers, timeout=5, transport=transport) as client:
+            keys = list(calls)
+            responses = await asyncio.gather(
+                *(self._fetch_one(client, *calls[key]) for key in keys),
+                return_exceptions=True
+            )
+        return dict(zip(keys, responses))
+
+    async def _fetch_one(self, client, method: str, endpoint: str, params: Optional[Dict] = None):
+        endpoint = self._control_endpoint(endpoint)
+        stale_key = self._stale_key(method, endpoint, params)
+        try:
+            self.breaker.before_request()
+            response = await self._send_async(client, method, endpoint, params)
+            data = self._parse_response(response, endpoint)
+        except UpstreamUnavailableError as e:
+            return self._serve_stale(stale_key, e)
+        self._remember(stale_key, response)
+        return data
+
+    async def _send_async(self, client, method: str, endpoint: str, params: Optional[Dict] = None):
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            try:
+                response = await client.request(method, f"{self.base_url}{endpoint}", params=params)
+                status = response.status_code
+            finally:
+                metrics.observe_upstream('adguard', endpoint, method, status, time.perf_counter() - start,
+                                         detail={'params': params, 'json': None})
+        except httpx.ConnectError as e:
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError(f"无法连接到{{ project_name }}服务器（{self.base_url}）：{str(e)}")
+        except httpx.TimeoutException as e:
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError(f"连接{{ project_name }}服务器超时（{self.base_url}）：{str(e)}")
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError(f"请求{{ project_name }} API失败：{str(e)}")
+        self._record_status(response.status_code)
+        return response
+
     def _make_request(
         self, 
         method: str, 
@@ -76,62 +235,56 @@ class AdGuardService:
         Raises:
             Exception: 当API请求失败时，包含详细的错误信息
         """
-        # 确保endpoint以/开头
-        if not endpoint.startswith('/'):
-            endpoint = '/' + endpoint
-            
-        # 对于所有API，添加/control前缀（除非已经有了）
-        if not endpoint.startswith('/control/'):
-            endpoint = '/control' + endpoint
-            
+        endpoint = self._control_endpoint(endpoint)
+        stale_key = self._stale_key(method, endpoint, params)
+        try:
+            self.breaker.before_request()
+            response = self._send(method, endpoint, json, params)
+            data = self._parse_response(response, endpoint)
+        except UpstreamUnavailableError as e:
+            return self._serve_stale(stale_key, e)
+        self._remember(stale_key, response)
+        return data
+
+    def _send(self, method: str, endpoint: str, json: Optional[Dict], params: Optional[Dict]):
+        """发送请求并把结果记入熔断器
+        
+        Raises:
+            UpstreamUnavailableError: 连接失败、超时或服务器错误（重试之后）
+            Exception: 其他请求错误
+        """
         url = f"{self.base_url}{endpoint}"
         
-        # 静默处理请求，不输出日志
+        # 静默处理请求，不输出日志，只记录调用指标
+        start = time.perf_counter()
+        status = 'error'
         
         try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                headers=self.headers,
-                json=json,
-                params=params,
-                timeout=5  # 减少超时时间，避免批量操作时长时间等待
-            )
-
-            # 静默处理响应，不输出日志
-            
-            # 处理常见的HTTP错误
-            if response.status_code == 401:
-                raise Exception("认证失败：请检查用户名和密码是否正确")
-            elif response.status_code == 403:
-                raise Exception("权限不足：当前用户没有执行此操作的权限")
-            elif response.status_code == 404:
-                raise Exception(f"API端点不存在：{endpoint}")
-            elif response.status_code >= 500:
-                raise Exception(f"{{ project_name }}服务器错误（状态码：{response.status_code}）")
-                
-            # 尝试解析响应数据
             try:
-                if response.content:
-                    data = response.json()
-                    if isinstance(data, dict) and 'error' in data:
-                        raise Exception(f"API错误：{data['error']}")
-                    return data
-                return {}
-            except ValueError:
-                # 对于成功的响应，即使不是JSON格式也返回空字典
-                if 200 <= response.status_code < 300:
-                    # 静默处理非JSON响应
-                    return {}
-                # 对于错误响应，提供更详细的错误信息
-                error_content = response.content.decode('utf-8', errors='replace')[:200]
-                raise Exception(f"无法解析服务器响应：响应不是有效的JSON格式。状态码：{response.status_code}，内容：{error_content}...")
-            
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    headers=self.headers,
+                    json=json,
+                    params=params,
+                    timeout=5  # 减少超时时间，避免批量操作时长时间等待
+                )
+                status = response.status_code
+            finally:
+                metrics.observe_upstream('adguard', endpoint, method, status, time.perf_counter() - start,
+                                         detail={'params': params, 'json': json})
         except requests.exceptions.ConnectionError as e:
-            raise Exception(f"无法连接到{{ project_name }}服务器（{self.base_url}）：{str(e)}")
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError(f"无法连接到{{ project_name }}服务器（{self.base_url}）：{str(e)}")
         except requests.exceptions.Timeout as e:
-            raise Exception(f"连接{{ project_name }}服务器超时（{self.base_url}）：{str(e)}")
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError(f"连接{{ project_name }}服务器超时（{self.base_url}）：{str(e)}")
+        except requests.exceptions.RetryError as e:
+            # 服务器错误重试次数用尽
+            self.breaker.record_failure()
+            raise UpstreamUnavailableError(f"请求{{ project_name }} API失败：{str(e)}")
         except requests.exceptions.RequestException as e:
+            self.breaker.release()
             if hasattr(e, 'response') and e.response is not None:
                 error_msg = f"状态码：{e.response.status_code}"
                 try:
@@ -142,6 +295,58 @@ class AdGuardService:
                     pass
                 raise Exception(f"请求{{ project_name }} API失败：{error_msg}")
             raise Exception(f"请求{{ project_name }} API失败：{str(e)}")
+        
+        self._record_status(response.status_code)
+        return response
+
+    def _record_status(self, status_code: int):
+        """根据响应状态码记录熔断器结果，服务器错误计为失败
+
+        认证失败（401/403）说明服务器可达但凭据有误，既不计为成功也不计为失败。
+        """
+        if status_code >= 500:
+            self.breaker.record_failure()
+        elif status_code in (401, 403):
+            self.breaker.release()
+        else:
+            self.breaker.record_success()
+
+    def _stale_key(self, method: str, endpoint: str, params: Optional[Dict]) -> Optional[Tuple]:
+        """返回可以使用旧数据兜底的请求的缓存键，其他请求返回None"""
+        if method.upper() != 'GET' or endpoint not in self.STALE_ENDPOINTS:
+            return None
+        return (self.base_url, endpoint, tuple(sorted((params or {}).items())))
+
+    def _remember(self, key: Optional[Tuple], response):
+        """保存只读接口最近一次成功的响应内容"""
+        if key is None or not 200 <= response.status_code < 300:
+            return
+        with self._last_known_good_lock:
+            self._last_known_good[key] = (response.content, time.time())
+
+    def _serve_stale(self, key: Optional[Tuple], error: Exception):
+        """服务器不可用时返回最近一次成功的数据，没有可用数据时抛出原异常
+        
+        Args:
+            key: 请求的缓存键
+            error: 请求失败的异常
+            
+        Returns:
+            最近一次成功的响应数据
+            
+        Raises:
+            UpstreamUnavailableError: 没有可用的旧数据时
+        """
+        entry = self._last_known_good.get(key) if key is not None else None
+        max_age = current_app.config.get('ADGUARD_STALE_MAX_AGE', self.STALE_MAX_AGE) \
+            if has_app_context() else self.STALE_MAX_AGE
+        if entry is None or time.time() - entry[1] > max_age:
+            raise error
+        
+        self.stale = True
+        mark_stale('adguard')
+        metrics.record_cache('adguard_stale', hit=True)
+        return jsonlib.loads(entry[0]) if entry[0] else {}
 
     def get_query_log(self, older_than: Optional[str] = None, limit: int = 100, 
                      offset: Optional[int] = None, search: Optional[str] = None,
@@ -173,49 +378,49 @@ class AdGuardService:
     def get_query_log_advanced(self, filters: Dict, limit: int = 50, older_than: Optional[str] = None) -> Dict:
         """高级搜索查询日志
 
+        本地过滤后不足一页时会继续向后拉取日志，直到凑满 limit 条或用完扫描预算。
+
         Args:
             filters: 包含所有过滤条件的字典
             limit: 返回的日志条目数
-            older_than: 用于分页
+            older_than: 用于分页（上一次搜索返回的 oldest）
 
         Returns:
-            处理后的日志数据和统计信息
+            处理后的日志数据、统计信息、继续搜索的游标和扫描统计
         """
         # 构建基础参数
         params = {
-            'limit': limit,
-            'older_than': older_than if older_than else '',
             'response_status': 'all' # 默认获取所有状态
         }
 
-        # 处理搜索词（域名或客户端）
+        # 处理搜索词（域名或客户端），域名通配符只把字面部分交给服务端，完整匹配在本地进行
         search_terms = []
         if filters.get('domain'):
-            search_terms.append(filters['domain'])
+            domain = filters['domain']
+            search_terms.append(domain_search_term(domain) if has_wildcard(domain) else domain)
         if filters.get('client'):
             search_terms.append(filters['client'])
+        search_terms = [term for term in search_terms if term]
         if search_terms:
             params['search'] = ' '.join(search_terms)
 
-        # 直接调用 /querylog 端点
-        raw_logs = self._make_request('GET', '/querylog', params=params)
-        
-        # 在Python端进行过滤
-        filtered_data = self._filter_logs(raw_logs.get('data', []), filters)
-
-        # 计算统计信息
-        stats = self._calculate_stats(filtered_data)
+        # 直接调用 /querylog 端点，在Python端进行过滤
+        def fetch(cursor, batch):
+            return self._make_request('GET', '/querylog', params={**params, 'limit': batch, 'older_than': cursor or ''})
 
-        # 获取下一页的 oldest 时间戳
-        oldest_timestamp = None
-        if filtered_data:
-            oldest_timestamp = filtered_data[-1]['time']
+        match = self._compile_filters(filters)
+        result = log_search.search(
+            fetch, match, limit, older_than=older_than,
+            start_time=filters.get('start_time'), end_time=filters.get('end_time')
+        )
+        filtered_data = result['data']
 
         return {
             'data': filtered_data,
-            'stats': stats,
-            'oldest': oldest_timestamp,
-            'has_more': len(raw_logs.get('data', [])) == limit
+            'stats': self._calculate_stats(filtered_data),
+            'oldest': result['oldest'],
+            'has_more': result['has_more'],
+            'scan': result['scan']
         }
 
     def _filter_logs(self, logs: List[Dict], filters: Dict) -> List[Dict]:
@@ -231,46 +436,19 @@ class AdGuardService:
         if not filters:
             return logs
 
-        from dateutil import parser
-
-        filtered_logs = []
-        for log in logs:
-            match = True
-            
-            # 时间范围过滤
-            log_time = parser.isoparse(log['time'])
-            if filters.get('start_time'):
-                start_time = parser.isoparse(filters['start_time'])
-                if log_time < start_time:
-                    match = False
-            if filters.get('end_time'):
-                end_time = parser.isoparse(filters['end_time'])
-                if log_time > end_time:
-                    match = False
+        # 过滤条件只编译一次，逐条日志只调用编译好的判断函数
+        match = self._compile_filters(filters)
+        return [log for log in logs if match(log)]
 
-            # 查询类型过滤
-            if filters.get('query_type') and log['question']['type'] != filters['query_type']:
-                match = False
-            
-            # 阻止状态过滤
-            if filters.get('blocked') is not None:
-                is_blocked = 'reason' in log and log['reason'] != 'NotFilteredWhiteList'
-                if is_blocked != filters['blocked']:
-                    match = False
-            
-            # 阻止原因过滤
-            if filters.get('reason') and (not log.get('reason') or filters['reason'].lower() not in log['reason'].lower()):
-                match = False
-
-            if match:
-                filtered_logs.append(log)
-        
-        return filtered_logs
+    @staticmethod
+    def _compile_filters(filters: Dict):
+        """把需要在本地应用的过滤条件编译为判断函数"""
+        return compile_log_filter(filters, keys=('domain', 'query_type', 'blocked', 'reason', 'start_time', 'end_time'))
 
     def _calculate_stats(self, logs: List[Dict]) -> Dict:
         """计算过滤后日志的统计信息"""
         total_queries = len(logs)
-        blocked_queries = sum(1 for log in logs if 'reason' in log and log['reason'] != 'NotFilteredWhiteList')
+        blocked_queries = sum(1 for log in logs if is_blocked(log))
         allowed_queries = total_queries - blocked_queries
         block_rate = (blocked_queries / total_queries * 100) if total_queries > 0 else 0
         unique_domains = len(set(log['question']['name'] for log in logs))
@@ -618,12 +796,13 @@ class AdGuardService:
         data = {"name": name}
         return self._make_request('POST', '/clients/delete', json=data)
     
-    def batch_delete_clients(self, names: List[str], skip_missing: bool = True) -> Dict:
+    def batch_delete_clients(self, names: List[str], skip_missing: bool = True, max_workers: int = 1) -> Dict:
         """批量删除{{ project_name }}客户端
         
         Args:
             names: 要删除的客户端名称列表
             skip_missing: 是否跳过不存在的客户端，默认为True
+            max_workers: 并发删除的线程数，默认为1（逐个删除）
             
         Returns:
             批量删除操作的结果统计
@@ -635,36 +814,79 @@ class AdGuardService:
             'details': []
         }
         
-        for name in names:
+        def _delete(name):
+            # 批量删除时跳过存在性检查以提高性能
             try:
-                # 批量删除时跳过存在性检查以提高性能
                 self.delete_client(name, check_exists=False)
+                return name, None
+            except Exception as e:
+                return name, e
+        
+        if max_workers > 1 and len(names) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor:
+                outcomes = list(executor.map(_delete, names))
+        else:
+            outcomes = [_delete(name) for name in names]
+        
+        for name, error in outcomes:
+            if error is None:
                 results['success_count'] += 1
                 results['details'].append({
                     'name': name,
                     'status': 'success'
                 })
-            except Exception as e:
-                error_msg = str(e)
-                # 如果跳过缺失的客户端且错误是客户端不存在
-                if skip_missing and ('not found' in error_msg.lower() or '不存在' in error_msg):
-                    results['success_count'] += 1
-                    results['details'].append({
-                        'name': name,
-                        'status': 'skipped',
-                        'reason': 'client_not_found'
-                    })
-                else:
-                    results['failed_count'] += 1
-                    results['errors'].append(f"客户端 {name}: {error_msg}")
-                    results['details'].append({
-                        'name': name,
-                        'status': 'failed',
-                        'error': error_msg
-                    })
+                continue
+            
+            error_msg = str(error)
+            # 如果跳过缺失的客户端且错误是客户端不存在
+            if skip_missing and ('not found' in error_msg.lower() or '不存在' in error_msg):
+                results['success_count'] += 1
+                results['details'].append({
+                    'name': name,
+                    'status': 'skipped',
+                    'reason': 'client_not_found'
+                })
+            else:
+                results['failed_count'] += 1
+                results['errors'].append(f"客户端 {name}: {error_msg}")
+                results['details'].append({
+                    'name': name,
+                    'status': 'failed',
+                    'error': error_msg
+                })
         
         return results
     
+    def remove_clients_from_allowlist(self, client_ids: List[str]) -> List[str]:
+        """从允许客户端列表中批量移除客户端ID
+        
+        只读取一次访问控制列表，并在有变化时只写入一次。
+        
+        Args:
+            client_ids: 要移除的客户端ID列表
+            
+        Returns:
+            List[str]: 实际被移除的客户端ID列表
+        """
+        to_remove = set(client_ids)
+        if not to_remove:
+            return []
+        
+        access_list = self._make_request('GET', '/access/list')
+        allowed_clients = access_list.get('allowed_clients', [])
+        
+        removed = [client_id for client_id in allowed_clients if client_id in to_remove]
+        if removed:
+            access_data = {
+                'allowed_clients': [client_id for client_id in allowed_clients if client_id not in to_remove],
+                'disallowed_clients': access_list.get('disallowed_clients', []),
+                'blocked_hosts': access_list.get('blocked_hosts', [])
+            }
+            self._make_request('POST', '/access/set', json=access_data)
+        
+        return removed
+    
     def search_clients(
         self,
         search_criteria: Union[str, List[str]]
@@ -759,6 +981,11 @@ class AdGuardService:
             if not is_valid:
                 print(f"{{ project_name }}配置验证失败: {error_msg}")
                 return False
+            
+            # 熔断期间直接视为不可用；其他情况都要实际请求，以验证认证信息
+            if self.breaker.is_open:
+                print(f"连接{{ project_name }}服务器失败: 服务器暂时不可用（已熔断）")
+                return False
                 
             # 尝试获取状态信息来验证连接和认证
             print(f"尝试连接{{ project_name }}服务器: {self.base_url}")
@@ -788,6 +1015,31 @@ class AdGuardService:
             print(f"获取所有客户端失败: {str(e)}")
             return []
 
+    def get_stats_and_clients(self) -> Tuple[Dict, List[Dict]]:
+        """并发获取统计数据和所有已配置的客户端
+        
+        Returns:
+            (统计数据字典, 客户端列表)，获取失败的部分分别返回空字典和空列表
+        """
+        results = self.fetch_concurrently({
+            'stats': ('GET', '/stats'),
+            'clients': ('GET', '/clients')
+        })
+        
+        stats = results['stats']
+        if isinstance(stats, Exception):
+            print(f"获取{{ project_name }}统计数据失败: {str(stats)}")
+            stats = {}
+        
+        clients = results['clients']
+        if isinstance(clients, Exception):
+            print(f"获取所有客户端失败: {str(clients)}")
+            clients = []
+        else:
+            clients = clients.get('clients', [])
+        
+        return stats, clients
+
     def get_stats(self) -> Dict:
         """获取{{ project_name }}统计数据
         
@@ -889,11 +1141,12 @@ class AdGuardService:
             print(f"更新DNS重写规则失败: {str(e)}")
             raise
     
-    def batch_add_rewrite_rules(self, rules: List[Dict]) -> Dict:
+    def batch_add_rewrite_rules(self, rules: List[Dict], added: Optional[List[Dict]] = None) -> Dict:
         """批量添加DNS重写规则
         
         Args:
             rules: 重写规则列表，每个规则包含domain和answer字段
+            added: 提供时把添加成功的规则追加到该列表中
             
         Returns:
             Dict: 操作结果，包含成功和失败的统计信息
@@ -916,6 +1169,8 @@ class AdGuardService:
                 
                 self.add_rewrite_rule(domain, answer)
                 results["success"] += 1
+                if added is not None:
+                    added.append({"domain": domain, "answer": answer})
             except Exception as e:
                 results["failed"] += 1
                 results["errors"].append(f"添加规则 {rule.get('domain', 'unknown')} -> {rule.get('answer', 'unknown')} 失败: {str(e)}")
@@ -967,6 +1222,7 @@ class AdGuardService:
         try:
             import requests
             from app.models.dns_import_source import DnsImportSource
+            from app.models.dns_import_rule import DnsImportRule
             from app import db
             
             # 获取远程文件内容
@@ -1035,60 +1291,77 @@ class AdGuardService:
                     # 新域名，允许导入
                     filtered_rules.append(rule)
              
+            # 查找或创建导入源记录
+            import_source = DnsImportSource.find_by_url(url)
+            if not import_source:
+                import_source = DnsImportSource(source_url=url)
+                db.session.add(import_source)
+                db.session.flush()
+            
+            # 重新同步：该导入源以前导入、但列表中已不存在且不属于其他导入源的规则需要删除
+            listed = {(rule['domain'].strip(), rule['answer'].strip()) for rule in rules}
+            stale = DnsImportRule.rules_for_source(import_source.id) - listed
+            stale_orphans = stale - DnsImportRule.owned_rules(stale, exclude_source_id=import_source.id)
+            stale_to_delete = [
+                {'domain': domain, 'answer': answer}
+                for domain, answer in stale_orphans
+                if f"{domain.lower()}:{answer}" in existing_rules_set
+            ]
+            rules_to_delete.extend(stale_to_delete)
+            removed_rules = len(stale_to_delete)
+            
             # 先删除需要替换的旧规则
             if rules_to_delete:
                 delete_result = self.batch_delete_rewrite_rules(rules_to_delete)
                 print(f"删除旧规则结果：成功 {delete_result.get('success', 0)} 条，失败 {delete_result.get('failed', 0)} 条")
-            
-            # 如果没有需要导入的规则
-            if not filtered_rules:
-                return {
-                    "success": True,
-                    "message": f"从URL解析出 {len(rules)} 条规则，但全部为重复规则，跳过导入",
-                    "rules_parsed": len(rules),
-                    "import_result": {
-                        "success": 0,
-                        "failed": 0,
-                        "skipped_duplicate": skipped_duplicate,
-                        "replaced_rules": replaced_rules,
-                        "errors": []
-                    }
-                }
+                # 被删除的规则不再属于任何导入源
+                DnsImportRule.release((rule['domain'], rule['answer']) for rule in rules_to_delete)
             
             # 批量导入过滤后的规则
-            import_result = self.batch_add_rewrite_rules(filtered_rules)
+            added_rules = []
+            import_result = self.batch_add_rewrite_rules(filtered_rules, added=added_rules)
             import_result['skipped_duplicate'] = skipped_duplicate
             import_result['replaced_rules'] = replaced_rules
+            import_result['removed_rules'] = removed_rules
             
-            # 记录导入源信息
+            # 记录导入源拥有的规则：本次添加成功的规则，加上列表中已存在且原本就属于本导入源或其他导入源的规则
+            # （手动添加的同名规则不归导入源所有，删除导入源时不会被删除）
+            added = {(rule['domain'], rule['answer']) for rule in added_rules}
+            owned = DnsImportRule.owned_rules(listed - added)
             try:
-                # 查找或创建导入源记录
-                import_source = DnsImportSource.find_by_url(url)
-                if not import_source:
-                    import_source = DnsImportSource(source_url=url)
-                    db.session.add(import_source)
+                DnsImportRule.sync_source(import_source.id, added | owned)
                 
                 # 更新导入统计（只记录实际导入的规则）
-                success_count = import_result.get('success', 0)
-                failed_count = import_result.get('failed', 0)
                 import_source.update_import_stats(
                     total=len(filtered_rules),
-                    success=success_count,
-                    failed=failed_count,
-                    rules_data=filtered_rules
+                    success=import_result.get('success', 0),
+                    failed=import_result.get('failed', 0)
                 )
                 
                 db.session.commit()
                 
             except Exception as db_error:
                 # 数据库操作失败不影响主要功能
+                db.session.rollback()
                 print(f"记录导入源失败: {str(db_error)}")
             
+            # 如果没有需要导入的规则
+            if not filtered_rules:
+                return {
+                    "success": True,
+                    "message": f"从URL解析出 {len(rules)} 条规则，但全部为重复规则，跳过导入"
+                               + (f"，删除 {removed_rules} 条已从列表中移除的规则" if removed_rules else ""),
+                    "rules_parsed": len(rules),
+                    "import_result": import_result
+                }
+            
             message_parts = [f"成功从URL解析出 {len(rules)} 条规则"]
             if skipped_duplicate > 0:
                 message_parts.append(f"跳过 {skipped_duplicate} 条重复规则")
             if len(filtered_rules) > 0:
                 message_parts.append(f"实际导入 {len(filtered_rules)} 条新规则")
+            if removed_rules > 0:
+                message_parts.append(f"删除 {removed_rules} 条已从列表中移除的规则")
             
             return {
                 "success": True,
@@ -1,9 +1,11 @@
+import time
 import requests
 import json
 import logging
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timedelta
 from app import db
+from app.utils.metrics import metrics
 from app.utils.timezone import beijing_time
 from app.models.query_log_analysis import QueryLogAnalysis
 from app.models.adguard_config import AdGuardConfig
@@ -207,13 +209,20 @@ class AIAnalysisService:
             "max_tokens": 1000
         }
         
+        start = time.perf_counter()
+        status = 'error'
+        
         try:
-            response = requests.post(
-                f"{self.deepseek_base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            try:
+                response = requests.post(
+                    f"{self.deepseek_base_url}/chat/completions",
+                    headers=headers,
+                    json=data,
+                    timeout=30
+                )
+                status = response.status_code
+            finally:
+                metrics.observe_upstream('deepseek', '/chat/completions', 'POST', status, time.perf_counter() - start)
             
             if response.status_code == 200:
                 result = response.json()
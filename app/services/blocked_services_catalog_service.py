@@ -0,0 +1,156 @@
+import base64
+import binascii
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+from app.utils.metrics import metrics
+
+
+class BlockedServicesCatalog:
+    """{{ project_name }}可阻止服务目录缓存
+
+    /blocked_services/all 返回全部可阻止服务（每个服务都带有base64编码的SVG图标和规则列表），
+    内容只随{{ project_name }}版本变化。目录按服务器地址缓存在进程内：列表接口只使用其中的
+    id/name，图标解码后单独保存，通过图标接口作为可长期缓存的资源返回。
+    缓存有效期为 ttl 秒；期间每隔 version_check_interval 秒读取一次 /status 中的版本号，
+    版本变化时立即重新拉取。重新拉取是单飞的，拉取失败时继续使用已有的目录。
+    """
+
+    def __init__(self, ttl=86400.0, version_check_interval=300.0):
+        """初始化目录缓存
+
+        Args:
+            ttl: 目录的最长有效期（秒）
+            version_check_interval: 检查{{ project_name }}版本号的间隔（秒）
+        """
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self.logger = logging.getLogger(__name__)
+        self._catalogs = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.ttl = app.config.get('BLOCKED_SERVICES_CATALOG_TTL', self.ttl)
+        self.version_check_interval = app.config.get('BLOCKED_SERVICES_VERSION_CHECK_INTERVAL',
+                                                     self.version_check_interval)
+        app.extensions['blocked_services_catalog'] = self
+
+    def services(self, adguard) -> List[Dict]:
+        """获取可阻止服务的精简列表
+
+        Args:
+            adguard: AdGuardService 实例
+
+        Returns:
+            List[Dict]: 每个服务的 id 和 name（不要修改返回的列表）
+
+        Raises:
+            Exception: 没有缓存且拉取失败时
+        """
+        return self._get(adguard)['services']
+
+    def icon(self, adguard, service_id: str) -> Optional[bytes]:
+        """获取服务的SVG图标
+
+        Args:
+            adguard: AdGuardService 实例
+            service_id: 服务ID
+
+        Returns:
+            bytes: SVG内容，服务不存在或没有图标时返回None
+        """
+        return self._get(adguard)['icons'].get(service_id)
+
+    def invalidate(self):
+        """清空全部缓存的目录"""
+        with self._lock:
+            self._catalogs = {}
+
+    def _get(self, adguard):
+        server = adguard.base_url
+        catalog = self._catalogs.get(server)
+        now = time.monotonic()
+        if catalog is not None and now - catalog['checked_at'] < self.version_check_interval \
+                and now - catalog['fetched_at'] < self.ttl:
+            metrics.record_cache('blocked_services_catalog', hit=True)
+            return catalog
+
+        with self._lock:
+            # 等待锁期间其他线程可能已经检查或刷新过
+            catalog = self._catalogs.get(server)
+            now = time.monotonic()
+            if catalog is not None and now - catalog['checked_at'] < self.version_check_interval \
+                    and now - catalog['fetched_at'] < self.ttl:
+                metrics.record_cache('blocked_services_catalog', hit=True)
+                return catalog
+
+            version = self._version(adguard)
+            if catalog is not None and now - catalog['fetched_at'] < self.ttl \
+                    and (version is None or version == catalog['version']):
+                # 版本未变（或暂时无法获取版本），推迟下一次检查
+                catalog['checked_at'] = now
+                metrics.record_cache('blocked_services_catalog', hit=True)
+                return catalog
+
+            metrics.record_cache('blocked_services_catalog', hit=False)
+            try:
+                catalog = self._load(adguard, version)
+            except Exception as e:
+                if catalog is None:
+                    raise
+                self.logger.warning(f"刷新可阻止服务目录失败，继续使用已缓存的目录: {str(e)}")
+                catalog['checked_at'] = now
+                return catalog
+            self._catalogs[server] = catalog
+            return catalog
+
+    def _version(self, adguard):
+        status = adguard.get_status()
+        return status.get('version') if isinstance(status, dict) else None
+
+    def _load(self, adguard, version):
+        response = adguard.get_blocked_services_all()
+        if not isinstance(response, dict) or not response.get('blocked_services'):
+            raise Exception('{{ project_name }}返回的可阻止服务列表为空')
+
+        services = []
+        icons = {}
+        for service in response['blocked_services']:
+            service_id = service.get('id', '')
+            services.append({'id': service_id, 'name': service.get('name', '')})
+            icon = self._decode_icon(service.get('icon_svg'))
+            if service_id and icon:
+                icons[service_id] = icon
+
+        # 旧数据兜底返回的内容不代表当前版本，缩短其有效期以便尽快重新拉取
+        fetched_at = time.monotonic()
+        if getattr(adguard, 'stale', False):
+            fetched_at -= max(self.ttl - self.version_check_interval, 0)
+        self.logger.info(f"已加载 {len(services)} 个可阻止服务（版本: {version}）")
+        return {
+            'version': version,
+            'services': services,
+            'icons': icons,
+            'fetched_at': fetched_at,
+            'checked_at': time.monotonic()
+        }
+
+    @staticmethod
+    def _decode_icon(icon_svg):
+        """解码服务图标，{{ project_name }}返回base64编码的SVG"""
+        if not icon_svg:
+            return None
+        try:
+            return base64.b64decode(icon_svg, validate=True)
+        except (binascii.Error, ValueError):
+            # 兼容直接返回SVG文本的版本
+            return icon_svg.encode('utf-8') if isinstance(icon_svg, str) else None
+
+
+blocked_services_catalog = BlockedServicesCatalog()
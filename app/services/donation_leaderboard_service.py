@@ -0,0 +1,112 @@
+import logging
+import threading
+from collections import namedtuple
+from decimal import Decimal
+from typing import List
+from app import db
+from app.models.donation_donor import DonationDonor
+from app.utils.config_cache import config_cache
+from app.utils.metrics import metrics
+
+# 排行榜条目，字段与原先分组查询返回的行一致
+LeaderboardEntry = namedtuple('LeaderboardEntry', ['donor_name', 'total_amount', 'donation_count', 'latest_donation'])
+# 最近捐赠条目，包含排行榜页面用到的捐赠记录字段
+RecentDonation = namedtuple('RecentDonation', ['donor_name', 'amount', 'payment_type', 'paid_at', 'created_at'])
+
+
+class DonationLeaderboard:
+    """捐赠排行榜缓存
+
+    在进程内保存按累计金额排序的全部捐赠者汇总、总金额、总次数和最近的成功捐赠。
+    汇总表只在有新的成功支付（或管理员清空记录）时修改，修改会递增配置缓存中该表的版本号，
+    读取时版本号未变就直接使用内存中的数据，排行榜访问不会查询捐赠记录表。
+    """
+
+    # 缓存的最近捐赠条数
+    RECENT_LIMIT = 20
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        app.extensions['donation_leaderboard'] = self
+
+    def leaderboard(self, limit=50) -> List[LeaderboardEntry]:
+        """获取捐赠排行榜
+
+        Args:
+            limit: 返回记录数量限制
+
+        Returns:
+            list: 按捐赠总额排序的捐赠者列表
+        """
+        return self._get()['entries'][:limit]
+
+    def recent(self, limit=10) -> List[RecentDonation]:
+        """获取最近的成功捐赠
+
+        Args:
+            limit: 返回记录数量限制（最多 RECENT_LIMIT 条）
+
+        Returns:
+            list: 最近的捐赠记录
+        """
+        return self._get()['recent'][:limit]
+
+    def total_amount(self):
+        """总捐赠金额"""
+        return self._get()['total_amount']
+
+    def total_count(self) -> int:
+        """总捐赠次数"""
+        return self._get()['total_count']
+
+    def invalidate(self):
+        """丢弃本进程的缓存"""
+        self._snapshot = None
+
+    def _get(self):
+        version = config_cache.versions(DonationDonor.__tablename__).get(DonationDonor.__tablename__)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot['version'] == version and version is not None:
+            metrics.record_cache('donation_leaderboard', hit=True)
+            return snapshot
+
+        metrics.record_cache('donation_leaderboard', hit=False)
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot['version'] != version or version is None:
+                snapshot = self._load(version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def _load(self, version):
+        from app.models.donation_record import DonationRecord
+
+        rows = db.session.query(
+            DonationDonor.donor_name, DonationDonor.total_amount,
+            DonationDonor.donation_count, DonationDonor.latest_donation
+        ).order_by(DonationDonor.total_amount.desc(), DonationDonor.donor_name).all()
+        entries = [LeaderboardEntry(*row) for row in rows]
+
+        recent = [RecentDonation(*row) for row in db.session.query(
+            DonationRecord.donor_name, DonationRecord.amount, DonationRecord.payment_type,
+            DonationRecord.paid_at, DonationRecord.created_at
+        ).filter(DonationRecord.status == 'success').order_by(DonationRecord.paid_at.desc()).limit(self.RECENT_LIMIT)]
+        return {
+            'version': version,
+            'entries': entries,
+            'recent': recent,
+            'total_amount': sum((Decimal(str(entry.total_amount)) for entry in entries), Decimal('0')),
+            'total_count': sum(entry.donation_count for entry in entries)
+        }
+
+
+donation_leaderboard = DonationLeaderboard()
@@ -0,0 +1,353 @@
+import ipaddress
+import logging
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set
+from app import db
+from app.models.client_mapping import ClientMapping
+from app.models.user import User
+from app.services.adguard_service import AdGuardService
+from app.utils.circuit_breaker import mark_stale
+
+
+class LiveStatsService:
+    """实时统计服务类
+
+    由一个后台刷新线程按固定间隔获取一次{{ project_name }}统计数据和客户端列表，
+    计算全局统计与客户端排行快照；轮询接口和SSE推送都基于该快照为每个用户计算结果，
+    因此上游请求量与在线用户数量无关。
+    """
+
+    # 默认刷新间隔（秒）
+    INTERVAL = 2.0
+    # SSE心跳间隔（秒）
+    HEARTBEAT = 15.0
+    # 单个SSE连接的最长保持时间（秒），到期后由浏览器自动重连
+    STREAM_LIFETIME = 600.0
+    # 每个工作进程同时保持的SSE连接数上限。每个连接占用一个工作线程，
+    # 超出上限的页面退回到轮询，避免长连接占满线程后其他请求无法处理
+    MAX_STREAMS = 1
+
+    def __init__(self):
+        self.interval = self.INTERVAL
+        self.logger = logging.getLogger(__name__)
+        self._app = None
+        self._snapshot = None
+        self._version = 0
+        self._condition = threading.Condition()
+        self._refresh_lock = threading.Lock()
+        self._subscribers = 0
+        self._streams = 0
+        self.max_streams = self.MAX_STREAMS
+        self._thread = None
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self._app = app
+        self.interval = app.config.get('LIVE_STATS_INTERVAL', self.interval)
+        self.max_streams = app.config.get('LIVE_STATS_MAX_STREAMS', self.max_streams)
+        app.extensions['live_stats'] = self
+
+    # ------------------------------------------------------------------
+    # 快照
+    # ------------------------------------------------------------------
+
+    def get_snapshot(self) -> Dict:
+        """获取最新的统计快照，快照过期时刷新（并发请求只刷新一次）
+
+        快照基于{{ project_name }}不可用时的旧数据时，会标记当前响应为旧数据。
+
+        Returns:
+            Dict: 全局统计快照
+        """
+        snapshot = self._snapshot
+        if not snapshot or time.monotonic() - snapshot['refreshed_at'] >= self.interval:
+            with self._refresh_lock:
+                snapshot = self._snapshot
+                if not snapshot or time.monotonic() - snapshot['refreshed_at'] >= self.interval:
+                    snapshot = self._refresh()
+
+        if snapshot.get('stale'):
+            mark_stale('adguard')
+        return snapshot
+
+    def _refresh(self) -> Dict:
+        """从{{ project_name }}获取数据并生成新的快照"""
+        stale = False
+        try:
+            service = AdGuardService()
+            stats, clients = service.get_stats_and_clients()
+            stale = service.stale
+        except Exception as e:
+            self.logger.error(f"获取{{ project_name }}统计数据失败: {str(e)}")
+            stats, clients = {}, []
+
+        snapshot = self.build_snapshot(stats, clients)
+        # 服务器不可用时快照基于最近一次成功的数据
+        snapshot['stale'] = stale
+        with self._condition:
+            self._version += 1
+            snapshot['version'] = self._version
+            self._snapshot = snapshot
+            self._condition.notify_all()
+        return snapshot
+
+    @staticmethod
+    def build_snapshot(stats: Dict, clients: List[Dict]) -> Dict:
+        """根据统计数据和客户端列表计算全局快照
+
+        Args:
+            stats: /stats 接口返回的统计数据
+            clients: 已配置的客户端列表
+
+        Returns:
+            Dict: 包含总查询数、总拦截数、客户端请求数和排行的快照
+        """
+        stats = stats or {}
+
+        # 构建客户端IP到名称的映射
+        client_map = {}
+        client_cidrs = {}
+        for client in clients or []:
+            for cidr in client.get('ids', []):
+                try:
+                    # 区分普通IP和CIDR
+                    if '/' in cidr:
+                        client_cidrs[ipaddress.ip_network(cidr, strict=False)] = client.get('name')
+                    else:
+                        client_map[cidr] = client.get('name')
+                except ValueError:
+                    # 处理无效的CIDR或IP
+                    client_map[cidr] = client.get('name')
+
+        # top_clients格式: [{"client_name": request_count}, ...]
+        top_clients = []
+        for client_stat in stats.get('top_clients', []):
+            for client_key, request_count in client_stat.items():
+                top_clients.append((client_key, request_count))
+
+        ranking = []
+        for client_ip, request_count in top_clients:
+            # 默认客户端名称为IP，先查普通IP映射，再检查CIDR范围
+            client_name = client_map.get(client_ip, client_ip)
+            if client_ip not in client_map:
+                try:
+                    ip = ipaddress.ip_address(client_ip)
+                    for network, name in client_cidrs.items():
+                        if ip in network:
+                            client_name = name
+                            break
+                except ValueError:
+                    pass  # 不是有效的IP地址，保持原样
+            ranking.append({'client_name': client_name, 'request_count': request_count})
+
+        # 按请求数量降序排序，只保留前10名
+        ranking.sort(key=lambda item: item['request_count'], reverse=True)
+        ranking = ranking[:10]
+
+        # 一次查询得到排行中客户端对应的用户
+        owners = {}
+        names = list({item['client_name'] for item in ranking})
+        if names:
+            rows = db.session.query(ClientMapping.client_name, ClientMapping.user_id, User.username) \
+                .join(User, User.id == ClientMapping.user_id) \
+                .filter(ClientMapping.client_name.in_(names)).all()
+            for client_name, user_id, username in rows:
+                owners.setdefault(client_name, (user_id, username))
+        for item in ranking:
+            user_id, username = owners.get(item['client_name'], (None, '未知用户'))
+            item['user_id'] = user_id
+            item['user_name'] = username
+
+        return {
+            'total_dns_queries': stats.get('num_dns_queries', 0),
+            # 总拦截数量（包括所有类型的拦截）
+            'total_blocked_queries': (
+                stats.get('num_blocked_filtering', 0) +
+                stats.get('num_replaced_safebrowsing', 0) +
+                stats.get('num_replaced_safesearch', 0) +
+                stats.get('num_replaced_parental', 0)
+            ),
+            'top_clients': top_clients,
+            'ranking': ranking,
+            'refreshed_at': time.monotonic()
+        }
+
+    # ------------------------------------------------------------------
+    # 按用户计算
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def load_user_clients(user_id: int) -> Set[str]:
+        """获取用户所有客户端的名称和ID集合"""
+        keys = set()
+        for mapping in ClientMapping.query.filter_by(user_id=user_id).all():
+            keys.add(mapping.client_name)
+            keys.update(mapping.client_ids)
+        return keys
+
+    @staticmethod
+    def user_stats(snapshot: Dict, client_keys: Set[str]) -> Dict:
+        """根据快照计算用户的请求数和排名
+
+        Args:
+            snapshot: 全局统计快照
+            client_keys: 用户客户端的名称和ID集合
+
+        Returns:
+            Dict: 与 /api/stats 相同格式的统计数据
+        """
+        user_request_count = 0
+        all_clients_requests = []
+        for client_key, request_count in snapshot['top_clients']:
+            all_clients_requests.append(request_count)
+            # 匹配客户端名称或客户端ID
+            if client_key in client_keys:
+                user_request_count += request_count
+
+        # 计算用户排名
+        user_ranking = 0
+        total_clients = len(all_clients_requests)
+        if all_clients_requests and user_request_count > 0:
+            all_clients_requests.sort(reverse=True)
+            for i, count in enumerate(all_clients_requests):
+                if count <= user_request_count:
+                    user_ranking = i + 1
+                    break
+            if user_ranking == 0:  # 如果没找到，说明用户排在最后
+                user_ranking = total_clients
+
+        return {
+            'user_request_count': user_request_count,
+            'total_dns_queries': snapshot['total_dns_queries'],
+            'total_blocked_queries': snapshot['total_blocked_queries'],
+            'user_ranking': user_ranking,
+            'total_clients': total_clients,
+            'stale': snapshot.get('stale', False)
+        }
+
+    @staticmethod
+    def user_ranking(snapshot: Dict, user_id: int) -> List[Dict]:
+        """根据快照生成标记了当前用户的客户端排行
+
+        Args:
+            snapshot: 全局统计快照
+            user_id: 当前用户ID
+
+        Returns:
+            List[Dict]: 与 /api/client_ranking 相同格式的排行列表
+        """
+        return [
+            {
+                'client_name': item['client_name'],
+                'request_count': item['request_count'],
+                'user_name': item['user_name'],
+                'is_current_user': item['user_id'] == user_id if item['user_id'] is not None else False
+            }
+            for item in snapshot['ranking']
+        ]
+
+    # ------------------------------------------------------------------
+    # SSE推送
+    # ------------------------------------------------------------------
+
+    def acquire_stream(self) -> bool:
+        """占用一个SSE连接名额
+
+        Returns:
+            bool: 是否获得名额；获得后必须在连接关闭时调用 release_stream
+        """
+        with self._condition:
+            if self._streams >= self.max_streams:
+                return False
+            self._streams += 1
+            return True
+
+    def release_stream(self):
+        """释放SSE连接名额"""
+        with self._condition:
+            self._streams = max(self._streams - 1, 0)
+
+    def stream(self, user_id: int, client_keys: Set[str]) -> Iterator[str]:
+        """为一个SSE连接生成事件流，只在用户数据变化时推送
+
+        调用前应先通过 acquire_stream 获得连接名额。
+
+        Args:
+            user_id: 当前用户ID
+            client_keys: 用户客户端的名称和ID集合
+
+        Yields:
+            str: SSE格式的事件文本
+        """
+        import json
+
+        self._subscribe()
+        try:
+            last_version = 0
+            last_stats = None
+            last_ranking = None
+            started = time.monotonic()
+            yield f'retry: {int(self.interval * 1000)}\n\n'
+
+            while time.monotonic() - started < self.STREAM_LIFETIME:
+                snapshot = self._wait_for_snapshot(last_version)
+                if snapshot is None:
+                    # 长时间没有新数据时发送心跳，避免连接被代理断开
+                    yield ': keepalive\n\n'
+                    continue
+                last_version = snapshot['version']
+
+                stats = self.user_stats(snapshot, client_keys)
+                if stats != last_stats:
+                    last_stats = stats
+                    yield f'event: stats\ndata: {json.dumps(stats)}\n\n'
+
+                ranking = self.user_ranking(snapshot, user_id)
+                if ranking != last_ranking:
+                    last_ranking = ranking
+                    yield f"event: ranking\ndata: {json.dumps({'client_ranking': ranking}, ensure_ascii=False)}\n\n"
+        finally:
+            self._unsubscribe()
+
+    def _wait_for_snapshot(self, last_version: int) -> Optional[Dict]:
+        with self._condition:
+            if self._version <= last_version:
+                self._condition.wait(self.HEARTBEAT)
+            if self._snapshot is None or self._version <= last_version:
+                return None
+            return self._snapshot
+
+    def _subscribe(self):
+        with self._condition:
+            self._subscribers += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='live-stats-refresher', daemon=True)
+                self._thread.start()
+
+    def _unsubscribe(self):
+        with self._condition:
+            self._subscribers -= 1
+
+    def _run(self):
+        """后台刷新线程：有订阅者时按间隔刷新快照，没有订阅者时退出"""
+        while True:
+            with self._condition:
+                if self._subscribers <= 0:
+                    self._thread = None
+                    return
+            started = time.monotonic()
+            try:
+                with self._app.app_context():
+                    with self._refresh_lock:
+                        self._refresh()
+            except Exception as e:
+                self.logger.error(f"刷新实时统计失败: {str(e)}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0.1))
+
+
+live_stats = LiveStatsService()
@@ -0,0 +1,149 @@
+import logging
+import math
+import time
+from datetime import timedelta
+from typing import Callable, Dict, Optional
+from app.utils.log_filter import parse_time
+from app.utils.metrics import metrics
+
+
+class LogSearchExecutor:
+    """查询日志搜索执行器
+
+    {{ project_name }}的 /querylog 接口只支持域名/客户端子串和响应状态过滤，其余条件
+    （查询类型、通配符、时间范围等）要在本地过滤。选择性高的条件下一批日志可能只匹配几条，
+    本执行器持续向后拉取日志直到凑满一页或用完扫描预算，并根据已观察到的匹配率调整每批的大小。
+    返回的游标可以直接作为下一次搜索的 older_than 继续扫描。
+    """
+
+    def __init__(self, scan_budget=5000, max_batch=1000, max_requests=10):
+        """初始化搜索执行器
+
+        Args:
+            scan_budget: 单次搜索最多扫描的日志条数
+            max_batch: 单次请求最多拉取的日志条数
+            max_requests: 单次搜索最多发送的请求数
+        """
+        self.scan_budget = scan_budget
+        self.max_batch = max_batch
+        self.max_requests = max_requests
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.scan_budget = app.config.get('QUERY_LOG_SEARCH_SCAN_BUDGET', self.scan_budget)
+        self.max_batch = app.config.get('QUERY_LOG_SEARCH_MAX_BATCH', self.max_batch)
+        self.max_requests = app.config.get('QUERY_LOG_SEARCH_MAX_REQUESTS', self.max_requests)
+        app.extensions['log_search'] = self
+
+    def search(self, fetch: Callable[[Optional[str], int], Dict], match: Callable[[Dict], bool],
+               page_size: int, older_than: Optional[str] = None,
+               start_time: Optional[str] = None, end_time: Optional[str] = None,
+               scan_budget: Optional[int] = None) -> Dict:
+        """拉取并过滤日志，直到凑满一页、日志扫描完或用完扫描预算
+
+        Args:
+            fetch: 获取一批日志的函数，参数为 (older_than, limit)，返回 /querylog 接口的数据
+            match: 判断单条日志是否匹配的函数
+            page_size: 需要的匹配条数
+            older_than: 游标，从比该时间更早的日志开始扫描
+            start_time: 时间范围起点，扫描到更早的日志时停止
+            end_time: 时间范围终点，没有游标时直接从该时间开始扫描
+            scan_budget: 本次搜索的扫描预算，默认使用配置值
+
+        Returns:
+            Dict: 包含 data（匹配的日志）、oldest（继续扫描的游标）、has_more 和 scan（扫描统计）
+
+        Raises:
+            ValueError: 时间格式无效时
+        """
+        started = time.perf_counter()
+        budget = scan_budget or self.scan_budget
+        lower = parse_time(start_time) if start_time else None
+        if not older_than and end_time:
+            # older_than 不包含边界本身，向后推一微秒使 end_time 这一刻的日志也能被扫描到
+            older_than = (parse_time(end_time) + timedelta(microseconds=1)).isoformat()
+
+        matched = []
+        scanned = requests = 0
+        cursor = older_than
+        exhausted = False
+        reached_start = False
+
+        while len(matched) < page_size and scanned < budget and requests < self.max_requests:
+            batch = self._batch_size(page_size - len(matched), len(matched), scanned, budget - scanned, page_size)
+            data = fetch(cursor, batch) or {}
+            rows = data.get('data') or []
+            requests += 1
+            remaining_rows = False
+            for index, row in enumerate(rows):
+                scanned += 1
+                if lower is not None and self._older_than(row, lower):
+                    reached_start = True
+                    break
+                cursor = row.get('time') or cursor
+                if match(row):
+                    matched.append(row)
+                    if len(matched) == page_size:
+                        remaining_rows = index < len(rows) - 1
+                        break
+            if reached_start:
+                exhausted = True
+                break
+            if len(matched) == page_size:
+                # 页面已满：本批还有未扫描的日志或本批是满的，说明后面可能还有
+                exhausted = not remaining_rows and len(rows) < batch
+                break
+            if len(rows) < batch:
+                exhausted = True
+                break
+
+        has_more = not exhausted
+        elapsed = time.perf_counter() - started
+        scan = {
+            'scanned': scanned,
+            'matched': len(matched),
+            'requests': requests,
+            'match_ratio': round(len(matched) / scanned, 4) if scanned else 0,
+            'budget': budget,
+            'budget_exhausted': has_more and len(matched) < page_size,
+            'elapsed_ms': round(elapsed * 1000, 1)
+        }
+        search_scanned_rows.observe(scanned)
+        return {
+            'data': matched,
+            'oldest': cursor if has_more else None,
+            'has_more': has_more,
+            'scan': scan
+        }
+
+    def _batch_size(self, needed, matched, scanned, remaining, page_size):
+        """根据已观察到的匹配率估算凑满剩余条数需要拉取的日志条数"""
+        if not scanned:
+            batch = page_size
+        else:
+            # 加一平滑，避免尚无匹配时匹配率为0；多拉25%减少再次请求的概率
+            ratio = (matched + 1) / (scanned + 1)
+            batch = math.ceil(needed / ratio * 1.25)
+        return max(1, min(batch, self.max_batch, remaining))
+
+    @staticmethod
+    def _older_than(row, lower):
+        value = row.get('time')
+        if not value:
+            return False
+        try:
+            return parse_time(value) < lower
+        except ValueError:
+            return False
+
+
+search_scanned_rows = metrics.histogram(
+    'adghm_query_log_search_scanned_rows', '高级搜索单次扫描的日志条数',
+    buckets=(50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000))
+
+log_search = LogSearchExecutor()
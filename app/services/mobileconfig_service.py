@@ -0,0 +1,304 @@
+import json
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+from xml.sax.saxutils import escape
+from app import db
+from app.models.client_mapping import ClientMapping
+from app.models.dns_config import DnsConfig
+from app.utils.config_cache import config_cache
+from app.utils.http_cache import HttpCache
+from app.utils.metrics import metrics
+
+
+# 苹果DNS描述文件模板（str.format格式），只在模块加载时构建一次
+DOH_PROFILE_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+    <key>PayloadContent</key>
+    <array>
+        <dict>
+            <key>DNSSettings</key>
+            <dict>
+                <key>DNSProtocol</key>
+                <string>HTTPS</string>
+                <key>ServerURL</key>
+                <string>{doh_url}</string>
+            </dict>
+            <key>PayloadDescription</key>
+            <string>Configures device to use {{ project_name }} DNS-over-HTTPS</string>
+            <key>PayloadDisplayName</key>
+            <string>{{ project_name }} DoH</string>
+            <key>PayloadIdentifier</key>
+            <string>com.{{ project_name }}.doh.{client_id}</string>
+            <key>PayloadType</key>
+            <string>com.apple.dnsSettings.managed</string>
+            <key>PayloadUUID</key>
+            <string>{payload_uuid}</string>
+            <key>PayloadVersion</key>
+            <integer>1</integer>
+        </dict>
+    </array>
+    <key>PayloadDescription</key>
+    <string>{{ project_name }} DNS-over-HTTPS configuration for {username}</string>
+    <key>PayloadDisplayName</key>
+    <string>{{ project_name }} DoH - {username}</string>
+    <key>PayloadIdentifier</key>
+    <string>com.{{ project_name }}.profile.doh.{client_id}</string>
+    <key>PayloadRemovalDisallowed</key>
+    <false/>
+    <key>PayloadType</key>
+    <string>Configuration</string>
+    <key>PayloadUUID</key>
+    <string>{profile_uuid}</string>
+    <key>PayloadVersion</key>
+    <integer>1</integer>
+</dict>
+</plist>'''
+
+DOT_PROFILE_TEMPLATE = '''<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple//DTD PLIST 1.0//EN" "http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+	<dict>
+		<key>PayloadContent</key>
+		<array>
+			<dict>
+				<key>DNSSettings</key>
+				<dict>
+					<key>DNSProtocol</key>
+					<string>TLS</string>
+					<key>ServerName</key>
+					<string>{dot_server}</string>
+				</dict>
+				<key>PayloadDescription</key>
+				<string>Configures device to use {{ project_name }}</string>
+				<key>PayloadDisplayName</key>
+				<string>{host} DoT</string>
+				<key>PayloadIdentifier</key>
+				<string>com.apple.dnsSettings.managed.{payload_identifier_uuid}</string>
+				<key>PayloadType</key>
+				<string>com.apple.dnsSettings.managed</string>
+				<key>PayloadUUID</key>
+				<string>{payload_uuid}</string>
+				<key>PayloadVersion</key>
+				<integer>1</integer>
+			</dict>
+		</array>
+		<key>PayloadDescription</key>
+		<string>Adds {{ project_name }} to macOS Big Sur and iOS 14 or newer systems</string>
+		<key>PayloadDisplayName</key>
+		<string>{host} DoT</string>
+		<key>PayloadIdentifier</key>
+		<string>{profile_identifier_uuid}</string>
+		<key>PayloadRemovalDisallowed</key>
+		<false/>
+		<key>PayloadType</key>
+		<string>Configuration</string>
+		<key>PayloadUUID</key>
+		<string>{profile_uuid}</string>
+		<key>PayloadVersion</key>
+		<integer>1</integer>
+	</dict>
+</plist>'''
+
+# {{ project_name }}对客户端ID格式的要求
+CLIENT_ID_PATTERN = re.compile(r'^[0-9a-z-]{1,64}$')
+
+# 生成确定性UUID使用的命名空间，同一份描述文件的UUID在重启和多进程之间保持不变
+PROFILE_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'adghm:mobileconfig')
+
+
+class Profile(NamedTuple):
+    """生成好的描述文件"""
+    content: bytes
+    etag: str
+    # 供操作日志记录的服务器地址
+    server: str
+
+
+class MobileConfigService:
+    """苹果设备.mobileconfig描述文件生成服务
+
+    生成结果按（用户、协议、客户端ID、主机名、DNS配置版本）缓存在进程内的LRU中，
+    用户的客户端ID列表按客户端映射的版本号缓存。DNS配置或客户端映射被修改后
+    版本号递增，旧的缓存自然失效，重复下载只需查表即可返回。
+    """
+
+    def __init__(self, max_entries=1024):
+        """初始化描述文件服务
+
+        Args:
+            max_entries: 最多缓存的描述文件数量
+        """
+        self.max_entries = max_entries
+        self._profiles = OrderedDict()
+        self._client_ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.max_entries = app.config.get('MOBILECONFIG_CACHE_SIZE', self.max_entries)
+        app.extensions['mobileconfig'] = self
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._profiles.clear()
+            self._client_ids.clear()
+
+    def user_client_ids(self, user_id: int) -> List[str]:
+        """获取用户所有客户端ID（按客户端映射版本缓存）
+
+        Args:
+            user_id: 用户ID
+
+        Returns:
+            List[str]: 客户端ID列表
+        """
+        version = config_cache.versions(ClientMapping.__tablename__)[ClientMapping.__tablename__]
+        with self._lock:
+            entry = self._client_ids.get(user_id)
+            if entry is not None and entry[0] == version:
+                self._client_ids.move_to_end(user_id)
+                return entry[1]
+
+        client_ids = []
+        for (raw_ids,) in db.session.query(ClientMapping._client_ids).filter_by(user_id=user_id):
+            if raw_ids:
+                client_ids.extend(json.loads(raw_ids))
+
+        with self._lock:
+            self._client_ids[user_id] = (version, client_ids)
+            self._trim(self._client_ids)
+        return client_ids
+
+    def resolve_client_id(self, user_id: int, requested: Optional[str]) -> str:
+        """确定描述文件使用的客户端ID并校验权限和格式
+
+        Args:
+            user_id: 用户ID
+            requested: 请求指定的客户端ID，为空时使用用户的第一个客户端ID
+
+        Returns:
+            str: 客户端ID
+
+        Raises:
+            LookupError: 用户没有关联的客户端ID
+            PermissionError: 用户无权使用指定的客户端ID
+            ValueError: 客户端ID格式无效
+        """
+        client_ids = self.user_client_ids(user_id)
+        if not client_ids:
+            raise LookupError('用户没有关联的客户端ID')
+
+        if requested:
+            if requested not in client_ids:
+                raise PermissionError(f'用户无权限使用客户端ID: {requested}')
+            client_id = requested
+        else:
+            client_id = client_ids[0]
+
+        if not CLIENT_ID_PATTERN.match(client_id):
+            raise ValueError(f'客户端ID格式无效：{client_id}，必须是1-64位的小写字母、数字或连字符')
+        return client_id
+
+    def doh_profile(self, config: DnsConfig, user_id: int, username: str, client_id: str, host: str) -> Profile:
+        """获取DoH描述文件
+
+        Args:
+            config: DNS配置
+            user_id: 用户ID
+            username: 用户名（显示在描述文件名称中）
+            client_id: 客户端ID
+            host: DNS服务器主机名
+
+        Returns:
+            Profile: 描述文件内容、ETag和DoH地址
+        """
+        key = ('doh', user_id, username, client_id, host, self._config_version())
+        return self._cached(key, lambda: self._build_doh(config, username, client_id, host, key))
+
+    def dot_profile(self, config: DnsConfig, user_id: int, client_id: str, host: str) -> Profile:
+        """获取DoT描述文件
+
+        Args:
+            config: DNS配置
+            user_id: 用户ID
+            client_id: 客户端ID
+            host: DNS服务器主机名
+
+        Returns:
+            Profile: 描述文件内容、ETag和DoT服务器地址
+        """
+        key = ('dot', user_id, client_id, host, self._config_version())
+        return self._cached(key, lambda: self._build_dot(config, client_id, host, key))
+
+    @staticmethod
+    def _config_version():
+        return config_cache.versions(DnsConfig.__tablename__)[DnsConfig.__tablename__]
+
+    @staticmethod
+    def _uuid(key, part):
+        return str(uuid.uuid5(PROFILE_NAMESPACE, f'{key!r}:{part}'))
+
+    def _cached(self, key, build):
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+        metrics.record_cache('mobileconfig', hit=profile is not None)
+        if profile is not None:
+            return profile
+
+        profile = build()
+        with self._lock:
+            self._profiles[key] = profile
+            self._trim(self._profiles)
+        return profile
+
+    def _trim(self, entries):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def _build_doh(self, config, username, client_id, host, key):
+        doh_port = config.doh_port or 443
+        doh_path = config.doh_path or '/dns-query'
+        if doh_port == 443:
+            doh_url = f"https://{host}{doh_path}"
+        else:
+            doh_url = f"https://{host}:{doh_port}{doh_path}"
+
+        content = DOH_PROFILE_TEMPLATE.format(
+            doh_url=escape(doh_url),
+            client_id=client_id,
+            username=escape(username),
+            payload_uuid=self._uuid(key, 'payload'),
+            profile_uuid=self._uuid(key, 'profile')
+        ).encode('utf-8')
+        return Profile(content, HttpCache.etag_for(content), doh_url)
+
+    def _build_dot(self, config, client_id, host, key):
+        # 注意：与DoH不同，DoT协议不支持路径参数，因此无法使用路径格式 (server:port/path/client_id)
+        # 根据{{ project_name }}的实际格式，DoT使用客户端ID+域名格式 (client_id.server:port)
+        dot_server = f"{client_id}.{host}"
+        dot_port = config.dot_port or 853
+
+        content = DOT_PROFILE_TEMPLATE.format(
+            dot_server=escape(dot_server),
+            host=escape(host),
+            payload_uuid=self._uuid(key, 'payload'),
+            payload_identifier_uuid=self._uuid(key, 'payload-identifier'),
+            profile_uuid=self._uuid(key, 'profile'),
+            profile_identifier_uuid=self._uuid(key, 'profile-identifier')
+        ).encode('utf-8')
+        return Profile(content, HttpCache.etag_for(content), f'{dot_server}:{dot_port}')
+
+
+mobileconfig_service = MobileConfigService()
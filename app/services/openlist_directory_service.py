@@ -0,0 +1,177 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from app.utils.metrics import metrics
+
+
+class OpenListDirectory:
+    """OpenList用户目录缓存
+
+    保存OpenList服务器上 用户名 -> 用户ID 的映射，整个目录通过一次分页拉取填充，
+    create_user/delete_user 成功后直接更新映射，按用户名查找用户ID时不再每次下载完整的用户列表。
+    目录过期（超过TTL）或查找的用户名不在目录中时重新拉取，但两次拉取之间至少间隔
+    min_refresh_interval 秒，批量删除上千个账户时最多只拉取一次。
+    """
+
+    def __init__(self, ttl=300.0, min_refresh_interval=10.0):
+        """初始化目录缓存
+
+        Args:
+            ttl: 目录的有效期（秒）
+            min_refresh_interval: 因查找不到用户名而重新拉取的最小间隔（秒）
+        """
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.logger = logging.getLogger(__name__)
+        self._server = None
+        self._ids = {}
+        self._names = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.ttl = app.config.get('OPENLIST_DIRECTORY_TTL', self.ttl)
+        self.min_refresh_interval = app.config.get('OPENLIST_DIRECTORY_MIN_REFRESH', self.min_refresh_interval)
+        app.extensions['openlist_directory'] = self
+
+    def lookup(self, server: str, username: str, fetch: Callable[[], List[Dict]]):
+        """按用户名查找OpenList用户ID
+
+        Args:
+            server: OpenList服务器地址（更换服务器时目录失效）
+            username: 用户名
+            fetch: 拉取完整用户列表的函数
+
+        Returns:
+            用户ID，不存在时返回None
+        """
+        return self.lookup_many(server, [username], fetch).get(username)
+
+    def lookup_many(self, server: str, usernames: Iterable[str], fetch: Callable[[], List[Dict]]) -> Dict:
+        """批量按用户名查找OpenList用户ID（最多拉取一次用户列表）
+
+        Args:
+            server: OpenList服务器地址
+            usernames: 用户名列表
+            fetch: 拉取完整用户列表的函数
+
+        Returns:
+            Dict: 找到的 用户名 -> 用户ID
+        """
+        usernames = [username for username in usernames if username]
+        if self._expired(server):
+            self._refresh(server, fetch)
+        found = self._resolve(usernames)
+        if len(found) < len(usernames) and self._can_refresh():
+            # 目录中没有的用户名可能是其他进程新建的，重新拉取一次
+            self._refresh(server, fetch)
+            found = self._resolve(usernames)
+        metrics.record_cache('openlist_directory', hit=len(found) == len(usernames))
+        return found
+
+    def load(self, server: str, users: List[Dict]):
+        """用完整的用户列表替换目录
+
+        Args:
+            server: OpenList服务器地址
+            users: OpenList用户列表（包含 id 和 username）
+        """
+        ids = {}
+        for user in users:
+            if user.get('username') and user.get('id') is not None:
+                ids[user['username']] = user['id']
+        with self._lock:
+            self._server = server
+            self._ids = ids
+            self._names = {user_id: username for username, user_id in ids.items()}
+            self._loaded_at = time.monotonic()
+
+    def add(self, server: str, username: str, user_id=None):
+        """记录新建的用户
+
+        OpenList创建用户的接口不返回用户ID，不知道ID时只从目录中去掉该用户名，
+        下次查找时会重新拉取。
+
+        Args:
+            server: OpenList服务器地址
+            username: 用户名
+            user_id: 用户ID（可选）
+        """
+        with self._lock:
+            if self._server != server:
+                return
+            self._discard(username=username)
+            if user_id is not None:
+                self._ids[username] = user_id
+                self._names[user_id] = username
+            else:
+                # 允许下次查找立即重新拉取
+                self._last_refresh_allowed()
+
+    def remove(self, server: str, user_id=None, username: Optional[str] = None):
+        """从目录中删除用户
+
+        Args:
+            server: OpenList服务器地址
+            user_id: 用户ID
+            username: 用户名
+        """
+        with self._lock:
+            if self._server == server:
+                self._discard(user_id=user_id, username=username)
+
+    def invalidate(self):
+        """清空目录"""
+        with self._lock:
+            self._server = None
+            self._ids = {}
+            self._names = {}
+            self._loaded_at = None
+
+    def _resolve(self, usernames):
+        with self._lock:
+            return {username: self._ids[username] for username in usernames if username in self._ids}
+
+    def _expired(self, server):
+        with self._lock:
+            return self._server != server or self._loaded_at is None or \
+                time.monotonic() - self._loaded_at >= self.ttl
+
+    def _can_refresh(self):
+        with self._lock:
+            return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.min_refresh_interval
+
+    def _last_refresh_allowed(self):
+        if self._loaded_at is not None:
+            self._loaded_at = min(self._loaded_at, time.monotonic() - self.min_refresh_interval)
+
+    def _refresh(self, server, fetch):
+        loaded_at = self._loaded_at
+        with self._refresh_lock:
+            # 等待锁期间其他线程已经拉取过时直接使用其结果
+            if self._loaded_at != loaded_at and not self._expired(server):
+                return
+            self.load(server, fetch())
+
+    def _discard(self, user_id=None, username=None):
+        if username is not None and username in self._ids:
+            self._names.pop(self._ids.pop(username), None)
+        if user_id is not None:
+            for key in (user_id, str(user_id)):
+                name = self._names.pop(key, None)
+                if name is not None:
+                    self._ids.pop(name, None)
+            if isinstance(user_id, str) and user_id.isdigit():
+                name = self._names.pop(int(user_id), None)
+                if name is not None:
+                    self._ids.pop(name, None)
+
+
+openlist_directory = OpenListDirectory()
@@ -1,11 +1,14 @@
+import time
 import requests
 import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Union
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 from app import db
 from app.models.openlist_config import OpenListConfig
+from app.services.openlist_directory_service import openlist_directory
+from app.services.openlist_token_service import openlist_tokens
+from app.utils.metrics import MeteredRetry, metrics
 from app.utils.timezone import beijing_time
 
 class OpenListService:
@@ -45,10 +48,11 @@ class OpenListService:
         self.session = requests.Session()
         
         # 配置重试策略
-        retry_strategy = Retry(
+        retry_strategy = MeteredRetry(
             total=3,  # 最多重试3次
             backoff_factor=0.5,  # 重试间隔时间
-            status_forcelist=[500, 502, 503, 504]  # 这些状态码会触发重试
+            status_forcelist=[500, 502, 503, 504],  # 这些状态码会触发重试
+            service='openlist'
         )
         adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount('http://', adapter)
@@ -62,7 +66,9 @@ class OpenListService:
         params: Optional[Dict] = None,
         headers: Optional[Dict] = None
     ) -> Dict:
-        """发送HTTP请求到OpenList API
+        """发送HTTP请求到OpenList API，令牌被拒绝（401）时刷新一次令牌并重试一次
+        
+        同时被拒绝的多个请求共享同一次刷新（见 OpenListTokenManager）。
         
         Args:
             method: HTTP方法（GET、POST、PUT、DELETE）
@@ -74,6 +80,48 @@ class OpenListService:
         Returns:
             API响应的JSON数据
             
+        Raises:
+            Exception: 当API请求失败时，包含详细的错误信息
+        """
+        token = self.config.token if self.config.token and self.config.is_token_valid() else None
+        response = self._send_request(method, endpoint, json_data, params, headers, token)
+        if self._is_unauthorized(response) and endpoint.rstrip('/') != '/api/auth/login':
+            try:
+                token = openlist_tokens.refresh(self, stale_token=token)
+            except Exception as e:
+                import logging
+                logging.warning(f"OpenList令牌刷新失败: {str(e)}")
+                return response
+            response = self._send_request(method, endpoint, json_data, params, headers, token)
+        return response
+    
+    @staticmethod
+    def _is_unauthorized(response) -> bool:
+        """响应是否表示令牌无效（HTTP 401 或响应体中的 code 为 401）"""
+        return isinstance(response, dict) and (response.get('code') == 401 or response.get('status_code') == 401)
+    
+    def _send_request(
+        self, 
+        method: str, 
+        endpoint: str, 
+        json_data: Optional[Dict] = None,
+        params: Optional[Dict] = None,
+        headers: Optional[Dict] = None,
+        token: Optional[str] = None
+    ) -> Dict:
+        """发送一次HTTP请求到OpenList API
+        
+        Args:
+            method: HTTP方法（GET、POST、PUT、DELETE）
+            endpoint: API端点路径（不包含基础URL）
+            json_data: 请求体数据（可选）
+            params: URL查询参数（可选）
+            headers: 额外的请求头（可选）
+            token: 使用的访问令牌（可选）
+            
+        Returns:
+            API响应的JSON数据
+            
         Raises:
             Exception: 当API请求失败时，包含详细的错误信息
         """
@@ -90,24 +138,30 @@ class OpenListService:
         }
         
         # 如果有token，添加认证头（根据OpenList API文档，直接使用token值）
-        if self.config.token and self.config.is_token_valid():
-            request_headers['Authorization'] = self.config.token
-            import logging
-            logging.info(f"使用token: {self.config.token[:20]}... (有效期至: {self.config.token_expires_at})")
+        if token:
+            request_headers['Authorization'] = token
         
         # 合并额外的请求头
         if headers:
             request_headers.update(headers)
         
+        start = time.perf_counter()
+        status = 'error'
+        
         try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                headers=request_headers,
-                json=json_data,
-                params=params,
-                timeout=30
-            )
+            try:
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    headers=request_headers,
+                    json=json_data,
+                    params=params,
+                    timeout=30
+                )
+                status = response.status_code
+            finally:
+                metrics.observe_upstream('openlist', endpoint, method, status, time.perf_counter() - start,
+                                         detail={'params': params, 'json': json_data})
             
             # 检查响应状态 - 对于401错误，返回响应而不是抛出异常，让调用方处理
             if response.status_code == 401:
@@ -145,10 +199,47 @@ class OpenListService:
             raise Exception(f'请求异常: {str(e)}')
     
     def authenticate(self) -> Dict:
-        """用户认证，获取访问token
+        """用户认证，强制重新登录获取访问token（测试连接时使用）
         
         Returns:
             认证结果字典
+        """
+        try:
+            token = openlist_tokens.refresh(self, force=True)
+            return {
+                'success': True,
+                'message': '认证成功',
+                'token': token
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'认证失败: {str(e)}'
+            }
+    
+    def _ensure_token(self) -> Dict:
+        """确保有可用的token，临近到期时由令牌管理器统一刷新
+        
+        Returns:
+            认证结果字典
+        """
+        try:
+            openlist_tokens.ensure(self)
+            return {
+                'success': True,
+                'message': '认证成功'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'认证失败: {str(e)}'
+            }
+    
+    def _login(self) -> str:
+        """向OpenList登录获取新的访问token（由令牌管理器调用）
+        
+        Returns:
+            str: 访问token
             
         Raises:
             Exception: 当认证失败时抛出异常
@@ -159,63 +250,34 @@ class OpenListService:
             'password': self.config.password
         }
         
-        try:
-            import logging
-            logging.info(f"开始认证，用户名: {self.config.username}")
-            
-            # 根据OpenList API文档，使用正确的认证端点
-            response = self._make_request('POST', '/api/auth/login', json_data=auth_data)
-            
-            logging.info(f"认证响应: {response}")
-            
-            # 检查响应是否为HTML（说明端点错误）
-            if isinstance(response, dict) and 'content' in response and response['content'].strip().startswith('<'):
-                raise Exception(f'服务器返回HTML页面而非API响应，请检查服务器地址是否为API地址。当前地址: {self.base_url}')
-            
-            # 检查不同可能的token字段名
-            token = None
-            if 'data' in response and isinstance(response['data'], dict):
-                token = response['data'].get('token')
-            elif 'token' in response:
-                token = response['token']
-            elif 'access_token' in response:
-                token = response['access_token']
-            
-            logging.info(f"提取的token: {token[:20] if token else 'None'}...")
-            
-            if token:
-                # 更新配置中的token
-                self.config.token = token
-                
-                # 设置token过期时间（根据API文档，默认48小时有效）
-                self.config.token_expires_at = beijing_time() + timedelta(hours=48)
-                
-                # 保存到数据库
-                db.session.commit()
-                
-                # 刷新当前实例的配置，确保使用最新的token
-                db.session.refresh(self.config)
-                
-                return {
-                    'success': True,
-                    'message': '认证成功',
-                    'token': token
-                }
-            else:
-                # 根据响应内容提供具体的错误信息
-                if isinstance(response, dict) and 'content' in response:
-                    if response['content'].strip().startswith('<'):
-                        raise Exception(f'服务器返回HTML页面而非API响应。请检查：\n1. 服务器地址是否正确（当前：{self.base_url}）\n2. 地址是否指向API服务器而非网页界面\n3. 尝试访问 {self.base_url}/ping 检查服务器状态')
-                    else:
-                        raise Exception(f'认证响应格式异常，响应内容: {response["content"][:200]}...')
-                else:
-                    raise Exception(f'认证响应中未包含token，响应数据: {response}')
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'message': f'认证失败: {str(e)}'
-            }
+        import logging
+        logging.info(f"开始认证，用户名: {self.config.username}")
+        
+        # 根据OpenList API文档，使用正确的认证端点
+        response = self._send_request('POST', '/api/auth/login', json_data=auth_data)
+        
+        # 检查响应是否为HTML（说明端点错误）
+        if isinstance(response, dict) and 'content' in response and response['content'].strip().startswith('<'):
+            raise Exception(f'服务器返回HTML页面而非API响应，请检查服务器地址是否为API地址。当前地址: {self.base_url}')
+        
+        # 检查不同可能的token字段名
+        token = None
+        if 'data' in response and isinstance(response['data'], dict):
+            token = response['data'].get('token')
+        elif 'token' in response:
+            token = response['token']
+        elif 'access_token' in response:
+            token = response['access_token']
+        
+        logging.info(f"认证{'成功' if token else '响应中未包含token'}，用户名: {self.config.username}")
+        
+        if token:
+            return token
+        
+        # 根据响应内容提供具体的错误信息
+        if isinstance(response, dict) and 'content' in response:
+            raise Exception(f'认证响应格式异常，响应内容: {response["content"][:200]}...')
+        raise Exception(f'认证响应中未包含token，响应数据: {response}')
     
     def test_connection(self) -> Dict:
         """测试与OpenList服务器的连接
@@ -255,10 +317,9 @@ class OpenListService:
         """
         try:
             # 确保有有效的token
-            if not self.config.is_token_valid():
-                auth_result = self.authenticate()
-                if not auth_result['success']:
-                    return auth_result
+            auth_result = self._ensure_token()
+            if not auth_result['success']:
+                return auth_result
             
             params = {'path': path}
             response = self._make_request('GET', '/api/fs/list', params=params)
@@ -288,10 +349,9 @@ class OpenListService:
         """
         try:
             # 确保有有效的token
-            if not self.config.is_token_valid():
-                auth_result = self.authenticate()
-                if not auth_result['success']:
-                    return auth_result
+            auth_result = self._ensure_token()
+            if not auth_result['success']:
+                return auth_result
             
             data = {
                 'path': path,
@@ -383,15 +443,10 @@ class OpenListService:
             logging.info(f"OpenList服务开始创建用户: {username}")
             
             # 确保有有效的token
-            if not self.config.is_token_valid():
-                logging.info("Token无效，开始重新认证")
-                auth_result = self.authenticate()
-                if not auth_result['success']:
-                    logging.error(f"认证失败: {auth_result['message']}")
-                    return auth_result
-                logging.info("认证成功")
-            else:
-                logging.info("Token有效，跳过认证")
+            auth_result = self._ensure_token()
+            if not auth_result['success']:
+                logging.error(f"认证失败: {auth_result['message']}")
+                return auth_result
             
             # 转换权限列表为数值（根据OpenList权限系统）
             # 根据testuser555用户的权限值，WebDAV读取和FTP读取权限对应1280
@@ -409,28 +464,19 @@ class OpenListService:
                 'sso_id': ''
             }
             
-            logging.info(f"准备发送用户数据: {user_data}")
+            logging.info(f"准备发送用户数据: { {key: value for key, value in user_data.items() if key != 'password'} }")
             logging.info(f"OpenList服务器地址: {self.config.server_url}")
             
             # 发送创建用户请求到正确的API端点
             response = self._make_request('POST', '/api/admin/user/create', json_data=user_data)
             
-            # 检查是否是401认证错误，如果是则重新认证并重试
-            if response and response.get('code') == 401:
-                logging.info("收到401错误，尝试重新认证")
-                auth_result = self.authenticate()
-                if not auth_result['success']:
-                    logging.error(f"重新认证失败: {auth_result['message']}")
-                    return auth_result
-                logging.info("重新认证成功，重试创建用户请求")
-                # 重试请求，authenticate方法已经更新了self.config中的token
-                response = self._make_request('POST', '/api/admin/user/create', json_data=user_data)
-            
             logging.info(f"API响应: {response}")
             
             # 检查API响应是否成功
             if response and response.get('code') == 200:
                 logging.info(f"用户 {username} 创建成功")
+                data = response.get('data')
+                openlist_directory.add(self.base_url, username, data.get('id') if isinstance(data, dict) else None)
                 return {
                     'success': True,
                     'message': f'用户 "{username}" 创建成功',
@@ -454,24 +500,14 @@ class OpenListService:
             }
     
     def get_users(self) -> Dict:
-        """获取用户列表
+        """获取用户列表（同时刷新用户目录缓存）
         
         Returns:
             用户列表字典
         """
         try:
-            # 确保有有效的token
-            if not self.config.is_token_valid():
-                auth_result = self.authenticate()
-                if not auth_result['success']:
-                    return auth_result
-            
-            response = self._make_request('GET', '/api/admin/user/list')
-            
-            # 根据API文档，数据在data.content中
-            users_data = []
-            if response.get('code') == 200 and 'data' in response:
-                users_data = response['data'].get('content', [])
+            users_data = self._fetch_users()
+            openlist_directory.load(self.base_url, users_data)
             
             return {
                 'success': True,
@@ -485,6 +521,92 @@ class OpenListService:
                 'message': f'获取用户列表失败: {str(e)}'
             }
     
+    def find_user_id(self, username: str):
+        """按用户名查找OpenList用户ID（使用用户目录缓存）
+        
+        Args:
+            username: OpenList用户名
+            
+        Returns:
+            用户ID，不存在时返回None
+            
+        Raises:
+            Exception: 拉取用户列表失败时
+        """
+        return openlist_directory.lookup(self.base_url, username, self._fetch_users)
+    
+    def find_user_ids(self, usernames: List[str]) -> Dict:
+        """批量按用户名查找OpenList用户ID（最多拉取一次用户列表）
+        
+        Args:
+            usernames: OpenList用户名列表
+            
+        Returns:
+            Dict: 找到的 用户名 -> 用户ID
+            
+        Raises:
+            Exception: 拉取用户列表失败时
+        """
+        return openlist_directory.lookup_many(self.base_url, usernames, self._fetch_users)
+    
+    def delete_user_by_username(self, username: str) -> Dict:
+        """按用户名删除OpenList用户
+        
+        Args:
+            username: OpenList用户名
+            
+        Returns:
+            删除结果字典，用户不存在时 not_found 为True
+        """
+        try:
+            user_id = self.find_user_id(username)
+        except Exception as e:
+            return {
+                'success': False,
+                'message': f'获取OpenList用户列表失败: {str(e)}'
+            }
+        if user_id is None:
+            return {
+                'success': False,
+                'not_found': True,
+                'message': f'未找到OpenList用户: {username}'
+            }
+        return self.delete_user(user_id)
+    
+    def _fetch_users(self, per_page: int = 500) -> List[Dict]:
+        """分页拉取全部OpenList用户
+        
+        Args:
+            per_page: 每页用户数量
+            
+        Returns:
+            List[Dict]: 用户列表
+            
+        Raises:
+            Exception: 认证或请求失败时
+        """
+        # 确保有有效的token
+        auth_result = self._ensure_token()
+        if not auth_result['success']:
+            raise Exception(auth_result['message'])
+        
+        users = []
+        page = 1
+        while True:
+            params = {'page': page, 'per_page': per_page}
+            response = self._make_request('GET', '/api/admin/user/list', params=params)
+            if not response or response.get('code') != 200:
+                raise Exception(response.get('message', '未知错误') if response else '请求失败')
+            
+            # 根据API文档，数据在data.content中，data.total为用户总数
+            data = response.get('data') or {}
+            content = data.get('content') or []
+            users.extend(content)
+            total = data.get('total')
+            if not content or len(content) < per_page or (total is not None and len(users) >= total):
+                return users
+            page += 1
+    
     def delete_user(self, user_id: str) -> Dict:
         """删除OpenList用户
         
@@ -499,15 +621,10 @@ class OpenListService:
             logging.info(f"OpenList服务开始删除用户: {user_id}")
             
             # 确保有有效的token
-            if not self.config.is_token_valid():
-                logging.info("Token无效，开始重新认证")
-                auth_result = self.authenticate()
-                if not auth_result['success']:
-                    logging.error(f"认证失败: {auth_result['message']}")
-                    return auth_result
-                logging.info("认证成功")
-            else:
-                logging.info("Token有效，跳过认证")
+            auth_result = self._ensure_token()
+            if not auth_result['success']:
+                logging.error(f"认证失败: {auth_result['message']}")
+                return auth_result
             
             # 根据OpenList API文档，删除用户需要POST请求到/api/admin/user/delete
             # 用户ID作为查询参数传递
@@ -519,22 +636,12 @@ class OpenListService:
             # 发送删除用户请求
             response = self._make_request('POST', '/api/admin/user/delete', params=params)
             
-            # 检查是否是401认证错误，如果是则重新认证并重试
-            if response and response.get('code') == 401:
-                logging.info("收到401错误，尝试重新认证")
-                auth_result = self.authenticate()
-                if not auth_result['success']:
-                    logging.error(f"重新认证失败: {auth_result['message']}")
-                    return auth_result
-                logging.info("重新认证成功，重试删除用户请求")
-                # 重试请求
-                response = self._make_request('POST', '/api/admin/user/delete', params=params)
-            
             logging.info(f"API响应: {response}")
             
             # 检查API响应是否成功
             if response and response.get('code') == 200:
                 logging.info(f"用户 {user_id} 删除成功")
+                openlist_directory.remove(self.base_url, user_id=user_id)
                 return {
                     'success': True,
                     'message': f'用户 "{user_id}" 删除成功',
@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.models.openlist_config import OpenListConfig
+from app.utils.file_lock import file_lock
+from app.utils.metrics import metrics
+from app.utils.timezone import beijing_time
+
+
+class OpenListTokenManager:
+    """OpenList访问令牌管理器
+
+    令牌在到期前 refresh_margin 秒内就会主动刷新。刷新是单飞的：同一进程内的线程先竞争线程锁，
+    不同工作进程再竞争实例目录下的文件锁；拿到锁后先重新读取数据库中保存的令牌，
+    如果其他线程或进程已经换上了新令牌就直接使用，只有确实需要时才向OpenList重新登录。
+    """
+
+    # OpenList令牌的有效期（根据API文档，默认48小时）
+    TOKEN_LIFETIME = timedelta(hours=48)
+
+    def __init__(self, refresh_margin=3600, lock_path=None):
+        """初始化令牌管理器
+
+        Args:
+            refresh_margin: 到期前多少秒开始主动刷新
+            lock_path: 跨进程刷新锁的文件路径，不提供时使用实例目录下的 openlist_token.lock
+        """
+        self.refresh_margin = refresh_margin
+        self.lock_path = lock_path
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.refresh_margin = app.config.get('OPENLIST_TOKEN_REFRESH_MARGIN', self.refresh_margin)
+        self.lock_path = self.lock_path or os.path.join(app.instance_path, 'openlist_token.lock')
+        app.extensions['openlist_tokens'] = self
+
+    def ensure(self, service) -> str:
+        """获取可用的令牌，临近到期或已失效时刷新
+
+        Args:
+            service: OpenListService 实例
+
+        Returns:
+            str: 访问令牌
+
+        Raises:
+            Exception: 需要登录但登录失败时
+        """
+        config = service.config
+        if self.is_fresh(config.token, config.token_expires_at):
+            return config.token
+        return self.refresh(service, stale_token=config.token)
+
+    def refresh(self, service, stale_token=None, force=False) -> str:
+        """刷新令牌（并发的刷新只会有一次真正登录）
+
+        Args:
+            service: OpenListService 实例
+            stale_token: 调用方认为已失效的令牌；数据库中已是其他令牌且仍有效时直接使用
+            force: 是否跳过复用检查强制登录（测试连接时使用）
+
+        Returns:
+            str: 新的访问令牌
+
+        Raises:
+            Exception: 登录失败时
+        """
+        config = service.config
+        with self._lock:
+            with file_lock(self.lock_path or os.path.join(current_app.instance_path, 'openlist_token.lock')):
+                if not force:
+                    token, expires_at = self._stored(config)
+                    if token and token != stale_token and self.is_fresh(token, expires_at):
+                        # 其他线程或进程已经刷新过，直接使用，不产生新的修改
+                        set_committed_value(config, 'token', token)
+                        set_committed_value(config, 'token_expires_at', expires_at)
+                        token_refreshes.inc(result='reused')
+                        return token
+
+                try:
+                    token = service._login()
+                except Exception:
+                    token_refreshes.inc(result='error')
+                    raise
+                config.token = token
+                config.token_expires_at = beijing_time() + self.TOKEN_LIFETIME
+                db.session.commit()
+                token_refreshes.inc(result='login')
+                self.logger.info(f"OpenList令牌已刷新，有效期至: {config.token_expires_at}")
+                return token
+
+    def is_fresh(self, token, expires_at) -> bool:
+        """令牌存在且距离到期还有 refresh_margin 秒以上"""
+        if not token or not expires_at:
+            return False
+        return expires_at - timedelta(seconds=self.refresh_margin) > beijing_time()
+
+    @staticmethod
+    def _stored(config):
+        """用独立连接读取数据库中当前保存的令牌（不受当前会话缓存影响）"""
+        if config.id is None:
+            return None, None
+        table = OpenListConfig.__table__
+        with db.engine.connect() as connection:
+            row = connection.execute(
+                select(table.c.token, table.c.token_expires_at).where(table.c.id == config.id)
+            ).first()
+        return (row[0], row[1]) if row else (None, None)
+
+
+token_refreshes = metrics.counter('adghm_openlist_token_refresh_total', 'OpenList令牌刷新次数', ['result'])
+
+openlist_tokens = OpenListTokenManager()
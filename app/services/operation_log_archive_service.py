@@ -0,0 +1,276 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import and_, func, not_, or_, tuple_
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models.operation_log import OperationLog
+from app.models.user import User
+from app.utils.file_lock import file_lock
+from app.utils.metrics import metrics
+from app.utils.timezone import beijing_time
+
+
+class OperationLogArchiver:
+    """操作日志归档服务类
+
+    operation_logs 表只保留最近一段时间的日志。定时任务按 (created_at, id) 顺序分批取出
+    超过保留期的日志，按月份追加写入归档目录下的 operation_logs-YYYY-MM.ndjson.gz
+    （每行一条JSON，追加写入的内容是独立的gzip成员，可以直接解压读取），写入成功后再从表中删除。
+    归档文件按月份倒序流式解压搜索。
+    """
+
+    # 不归档的日志：(操作类型, 目标类型)。OpenList账户信息接口从创建日志中读取账户信息
+    RETAINED_OPERATIONS = (('CREATE', 'OPENLIST_USER'),)
+    FILE_PATTERN = re.compile(r'^operation_logs-(\d{4}-\d{2})\.ndjson\.gz$')
+
+    def __init__(self, retention_days=180, archive_dir=None, batch_size=5000):
+        """初始化归档服务
+
+        Args:
+            retention_days: 数据库中保留的天数，0表示不归档
+            archive_dir: 归档目录，不提供时使用实例目录下的 operation_log_archive
+            batch_size: 每批归档的日志条数
+        """
+        self.retention_days = retention_days
+        self.archive_dir = archive_dir
+        self.batch_size = batch_size
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.retention_days = app.config.get('OPERATION_LOG_RETENTION_DAYS', self.retention_days)
+        self.archive_dir = app.config.get('OPERATION_LOG_ARCHIVE_DIR') or self.archive_dir or \
+            os.path.join(app.instance_path, 'operation_log_archive')
+        self.batch_size = app.config.get('OPERATION_LOG_ARCHIVE_BATCH_SIZE', self.batch_size)
+        app.extensions['operation_log_archive'] = self
+
+    def page(self, per_page: int, before: Optional[str] = None, after: Optional[str] = None) -> Dict:
+        """按 (created_at, id) 倒序的键集分页读取日志
+
+        Args:
+            per_page: 每页条数
+            before: 游标，读取比该位置更早的一页（下一页）
+            after: 游标，读取比该位置更新的一页（上一页）
+
+        Returns:
+            Dict: 包含 logs、next_cursor（有更早的日志时）、prev_cursor（有更新的日志时）
+        """
+        key = tuple_(OperationLog.created_at, OperationLog.id)
+        query = OperationLog.query.options(joinedload(OperationLog.user)) \
+            .filter(OperationLog.created_at.isnot(None))
+
+        if after:
+            # 上一页：正序取紧邻游标之后的一页再反转
+            rows = query.filter(key > tuple_(*self.decode_cursor(after))) \
+                .order_by(OperationLog.created_at.asc(), OperationLog.id.asc()) \
+                .limit(per_page + 1).all()
+            has_newer = len(rows) > per_page
+            logs = list(reversed(rows[:per_page]))
+            has_older = True
+        else:
+            if before:
+                query = query.filter(key < tuple_(*self.decode_cursor(before)))
+            rows = query.order_by(OperationLog.created_at.desc(), OperationLog.id.desc()) \
+                .limit(per_page + 1).all()
+            has_older = len(rows) > per_page
+            logs = rows[:per_page]
+            has_newer = bool(before)
+
+        return {
+            'logs': logs,
+            'next_cursor': self.encode_cursor(logs[-1]) if logs and has_older else None,
+            'prev_cursor': self.encode_cursor(logs[0]) if logs and has_newer else None
+        }
+
+    def approximate_count(self) -> int:
+        """估算表中的日志条数
+
+        归档从最早的日志开始删除，但 RETAINED_OPERATIONS 中的日志永远不会归档，
+        它们会把最小ID一直留在最早的位置。因此先按主键顺序找到第一条可归档的日志：
+        在它之前的只剩保留的日志，单独计数（只扫描这一小段主键区间）；
+        从它开始的ID区间基本连续，用最大ID与它的差估算，不需要扫描全表计数。
+        """
+        first_id = db.session.query(OperationLog.id).filter(not_(self._retained())) \
+            .order_by(OperationLog.id.asc()).limit(1).scalar()
+        if first_id is None:
+            # 只剩保留的日志（数量很少），直接计数
+            return OperationLog.query.count()
+        max_id = db.session.query(func.max(OperationLog.id)).scalar()
+        retained_before = OperationLog.query.filter(OperationLog.id < first_id).count()
+        return max_id - first_id + 1 + retained_before
+
+    @staticmethod
+    def encode_cursor(log) -> str:
+        return f"{log.created_at.isoformat()}_{log.id}"
+
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """解析游标
+
+        Raises:
+            ValueError: 游标格式无效时
+        """
+        created_at, _, log_id = cursor.rpartition('_')
+        return datetime.fromisoformat(created_at), int(log_id)
+
+    def archive(self, now: Optional[datetime] = None) -> int:
+        """把超过保留期的日志移动到归档文件
+
+        Args:
+            now: 计算保留期使用的当前时间，默认北京时间
+
+        Returns:
+            int: 归档的日志条数
+        """
+        if not self.retention_days or self.retention_days <= 0:
+            return 0
+        cutoff = (now or beijing_time()) - timedelta(days=self.retention_days)
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        retained = self._retained()
+        total = 0
+        with file_lock(os.path.join(self.archive_dir, 'archive.lock')):
+            while True:
+                rows = db.session.query(OperationLog, User.username) \
+                    .outerjoin(User, User.id == OperationLog.user_id) \
+                    .filter(OperationLog.created_at < cutoff, not_(retained)) \
+                    .order_by(OperationLog.created_at, OperationLog.id) \
+                    .limit(self.batch_size).all()
+                if not rows:
+                    break
+
+                by_month = {}
+                for log, username in rows:
+                    by_month.setdefault(log.created_at.strftime('%Y-%m'), []).append(self._to_record(log, username))
+                # 先写入并同步到磁盘再删除；中途失败时下次会重复写入，搜索时按ID去重
+                for month, records in by_month.items():
+                    self._append(month, records)
+
+                ids = [log.id for log, _ in rows]
+                try:
+                    for start in range(0, len(ids), 500):
+                        OperationLog.query.filter(OperationLog.id.in_(ids[start:start + 500])) \
+                            .delete(synchronize_session=False)
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                    raise
+                db.session.expunge_all()
+                total += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+
+        if total:
+            archived_logs.inc(total)
+            self.logger.info(f"已归档 {total} 条 {cutoff} 之前的操作日志")
+        return total
+
+    def list_archives(self) -> List[Dict]:
+        """列出归档文件（按月份倒序）
+
+        Returns:
+            List[Dict]: 每个文件的 month、size
+        """
+        archives = []
+        for path in glob.glob(os.path.join(self.archive_dir or '', 'operation_logs-*.ndjson.gz')):
+            match = self.FILE_PATTERN.match(os.path.basename(path))
+            if match:
+                archives.append({'month': match.group(1), 'size': os.path.getsize(path), 'path': path})
+        return sorted(archives, key=lambda archive: archive['month'], reverse=True)
+
+    def search(self, keyword: Optional[str] = None, operation_type: Optional[str] = None,
+               target_type: Optional[str] = None, username: Optional[str] = None,
+               month_from: Optional[str] = None, month_to: Optional[str] = None,
+               limit: int = 200) -> Dict:
+        """在归档文件中搜索日志（按时间倒序）
+
+        Args:
+            keyword: 在目标ID和详细信息中查找的关键字
+            operation_type: 操作类型
+            target_type: 目标类型
+            username: 操作用户名
+            month_from: 起始月份（YYYY-MM，包含）
+            month_to: 结束月份（YYYY-MM，包含）
+            limit: 最多返回的条数
+
+        Returns:
+            Dict: 包含 logs（匹配的日志字典）、scanned（扫描的条数）、truncated（是否因达到上限停止）
+        """
+        keyword = (keyword or '').strip().lower()
+        matched = []
+        scanned = 0
+        for archive in self.list_archives():
+            if (month_from and archive['month'] < month_from) or (month_to and archive['month'] > month_to):
+                continue
+            seen = set()
+            records = []
+            with gzip.open(archive['path'], 'rt', encoding='utf-8') as f:
+                for line in f:
+                    scanned += 1
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record['id'] in seen:
+                        continue
+                    seen.add(record['id'])
+                    if operation_type and record.get('operation_type') != operation_type:
+                        continue
+                    if target_type and record.get('target_type') != target_type:
+                        continue
+                    if username and record.get('username') != username:
+                        continue
+                    if keyword and keyword not in (record.get('target_id') or '').lower() \
+                            and keyword not in (record.get('details') or '').lower():
+                        continue
+                    records.append(record)
+            # 文件内按时间正序写入，倒序后与其他月份拼接
+            records.sort(key=lambda record: (record.get('created_at') or '', record['id']), reverse=True)
+            matched.extend(records)
+            if len(matched) >= limit:
+                return {'logs': matched[:limit], 'scanned': scanned, 'truncated': True}
+        return {'logs': matched, 'scanned': scanned, 'truncated': False}
+
+    def _retained(self):
+        """不归档的日志的过滤条件"""
+        return or_(*[
+            and_(OperationLog.operation_type == operation_type, OperationLog.target_type == target_type)
+            for operation_type, target_type in self.RETAINED_OPERATIONS
+        ])
+
+    def _append(self, month, records):
+        path = os.path.join(self.archive_dir, f'operation_logs-{month}.ndjson.gz')
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='ab') as f:
+                for record in records:
+                    f.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    @staticmethod
+    def _to_record(log, username):
+        return {
+            'id': log.id,
+            'user_id': log.user_id,
+            'username': username,
+            'operation_type': log.operation_type,
+            'target_type': log.target_type,
+            'target_id': log.target_id,
+            'details': log.details,
+            'created_at': log.created_at.isoformat()
+        }
+
+
+archived_logs = metrics.counter('adghm_operation_logs_archived_total', '归档的操作日志条数')
+
+operation_log_archive = OperationLogArchiver()
@@ -0,0 +1,187 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Optional
+from flask import current_app, session
+from app.services.adguard_service import AdGuardService
+from app.utils.metrics import metrics
+
+
+class QueryLogPager:
+    """查询日志分页服务
+
+    {{ project_name }}的查询日志只支持用 older_than 向后翻页。本服务在会话中保存每一页的
+    游标（该页的 older_than），使上一页/下一页都可以直接定位；同时在进程内缓存最近获取的页面，
+    并在返回当前页后于后台预取下一页，翻页时大多直接命中缓存。
+    """
+
+    # 第一页（最新日志）的缓存时间（秒），新日志不断写入，只短暂复用
+    HEAD_TTL = 2.0
+    # 指定了older_than的页面内容基本不变，可以缓存较长时间（秒）
+    PAGE_TTL = 300.0
+    # 会话中保存游标的键和最多保存的页数
+    SESSION_KEY = 'query_log_cursors'
+    MAX_CURSORS = 40
+
+    def __init__(self, max_pages=64, prefetch=True):
+        """初始化分页服务
+
+        Args:
+            max_pages: 进程内最多缓存的页面数量
+            prefetch: 是否在后台预取下一页
+        """
+        self.max_pages = max_pages
+        self.prefetch = prefetch
+        self.logger = logging.getLogger(__name__)
+        self._pages = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.max_pages = app.config.get('QUERY_LOG_PAGE_CACHE_SIZE', self.max_pages)
+        self.prefetch = app.config.get('QUERY_LOG_PREFETCH', self.prefetch)
+        app.extensions['query_log_pager'] = self
+
+    def clear(self):
+        """清空页面缓存"""
+        with self._lock:
+            self._pages.clear()
+
+    def get_page(self, page: int, older_than: Optional[str] = None, per_page: int = 50) -> Dict:
+        """获取指定页的查询日志和前后页游标
+
+        Args:
+            page: 页码，从1开始
+            older_than: 该页的游标；不提供时从会话保存的游标中查找，找不到则回到第一页
+            per_page: 每页记录数
+
+        Returns:
+            Dict: 包含 logs、page、has_next、has_prev、next_older_than、prev_older_than、per_page
+        """
+        page = max(page, 1)
+        cursors = dict(session.get(self.SESSION_KEY) or {})
+        if page == 1:
+            # 回到第一页时最新日志已经变化，之前的页码不再对应，重新开始记录
+            older_than = None
+            cursors = {}
+        elif not older_than:
+            older_than = cursors.get(str(page))
+            if not older_than:
+                page, cursors = 1, {}
+
+        service = AdGuardService()
+        logs_data = self.fetch(service, older_than, per_page)
+        logs = logs_data.get('data', [])
+
+        # 如果返回的记录数等于限制数，说明可能还有更多记录
+        has_next = len(logs) == per_page
+        next_older_than = logs[-1].get('time') if has_next and logs else None
+        if next_older_than and self.prefetch:
+            self._prefetch(service, next_older_than, per_page)
+
+        cursors[str(page)] = older_than
+        if next_older_than:
+            cursors[str(page + 1)] = next_older_than
+        self._save_cursors(cursors, page)
+
+        return {
+            'logs': logs,
+            'page': page,
+            'has_next': has_next,
+            'has_prev': page > 1,
+            'next_older_than': next_older_than,
+            'prev_older_than': cursors.get(str(page - 1)) if page > 1 else None,
+            'per_page': per_page
+        }
+
+    def fetch(self, service: AdGuardService, older_than: Optional[str], limit: int) -> Dict:
+        """获取一页查询日志，优先使用缓存；同一页的并发请求只发送一次
+
+        Args:
+            service: {{ project_name }}服务实例
+            older_than: 游标
+            limit: 记录数
+
+        Returns:
+            Dict: /querylog 接口返回的数据
+        """
+        key = (service.base_url, older_than, limit)
+        ttl = self.PAGE_TTL if older_than else self.HEAD_TTL
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is not None and time.monotonic() - entry[1] < ttl:
+                self._pages.move_to_end(key)
+                future = None
+            else:
+                entry = None
+                future = self._inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._inflight[key] = Future()
+
+        metrics.record_cache('query_log_page', hit=entry is not None)
+        if entry is not None:
+            return entry[0]
+        if not owner:
+            return future.result()
+        return self._load(service, key, future)
+
+    def _load(self, service, key, future):
+        _, older_than, limit = key
+        try:
+            data = service.get_query_log(older_than=older_than, limit=limit)
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._pages[key] = (data, time.monotonic())
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+            self._inflight.pop(key, None)
+        future.set_result(data)
+        return data
+
+    def _prefetch(self, service, older_than, limit):
+        """在后台获取下一页放入缓存"""
+        key = (service.base_url, older_than, limit)
+        with self._lock:
+            entry = self._pages.get(key)
+            if key in self._inflight or (entry is not None and time.monotonic() - entry[1] < self.PAGE_TTL):
+                return
+            future = self._inflight[key] = Future()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='query-log-prefetch')
+
+        app = current_app._get_current_object()
+
+        def run():
+            try:
+                with app.app_context():
+                    self._load(service, key, future)
+            except Exception as e:
+                self.logger.warning(f"预取查询日志失败: {str(e)}")
+
+        self._executor.submit(run)
+
+    def _save_cursors(self, cursors, page):
+        # 只保留离当前页最近的游标，避免会话Cookie过大
+        if len(cursors) > self.MAX_CURSORS:
+            nearest = sorted(cursors, key=lambda p: abs(int(p) - page))[:self.MAX_CURSORS]
+            cursors = {p: cursors[p] for p in nearest}
+        if session.get(self.SESSION_KEY) != cursors:
+            session[self.SESSION_KEY] = cursors
+
+
+query_log_pager = QueryLogPager()
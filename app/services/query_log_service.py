@@ -5,6 +5,8 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any, Tuple
 from app.services.adguard_service import AdGuardService
+from app.services.log_search_service import log_search
+from app.utils.log_filter import compile_log_filter, domain_search_term, has_wildcard
 from app.utils.timezone import beijing_time
 from app.models.query_log_analysis import QueryLogExport
 from app import db
@@ -21,7 +23,8 @@ class QueryLogService:
         self.logger = logging.getLogger(__name__)
     
     def advanced_search(self, filters: Dict[str, Any], 
-                       page_size: int = 50, older_than: str = None) -> Dict:
+                       page_size: int = 50, older_than: str = None,
+                       scan_budget: Optional[int] = None) -> Dict:
         """高级搜索查询日志
         
         Args:
@@ -34,11 +37,12 @@ class QueryLogService:
                 - start_time: 开始时间
                 - end_time: 结束时间
                 - reason: 阻止原因
-            page_size: 每页记录数
-            older_than: 分页参数
+            page_size: 每页记录数，本地过滤后不足时继续向后拉取日志
+            older_than: 分页参数（上一次搜索返回的 oldest）
+            scan_budget: 最多扫描的日志条数，默认使用 QUERY_LOG_SEARCH_SCAN_BUDGET
             
         Returns:
-            搜索结果字典
+            搜索结果字典，scan 中包含扫描条数、请求次数和匹配率
         """
         try:
             # 构建API查询参数
@@ -49,10 +53,12 @@ class QueryLogService:
             if filters.get('domain') or filters.get('client'):
                 search_terms = []
                 if filters.get('domain'):
-                    search_terms.append(filters['domain'])
+                    # 域名通配符只把字面部分交给服务端，完整匹配在本地进行
+                    domain = filters['domain']
+                    search_terms.append(domain_search_term(domain) if has_wildcard(domain) else domain)
                 if filters.get('client'):
                     search_terms.append(filters['client'])
-                search_param = ' '.join(search_terms)
+                search_param = ' '.join(term for term in search_terms if term) or None
             
             # 处理响应状态过滤
             if filters.get('blocked') is True:
@@ -74,29 +80,38 @@ class QueryLogService:
                 elif 'blocked' in reason:
                     response_status_param = 'blocked'
             
-            # 获取原始查询日志
-            log_data = self.adguard_service.get_query_log(
-                limit=page_size, 
-                older_than=older_than,
-                search=search_param,
-                response_status=response_status_param
-            )
-            
-            if not log_data or 'data' not in log_data:
-                return {'data': [], 'oldest': None, 'has_more': False}
-            
-            # 应用剩余的过滤条件（API不支持的）
-            filtered_data = self._apply_additional_filters(log_data['data'], filters)
+            # 获取原始查询日志并应用剩余的过滤条件（API不支持的），不足一页时继续向后拉取
+            def fetch(cursor, batch):
+                return self.adguard_service.get_query_log(
+                    limit=batch,
+                    older_than=cursor,
+                    search=search_param,
+                    response_status=response_status_param
+                )
+
+            match = self._compile_additional_filters(filters)
+            try:
+                result = log_search.search(
+                    fetch, match, page_size, older_than=older_than,
+                    start_time=filters.get('start_time'), end_time=filters.get('end_time'),
+                    scan_budget=scan_budget
+                )
+            except ValueError as e:
+                # 时间格式错误时时间范围已从过滤条件中忽略，扫描也不再按时间截止
+                self.logger.warning(f"过滤条件中的时间格式无效，忽略时间范围: {str(e)}")
+                result = log_search.search(fetch, match, page_size, older_than=older_than, scan_budget=scan_budget)
+            filtered_data = result['data']
             
             # 计算统计信息
             stats = self._calculate_search_stats(filtered_data)
             
             return {
                 'data': filtered_data,
-                'oldest': log_data.get('oldest'),
-                'has_more': len(log_data['data']) >= page_size,
+                'oldest': result['oldest'],
+                'has_more': result['has_more'],
                 'total_found': len(filtered_data),
-                'stats': stats
+                'stats': stats,
+                'scan': result['scan']
             }
             
         except Exception as e:
@@ -120,9 +135,8 @@ class QueryLogService:
             # 创建导出记录
             export_record = QueryLogExport(
                 export_type=export_format,
-                filters=json.dumps(filters) if filters else None,
-                max_records=max_records,
-                requested_by=user_id,
+                filters=filters or None,
+                user_id=user_id or 0,
                 status='processing'
             )
             db.session.add(export_record)
@@ -141,12 +155,10 @@ class QueryLogService:
                     older_than=older_than
                 )
                 
-                if not search_result['data']:
-                    break
-                
+                # 扫描预算用完时本页可能为空，只要还有更早的日志就继续
                 all_logs.extend(search_result['data'])
                 
-                if not search_result['has_more']:
+                if not search_result['has_more'] or not search_result['oldest']:
                     break
                 
                 older_than = search_result['oldest']
@@ -222,12 +234,10 @@ class QueryLogService:
                     older_than=older_than
                 )
                 
-                if not search_result['data']:
-                    break
-                
+                # 扫描预算用完时本页可能为空，只要还有更早的日志就继续
                 all_logs.extend(search_result['data'])
                 
-                if not search_result['has_more']:
+                if not search_result['has_more'] or not search_result['oldest']:
                     break
                 
                 older_than = search_result['oldest']
@@ -251,61 +261,25 @@ class QueryLogService:
         Returns:
             过滤后的日志列表
         """
-        filtered_logs = []
-        
-        for log in logs:
-            if self._matches_additional_filters(log, filters):
-                filtered_logs.append(log)
-        
-        return filtered_logs
+        match = self._compile_additional_filters(filters)
+        return [log for log in logs if match(log)]
     
-    def _matches_additional_filters(self, log: Dict, filters: Dict[str, Any]) -> bool:
-        """检查日志是否匹配额外的过滤条件（API不支持的）
+    def _compile_additional_filters(self, filters: Dict[str, Any]):
+        """把API不支持的过滤条件（域名通配符、查询类型、响应代码、时间范围）编译为判断函数
         
         Args:
-            log: 单条日志
             filters: 过滤条件
             
         Returns:
-            是否匹配
+            判断单条日志是否匹配的函数
         """
+        keys = ('domain', 'query_type', 'response_code', 'start_time', 'end_time')
         try:
-            # 查询类型过滤（API不支持特定类型过滤）
-            if 'query_type' in filters and filters['query_type']:
-                question = log.get('question', {})
-                if question.get('type') != filters['query_type']:
-                    return False
-            
-            # 响应代码过滤
-            if 'response_code' in filters and filters['response_code']:
-                if log.get('status') != filters['response_code']:
-                    return False
-            
-            # 时间范围过滤
-            if 'start_time' in filters or 'end_time' in filters:
-                log_time_str = log.get('time', '')
-                if log_time_str:
-                    try:
-                        log_time = datetime.fromisoformat(log_time_str.replace('Z', '+00:00'))
-                        
-                        if 'start_time' in filters:
-                            start_time = datetime.fromisoformat(filters['start_time'])
-                            if log_time < start_time:
-                                return False
-                        
-                        if 'end_time' in filters:
-                            end_time = datetime.fromisoformat(filters['end_time'])
-                            if log_time > end_time:
-                                return False
-                    except ValueError:
-                        # 时间格式错误，跳过时间过滤
-                        pass
-            
-            return True
-            
-        except Exception as e:
-            self.logger.error(f"过滤条件匹配时出错: {str(e)}")
-            return False
+            return compile_log_filter(filters, keys=keys)
+        except ValueError as e:
+            # 时间格式错误，跳过时间过滤
+            self.logger.warning(f"过滤条件中的时间格式无效，忽略时间范围: {str(e)}")
+            return compile_log_filter(filters, keys=keys[:3])
     
     def _calculate_search_stats(self, logs: List[Dict]) -> Dict:
         """计算搜索统计信息
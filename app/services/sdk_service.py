@@ -6,7 +6,7 @@ from typing import Dict, List, Optional, Tuple
 from app import db
 from app.models.sdk import Sdk
 from app.models.user import User
-from app.models.operation_log import OperationLog
+from app.utils.audit_log import audit_log
 
 
 class SdkService:
@@ -59,17 +59,15 @@ class SdkService:
             )
             
             db.session.add(sdk)
-            db.session.commit()
             
-            # 记录操作日志
-            operation_log = OperationLog(
+            # 记录操作日志（SDK记录提交后进入缓冲区，由后台线程写入；回滚时丢弃）
+            audit_log.record(
                 user_id=admin_user_id,
                 operation_type='SDK_GENERATE',
                 target_type='SDK',
                 target_id=code,
                 details=f'生成单个SDK: {code}，VIP天数: {days}'
             )
-            db.session.add(operation_log)
             db.session.commit()
             
             logging.info(f"管理员 {admin_user_id} 生成单个SDK: {code}，VIP天数: {days}")
@@ -142,18 +140,14 @@ class SdkService:
                     'days': days
                 })
             
-            # 提交所有SDK记录
-            db.session.commit()
-            
-            # 记录操作日志
-            operation_log = OperationLog(
+            # 记录操作日志，与所有SDK记录一起提交
+            audit_log.record(
                 user_id=admin_user_id,
                 operation_type='SDK_BATCH_GENERATE',
                 target_type='SDK',
                 target_id=f'batch_{len(generated_sdks)}',
                 details=f'批量生成SDK: {len(generated_sdks)}个，VIP天数: {days}，失败: {failed_count}个'
             )
-            db.session.add(operation_log)
             db.session.commit()
             
             logging.info(f"管理员 {admin_user_id} 批量生成SDK: {len(generated_sdks)}个，VIP天数: {days}，失败: {failed_count}个")
@@ -239,14 +233,14 @@ class SdkService:
                 return result
             
             # 记录操作日志
-            operation_log = OperationLog(
+            audit_log.record(
                 user_id=user_id,
                 operation_type='SDK_REDEEM',
                 target_type='SDK',
                 target_id=code,
-                details=f'用户 {user.username} 成功兑换SDK: {code}，获得 {sdk.days} 天VIP'
+                details=f'用户 {user.username} 成功兑换SDK: {code}，获得 {sdk.days} 天VIP',
+                sync=True
             )
-            db.session.add(operation_log)
             db.session.commit()
             
             logging.info(f"用户 {user.username} 成功兑换SDK: {code}，获得 {sdk.days} 天VIP")
@@ -336,17 +330,14 @@ class SdkService:
                 deleted_codes.append(sdk.code)
                 db.session.delete(sdk)
             
-            db.session.commit()
-            
-            # 记录操作日志
-            operation_log = OperationLog(
+            # 记录操作日志（删除提交后进入缓冲区，由后台线程写入；回滚时丢弃）
+            audit_log.record(
                 user_id=admin_user_id,
                 operation_type='SDK_DELETE',
                 target_type='SDK',
                 target_id=f'batch_{len(deleted_codes)}',
                 details=f'删除SDK: {len(deleted_codes)}个，SDK码: {", ".join(deleted_codes[:5])}{", ..." if len(deleted_codes) > 5 else ""}'
             )
-            db.session.add(operation_log)
             db.session.commit()
             
             logging.info(f"管理员 {admin_user_id} 删除SDK: {len(deleted_codes)}个")
@@ -0,0 +1,305 @@
+import json
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from flask import current_app
+from app import db
+from app.models.user import User
+from app.models.client_mapping import ClientMapping
+from app.models.client_request_count import ClientRequestCount
+from app.models.donation_record import DonationRecord
+from app.models.feedback import Feedback
+from app.models.operation_log import OperationLog
+from app.models.sdk import Sdk
+from app.services.adguard_service import AdGuardService
+from app.utils.audit_log import audit_log
+
+
+def _chunked(items: List, size: int) -> Iterable[List]:
+    """按固定大小切分列表，避免IN查询参数过多"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class UserDeletionService:
+    """用户批量删除服务类
+
+    以集合方式批量删除用户：一次查询收集所有受影响的客户端映射，
+    一次读写访问控制列表，并发删除{{ project_name }}客户端，
+    最后用批量DELETE语句在同一事务中清理映射、反馈和用户记录。
+    批量DELETE不会像ORM删除那样把其他表中指向用户的外键置空，需要在删除前显式置空，
+    否则SQLite复用用户ID后，新注册的用户会继承这些操作日志、SDK和捐赠记录。
+    删除进度保存在实例目录下的文件中，多个工作进程都可以查询。
+    """
+
+    # 删除用户前需要置空的外键列（表中的记录保留）
+    NULLIFIED_REFERENCES = (
+        (OperationLog, 'user_id'),
+        (Sdk, 'used_by'),
+        (DonationRecord, 'user_id'),
+        (Feedback, 'closed_by'),
+        (ClientRequestCount, 'user_id'),
+    )
+
+    # 每批处理的用户数量（SQLite对单条语句的参数数量有限制）
+    CHUNK_SIZE = 500
+    # 并发删除{{ project_name }}客户端的线程数
+    MAX_WORKERS = 8
+    # 删除进度记录的保留时间（秒）
+    PROGRESS_TTL = 600
+    # 任务ID只允许这些字符，用作进度文件名
+    JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+    def __init__(self, adguard_service: Optional[AdGuardService] = None,
+                 chunk_size: Optional[int] = None, max_workers: Optional[int] = None):
+        """初始化用户删除服务
+
+        Args:
+            adguard_service: {{ project_name }}服务实例，不提供时在需要时创建
+            chunk_size: 每批处理的用户数量
+            max_workers: 并发删除客户端的线程数
+        """
+        self.adguard_service = adguard_service
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def partition_users(cls, user_ids: List[int], current_user_id: int) -> Tuple[List[Tuple[int, str]], List[str]]:
+        """区分可删除和不可删除的用户
+
+        Args:
+            user_ids: 选中的用户ID列表
+            current_user_id: 当前登录的管理员ID
+
+        Returns:
+            (可删除的(用户ID, 用户名)列表, 不可删除用户的错误信息列表)
+        """
+        valid_users = []
+        invalid_users = []
+        ids = list(dict.fromkeys(int(user_id) for user_id in user_ids))
+
+        for chunk in _chunked(ids, cls.CHUNK_SIZE):
+            rows = db.session.query(User.id, User.username, User.is_admin).filter(User.id.in_(chunk)).all()
+            for user_id, username, is_admin in rows:
+                if user_id == current_user_id:
+                    invalid_users.append(f'用户{username}：不能删除当前登录的管理员账号')
+                elif is_admin:
+                    invalid_users.append(f'用户{username}：不能删除其他管理员账号')
+                else:
+                    valid_users.append((user_id, username))
+
+        return valid_users, invalid_users
+
+    def collect_targets(self, user_ids: List[int]) -> Dict:
+        """一次性收集待删除用户的全部客户端映射信息
+
+        Args:
+            user_ids: 待删除的用户ID列表
+
+        Returns:
+            Dict: 包含映射ID、客户端名称、客户端ID以及按用户分组的客户端名称
+        """
+        targets = {
+            'mapping_ids': [],
+            'client_names': [],
+            'client_ids': [],
+            'clients_by_user': {}
+        }
+
+        for chunk in _chunked(user_ids, self.chunk_size):
+            rows = db.session.query(
+                ClientMapping.id,
+                ClientMapping.user_id,
+                ClientMapping.client_name,
+                ClientMapping._client_ids
+            ).filter(ClientMapping.user_id.in_(chunk)).all()
+
+            for mapping_id, user_id, client_name, raw_client_ids in rows:
+                targets['mapping_ids'].append(mapping_id)
+                targets['client_names'].append(client_name)
+                targets['client_ids'].extend(json.loads(raw_client_ids))
+                targets['clients_by_user'].setdefault(user_id, []).append(client_name)
+
+        return targets
+
+    def delete_users(self, users: List[Tuple[int, str]], operator_id: int,
+                     log_suffix: str = '',
+                     progress_callback: Optional[Callable[[str, int, int], None]] = None) -> Dict:
+        """批量删除用户及其关联数据
+
+        Args:
+            users: 待删除的(用户ID, 用户名)列表
+            operator_id: 执行删除操作的管理员ID
+            log_suffix: 追加到每条操作日志详情后的说明
+            progress_callback: 进度回调，参数为(阶段, 已处理数, 总数)
+
+        Returns:
+            Dict: 删除结果，包含成功数量、错误信息和每个用户的结果
+        """
+        total = len(users)
+        user_ids = [user_id for user_id, _ in users]
+        client_errors = []
+        failed_client_names = {}
+
+        def report(stage, done):
+            if progress_callback:
+                progress_callback(stage, done, total)
+
+        report('collecting', 0)
+        targets = self.collect_targets(user_ids)
+
+        # {{ project_name }}侧清理：一次访问列表读写 + 并发删除客户端
+        report('adguard', 0)
+        try:
+            adguard = self.adguard_service or AdGuardService()
+
+            try:
+                adguard.remove_clients_from_allowlist(targets['client_ids'])
+            except Exception as e:
+                client_errors.append(f"从允许列表移除客户端ID失败：{str(e)}")
+
+            if targets['client_names']:
+                result = adguard.batch_delete_clients(
+                    targets['client_names'],
+                    skip_missing=True,
+                    max_workers=self.max_workers
+                )
+                for detail in result.get('details', []):
+                    if detail.get('status') == 'failed':
+                        failed_client_names[detail['name']] = detail.get('error', '')
+                client_errors.extend(result.get('errors', []))
+        except Exception as e:
+            # {{ project_name }}服务不可用时，记录错误但继续删除数据库记录
+            client_errors.append(f"{{ project_name }}服务不可用：{str(e)}")
+
+        # 缓冲中尚未写入的操作日志先写入，使其也能被置空
+        audit_log.flush()
+
+        # 数据库侧清理：分批置空外键并执行批量DELETE，整体一次提交
+        try:
+            done = 0
+            for chunk in _chunked(user_ids, self.chunk_size):
+                for model, column in self.NULLIFIED_REFERENCES:
+                    model.query.filter(getattr(model, column).in_(chunk)) \
+                        .update({column: None}, synchronize_session=False)
+                ClientMapping.query.filter(ClientMapping.user_id.in_(chunk)).delete(synchronize_session=False)
+                Feedback.query.filter(Feedback.user_id.in_(chunk)).delete(synchronize_session=False)
+                User.query.filter(User.id.in_(chunk)).delete(synchronize_session=False)
+                done += len(chunk)
+                report('database', done)
+
+            if users:
+                db.session.execute(OperationLog.__table__.insert(), [
+                    {
+                        'user_id': operator_id,
+                        'operation_type': 'delete_user',
+                        'target_type': 'User',
+                        'target_id': str(user_id),
+                        'details': f'删除用户：{username}{log_suffix}'
+                    }
+                    for user_id, username in users
+                ])
+
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        report('done', total)
+
+        results = []
+        for user_id, username in users:
+            user_errors = [
+                f"客户端 {name} 删除失败：{failed_client_names[name]}"
+                for name in targets['clients_by_user'].get(user_id, [])
+                if name in failed_client_names
+            ]
+            results.append({
+                'username': username,
+                'success': True,
+                'errors': user_errors
+            })
+
+        return {
+            'success_count': total,
+            'deleted_mappings': len(targets['mapping_ids']),
+            'deleted_clients': len(targets['client_names']) - len(failed_client_names),
+            'client_errors': client_errors,
+            'results': results
+        }
+
+    @classmethod
+    def start_progress(cls, job_id: str, total: int) -> Optional[Callable[[str, int, int], None]]:
+        """登记一个删除任务的进度，并返回用于更新进度的回调
+
+        Args:
+            job_id: 前端生成的任务ID
+            total: 待删除用户总数
+
+        Returns:
+            进度回调函数，任务ID无效时返回None
+        """
+        path = cls._progress_path(job_id)
+        if path is None:
+            return None
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+
+        # 清理过期的进度记录
+        now = time.time()
+        for name in os.listdir(directory):
+            try:
+                if now - os.path.getmtime(os.path.join(directory, name)) > cls.PROGRESS_TTL:
+                    os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+        def callback(stage, processed, total_count):
+            cls._write_progress(path, {
+                'stage': stage,
+                'processed': processed,
+                'total': total_count,
+                'updated_at': time.time()
+            })
+
+        callback('pending', 0, total)
+        return callback
+
+    @classmethod
+    def get_progress(cls, job_id: str) -> Optional[Dict]:
+        """获取删除任务的进度
+
+        Args:
+            job_id: 任务ID
+
+        Returns:
+            Optional[Dict]: 进度信息，任务不存在或已过期时返回None
+        """
+        path = cls._progress_path(job_id)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                progress = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - progress.get('updated_at', 0) > cls.PROGRESS_TTL:
+            return None
+        return progress
+
+    @classmethod
+    def _progress_path(cls, job_id) -> Optional[str]:
+        if not job_id or not cls.JOB_ID_PATTERN.match(str(job_id)):
+            return None
+        return os.path.join(current_app.instance_path, 'user_deletion_progress', f'{job_id}.json')
+
+    @staticmethod
+    def _write_progress(path, progress):
+        # 先写临时文件再替换，查询进度的进程不会读到写了一半的内容
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(progress, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,238 @@
+import base64
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+from sqlalchemy import and_, exists, func, or_, tuple_
+from app import db
+from app.models.client_mapping import ClientMapping
+from app.models.client_request_count import ClientRequestCount
+from app.models.user import User
+from app.utils.timezone import beijing_time
+
+
+class UserListService:
+    """管理后台用户列表服务类
+
+    用户管理页面按需分页加载用户：搜索、筛选和排序都在数据库中完成，
+    分页使用 (排序列, 用户ID) 键集游标，翻到多深都不需要跳过前面的行；
+    DNS请求数取自定时更新的客户端请求数表，只为当前页的用户查询客户端映射。
+    """
+
+    # 可排序的列：名称 -> 值类型
+    SORTS = {
+        'id': 'int',
+        'username': 'str',
+        'email': 'str',
+        'created_at': 'datetime',
+        'client_count': 'int',
+        'request_count': 'int',
+    }
+    DEFAULT_PER_PAGE = 50
+    MAX_PER_PAGE = 200
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        app.extensions['user_list'] = self
+
+    def page(self, search: Optional[str] = None, vip: Optional[str] = None, dns: Optional[str] = None,
+             sort: str = 'id', order: str = 'asc', cursor: Optional[str] = None,
+             per_page: int = DEFAULT_PER_PAGE) -> Dict:
+        """读取一页用户
+
+        Args:
+            search: 在用户名、邮箱和客户端名称中查找的关键字
+            vip: 'vip' 只显示有效VIP，'normal' 只显示非VIP
+            dns: 'zero' 只显示没有DNS请求的用户，'active' 只显示有请求的用户
+            sort: 排序列（SORTS 之一）
+            order: 'asc' 或 'desc'
+            cursor: 上一页返回的 next_cursor
+            per_page: 每页条数
+
+        Returns:
+            Dict: 包含 users、next_cursor（还有更多时），首页还包含 total（符合条件的用户数）
+
+        Raises:
+            ValueError: 排序列或游标无效时
+        """
+        if sort not in self.SORTS:
+            raise ValueError(f'不支持的排序列：{sort}')
+        descending = order == 'desc'
+        per_page = max(1, min(per_page or self.DEFAULT_PER_PAGE, self.MAX_PER_PAGE))
+
+        # 每个用户的请求数（请求数表只包含统计中出现的客户端，行数很少）
+        requests_sq = db.session.query(
+            ClientRequestCount.user_id.label('user_id'),
+            func.sum(ClientRequestCount.request_count).label('request_count')
+        ).filter(ClientRequestCount.user_id.isnot(None)).group_by(ClientRequestCount.user_id).subquery()
+        request_count = func.coalesce(requests_sq.c.request_count, 0)
+
+        query = db.session.query(User, request_count).outerjoin(requests_sq, requests_sq.c.user_id == User.id)
+        client_count = None
+        if sort == 'client_count':
+            # 只有按客户端数排序时才需要汇总全部映射
+            clients_sq = db.session.query(
+                ClientMapping.user_id.label('user_id'),
+                func.count(ClientMapping.id).label('client_count')
+            ).group_by(ClientMapping.user_id).subquery()
+            client_count = func.coalesce(clients_sq.c.client_count, 0)
+            query = query.outerjoin(clients_sq, clients_sq.c.user_id == User.id)
+
+        query = self._filter(query, search, vip, dns, request_count)
+        total = query.order_by(None).count() if not cursor else None
+
+        key = {
+            'id': User.id,
+            'username': User.username,
+            'email': func.coalesce(User.email, ''),
+            'created_at': func.coalesce(User.created_at, datetime(1970, 1, 1)),
+            'client_count': client_count,
+            'request_count': request_count,
+        }[sort]
+        if cursor:
+            value, user_id = self.decode_cursor(cursor, sort)
+            position = tuple_(key, User.id) if sort != 'id' else User.id
+            bound = tuple_(value, user_id) if sort != 'id' else user_id
+            query = query.filter(position < bound if descending else position > bound)
+        if sort == 'id':
+            query = query.order_by(User.id.desc() if descending else User.id.asc())
+        else:
+            query = query.order_by(key.desc() if descending else key.asc(),
+                                   User.id.desc() if descending else User.id.asc())
+        rows = query.add_columns(key.label('sort_key')).limit(per_page + 1).all()
+
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        users = self._rows([(user, count) for user, count, _ in rows])
+        result = {
+            'users': users,
+            'next_cursor': self.encode_cursor(rows[-1][2], rows[-1][0].id, sort) if rows and has_more else None,
+            'counts_updated_at': self._format(ClientRequestCount.last_updated())
+        }
+        if total is not None:
+            result['total'] = total
+        return result
+
+    @staticmethod
+    def encode_cursor(value, user_id: int, sort: str) -> str:
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        raw = json.dumps([sort, value, user_id], ensure_ascii=False).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor: str, sort: str):
+        """解析游标
+
+        Raises:
+            ValueError: 游标格式无效或与当前排序列不一致时
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            cursor_sort, value, user_id = json.loads(raw.decode('utf-8'))
+        except (ValueError, TypeError):
+            raise ValueError('无效的分页游标')
+        if cursor_sort != sort:
+            raise ValueError('分页游标与排序列不一致')
+        kind = self.SORTS[sort]
+        if kind == 'datetime':
+            value = datetime.fromisoformat(value) if isinstance(value, str) else datetime(1970, 1, 1)
+        elif kind == 'int':
+            value = int(value or 0)
+        else:
+            value = str(value or '')
+        return value, int(user_id)
+
+    @staticmethod
+    def _filter(query, search, vip, dns, request_count):
+        search = (search or '').strip()
+        if search:
+            pattern = '%' + search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            has_client = exists().where(and_(
+                ClientMapping.user_id == User.id,
+                ClientMapping.client_name.like(pattern, escape='\\')
+            ))
+            conditions = [
+                User.username.like(pattern, escape='\\'),
+                User.email.like(pattern, escape='\\'),
+                has_client
+            ]
+            if search.isdigit():
+                conditions.append(User.id == int(search))
+            query = query.filter(or_(*conditions))
+
+        # 与 User.is_vip() 的判断一致：VIP标记且未过期（没有到期时间为永久VIP）
+        active_vip = and_(
+            User.is_vip_user.is_(True),
+            or_(User.vip_expire_time.is_(None), User.vip_expire_time > beijing_time())
+        )
+        if vip == 'vip':
+            query = query.filter(active_vip)
+        elif vip == 'normal':
+            query = query.filter(~active_vip)
+
+        if dns == 'zero':
+            query = query.filter(request_count == 0)
+        elif dns == 'active':
+            query = query.filter(request_count > 0)
+        return query
+
+    def _rows(self, rows):
+        """把当前页的用户转换为字典，客户端映射一次查询得到"""
+        user_ids = [user.id for user, _ in rows]
+        clients = {}
+        if user_ids:
+            for user_id, client_name in db.session.query(ClientMapping.user_id, ClientMapping.client_name) \
+                    .filter(ClientMapping.user_id.in_(user_ids)).order_by(ClientMapping.id):
+                clients.setdefault(user_id, []).append(client_name)
+
+        return [
+            {
+                'id': user.id,
+                'username': user.username,
+                'email': user.email,
+                'created_at': self._format(user.created_at, '%Y-%m-%d %H:%M:%S'),
+                'is_admin': bool(user.is_admin),
+                'is_vip': user.is_vip(),
+                'vip_expire_time': self._format(user.vip_expire_time),
+                'client_count': len(clients.get(user.id, [])),
+                'client_names': clients.get(user.id, []),
+                'request_count': int(request_count or 0)
+            }
+            for user, request_count in rows
+        ]
+
+    @staticmethod
+    def _format(value, fmt='%Y-%m-%d %H:%M'):
+        return value.strftime(fmt) if value else None
+
+    def refresh_request_counts(self, adguard=None) -> Optional[int]:
+        """从{{ project_name }}统计数据更新客户端请求数表
+
+        Args:
+            adguard: AdGuardService 实例（可选）
+
+        Returns:
+            int: 保存的客户端数量；获取统计数据失败时返回None且保留原有数据
+        """
+        from app.services.adguard_service import AdGuardService
+
+        stats = (adguard or AdGuardService()).get_stats()
+        if not stats or 'top_clients' not in stats:
+            return None
+        # top_clients格式: [{"client_name": request_count}, ...]
+        top_clients = [
+            (client_key, request_count)
+            for client_stat in stats['top_clients']
+            for client_key, request_count in client_stat.items()
+        ]
+        return ClientRequestCount.replace_all(top_clients)
+
+
+user_list = UserListService()
@@ -0,0 +1,186 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import case, update
+from app import db
+from app.models.user import User
+from app.models.operation_log import OperationLog
+from app.services.user_deletion_service import _chunked
+from app.utils.timezone import beijing_time
+
+
+class VipBulkService:
+    """批量VIP升级服务类
+
+    用两次IN查询解析全部用户ID和用户名，在内存中计算每个用户新的VIP到期时间
+    （预览与实际执行使用同一份计算结果），再用按用户ID分支的批量UPDATE语句
+    和批量插入的操作日志在同一事务中完成修改。
+    """
+
+    # 每批更新的用户数量（每个用户在CASE中占两个参数，SQLite对单条语句的参数数量有限制）
+    CHUNK_SIZE = 300
+    # 永久VIP使用的到期时间
+    PERMANENT_EXPIRE_TIME = datetime(2099, 12, 31, 23, 59, 59)
+
+    def __init__(self, chunk_size: Optional[int] = None):
+        """初始化批量VIP升级服务
+
+        Args:
+            chunk_size: 每批处理的用户数量
+        """
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+        self.logger = logging.getLogger(__name__)
+
+    def resolve_users(self, identifiers: List) -> Tuple[List, List]:
+        """把用户ID或用户名解析为用户记录
+
+        纯数字的标识先按用户ID查找，找不到时再按用户名查找；重复的用户只保留一次。
+
+        Args:
+            identifiers: 用户ID或用户名列表
+
+        Returns:
+            (用户记录列表, 无效标识列表)，用户记录包含 id、username、is_vip_user、vip_expire_time
+        """
+        identifiers = list(dict.fromkeys(str(identifier).strip() for identifier in identifiers))
+        identifiers = [identifier for identifier in identifiers if identifier]
+        ids = [int(identifier) for identifier in identifiers if identifier.isdigit()]
+        columns = (User.id, User.username, User.is_vip_user, User.vip_expire_time)
+
+        by_id = {}
+        for chunk in _chunked(ids, self.chunk_size):
+            for row in db.session.query(*columns).filter(User.id.in_(chunk)):
+                by_id[row.id] = row
+
+        by_name = {}
+        usernames = [identifier for identifier in identifiers
+                     if not identifier.isdigit() or int(identifier) not in by_id]
+        for chunk in _chunked(usernames, self.chunk_size):
+            for row in db.session.query(*columns).filter(User.username.in_(chunk)):
+                by_name[row.username] = row
+
+        users = {}
+        invalid_users = []
+        for identifier in identifiers:
+            row = by_id.get(int(identifier)) if identifier.isdigit() else None
+            row = row or by_name.get(identifier)
+            if row is None:
+                invalid_users.append(identifier)
+            else:
+                users.setdefault(row.id, row)
+        return list(users.values()), invalid_users
+
+    def plan(self, users: List, vip_days: int, extend_existing: bool = True,
+             now: Optional[datetime] = None) -> List[Dict]:
+        """计算每个用户新的VIP到期时间
+
+        Args:
+            users: resolve_users 返回的用户记录
+            vip_days: VIP天数，-1为永久VIP，0为取消VIP
+            extend_existing: 是否在未过期的VIP基础上延长
+            now: 计算使用的当前时间，默认北京时间
+
+        Returns:
+            List[Dict]: 每个用户的 id、username、old_expire_time、new_expire_time
+        """
+        now = now or beijing_time()
+        if vip_days == -1:
+            fresh = self.PERMANENT_EXPIRE_TIME
+        elif vip_days == 0:
+            fresh = None
+        else:
+            fresh = now + timedelta(days=vip_days)
+
+        changes = []
+        for user in users:
+            new_expire_time = fresh
+            if vip_days > 0 and extend_existing and user.vip_expire_time and user.vip_expire_time > now:
+                new_expire_time = user.vip_expire_time + timedelta(days=vip_days)
+            changes.append({
+                'id': user.id,
+                'username': user.username,
+                'old_expire_time': user.vip_expire_time,
+                'new_expire_time': new_expire_time
+            })
+        return changes
+
+    def apply(self, changes: List[Dict], vip_days: int, operator_id: int) -> int:
+        """在一个事务中写入计算好的到期时间并记录操作日志
+
+        Args:
+            changes: plan 返回的修改列表
+            vip_days: VIP天数，用于生成日志说明
+            operator_id: 执行操作的管理员ID
+
+        Returns:
+            int: 更新的用户数量
+        """
+        if not changes:
+            return 0
+
+        try:
+            for chunk in _chunked(changes, self.chunk_size):
+                # 未在延长的用户都使用同一个到期时间，作为CASE的ELSE分支，只为延长的用户单独列出
+                fresh = self._fresh_expire_time(chunk, vip_days)
+                extended = {change['id']: change['new_expire_time'] for change in chunk
+                            if change['new_expire_time'] != fresh}
+                expire_time = case(extended, value=User.id, else_=fresh) if extended else fresh
+                db.session.execute(
+                    update(User)
+                    .where(User.id.in_([change['id'] for change in chunk]))
+                    .values(vip_expire_time=expire_time, is_vip_user=vip_days != 0)
+                    .execution_options(synchronize_session=False)
+                )
+
+            db.session.execute(OperationLog.__table__.insert(), [
+                {
+                    'user_id': operator_id,
+                    'operation_type': 'BULK_UPDATE',
+                    'target_type': 'USER',
+                    'target_id': str(change['id']),
+                    'details': f"批量修改用户 {change['username']} 的VIP状态: "
+                               f"{self._describe_old(change['old_expire_time'])} -> "
+                               f"{self.format_expire_time(change['new_expire_time'], vip_days)}"
+                }
+                for change in changes
+            ])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return len(changes)
+
+    @staticmethod
+    def format_expire_time(expire_time: Optional[datetime], vip_days: int) -> str:
+        """生成到期时间的显示文本"""
+        if vip_days == -1:
+            return '永久VIP'
+        if vip_days == 0 or expire_time is None:
+            return '取消VIP'
+        return expire_time.strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def describe_operation(vip_days: int, extend_existing: bool) -> str:
+        """生成操作摘要"""
+        if vip_days == -1:
+            return "设为永久VIP"
+        if vip_days == 0:
+            return "取消VIP状态"
+        if extend_existing:
+            return f"延长VIP {vip_days} 天（在现有基础上）"
+        return f"设置VIP {vip_days} 天（从现在开始）"
+
+    @staticmethod
+    def _describe_old(expire_time: Optional[datetime]) -> str:
+        return f"VIP到期时间: {expire_time}" if expire_time else "非VIP用户"
+
+    @staticmethod
+    def _fresh_expire_time(chunk: List[Dict], vip_days: int) -> Optional[datetime]:
+        """本批中最常见的新到期时间（未延长的用户共享的值）"""
+        if vip_days <= 0:
+            return chunk[0]['new_expire_time']
+        counts = {}
+        for change in chunk:
+            counts[change['new_expire_time']] = counts.get(change['new_expire_time'], 0) + 1
+        return max(counts, key=counts.get)
@@ -26,5 +26,90 @@ def init_scheduler_tasks(app):
     flask_app = app
     
     with app.app_context():
-        # 在这里可以添加其他定时任务
-        pass
\ No newline at end of file
+        # 每天凌晨把超过保留期的操作日志移动到归档文件
+        scheduler.add_job(
+            id='archive_operation_logs',
+            func=archive_operation_logs,
+            trigger='cron',
+            hour=3,
+            minute=30,
+            replace_existing=True
+        )
+        # 每30分钟检查OpenList令牌，临近到期时提前刷新
+        scheduler.add_job(
+            id='refresh_openlist_token',
+            func=refresh_openlist_token,
+            trigger='interval',
+            minutes=30,
+            replace_existing=True
+        )
+        # 定期更新用户管理页面使用的客户端DNS请求数
+        scheduler.add_job(
+            id='refresh_client_request_counts',
+            func=refresh_client_request_counts,
+            trigger='interval',
+            seconds=app.config.get('CLIENT_REQUEST_COUNTS_INTERVAL', 300),
+            replace_existing=True
+        )
+        # 每小时删除过期的验证码
+        scheduler.add_job(
+            id='purge_verification_codes',
+            func=purge_verification_codes,
+            trigger='interval',
+            hours=1,
+            replace_existing=True
+        )
+
+
+def archive_operation_logs():
+    """归档超过保留期的操作日志"""
+    from app.services.operation_log_archive_service import operation_log_archive
+
+    with flask_app.app_context():
+        try:
+            operation_log_archive.archive()
+        except Exception as e:
+            logging.error(f"归档操作日志失败: {str(e)}")
+            raise
+
+
+def purge_verification_codes():
+    """删除过期的验证码"""
+    from app.models.verification_code import VerificationCode
+
+    with flask_app.app_context():
+        try:
+            deleted = VerificationCode.purge(flask_app.config.get('VERIFICATION_CODE_PURGE_GRACE_HOURS', 24))
+            if deleted:
+                logging.info(f"已删除 {deleted} 条过期验证码")
+        except Exception as e:
+            logging.error(f"清理过期验证码失败: {str(e)}")
+            raise
+
+
+def refresh_openlist_token():
+    """OpenList令牌临近到期时提前刷新"""
+    from app.models.openlist_config import OpenListConfig
+    from app.services.openlist_service import OpenListService
+
+    with flask_app.app_context():
+        config = OpenListConfig.get_config()
+        if not config.enabled or not config.server_url or not config.username or not config.password:
+            return
+        result = OpenListService(config)._ensure_token()
+        if not result['success']:
+            logging.error(f"刷新OpenList令牌失败: {result['message']}")
+
+
+def refresh_client_request_counts():
+    """从统计数据更新客户端DNS请求数表"""
+    from app.services.user_list_service import user_list
+
+    with flask_app.app_context():
+        try:
+            saved = user_list.refresh_request_counts()
+            if saved is None:
+                logging.warning("获取统计数据失败，客户端请求数保持不变")
+        except Exception as e:
+            logging.error(f"更新客户端请求数失败: {str(e)}")
+            raise
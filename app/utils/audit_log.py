@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+操作日志缓冲写入
+大多数操作日志不需要与业务修改一起同步写入。记录的日志先放入进程内缓冲区，
+由后台线程按条数或时间间隔用一条批量INSERT写入，减少SQLite单写者上的写事务数量。
+
+日志与业务修改的一致性：记录日志时会话中有未提交的写入，日志会在该事务提交后才进入缓冲区，
+事务回滚则丢弃；没有未提交的写入时直接进入缓冲区。安全相关的操作可以使用 sync=True，
+日志作为业务事务的一部分同步写入。进程退出时会写入缓冲区中剩余的日志。
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.utils.metrics import metrics
+from app.utils.timezone import beijing_time
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLogWriter:
+    """操作日志缓冲写入器"""
+
+    def __init__(self, batch_size=100, flush_interval=2.0):
+        """初始化写入器
+
+        Args:
+            batch_size: 缓冲区达到多少条时立即写入
+            flush_interval: 定时写入的间隔（秒）
+        """
+        self.enabled = True
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.app = None
+        self._buffer = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.enabled = app.config.get('AUDIT_LOG_ASYNC', self.enabled)
+        self.batch_size = app.config.get('AUDIT_LOG_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_LOG_FLUSH_INTERVAL', self.flush_interval)
+        self.app = app
+        app.extensions['audit_log'] = self
+        atexit.register(self.flush)
+
+    def record(self, user_id, operation_type, target_type, target_id, details=None, sync=False):
+        """记录一条操作日志
+
+        Args:
+            user_id: 操作用户ID
+            operation_type: 操作类型
+            target_type: 操作对象类型
+            target_id: 操作对象ID
+            details: 详细说明
+            sync: 是否作为当前事务的一部分同步写入（安全相关的操作使用）
+        """
+        entry = {
+            'user_id': user_id,
+            'operation_type': operation_type,
+            'target_type': target_type,
+            'target_id': str(target_id),
+            'details': details,
+            'created_at': beijing_time()
+        }
+        if sync or not self.enabled or self.app is None:
+            from app.models.operation_log import OperationLog
+            db.session.add(OperationLog(**entry))
+            return
+
+        session = db.session()
+        if session.new or session.dirty or session.deleted or session.info.get('audit_log_writes'):
+            # 等待业务修改提交后再写入日志
+            session.info.setdefault('audit_log_pending', []).append(entry)
+        else:
+            self.enqueue([entry])
+
+    def enqueue(self, entries):
+        """把日志放入缓冲区，达到批量大小时唤醒后台线程写入
+
+        Args:
+            entries: 日志字典列表
+        """
+        if not entries:
+            return
+        with self._lock:
+            self._buffer.extend(entries)
+            size = len(self._buffer)
+        self._ensure_thread()
+        if size >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """把缓冲区中的日志全部写入数据库
+
+        Returns:
+            int: 写入的日志条数
+        """
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self._buffer)
+                self._buffer.clear()
+            if not entries or self.app is None:
+                return 0
+
+            from app.models.operation_log import OperationLog
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(OperationLog.__table__.insert(), entries)
+            except Exception as e:
+                # 写入失败时放回缓冲区，下次再试
+                logger.error(f"写入操作日志失败（{len(entries)}条）: {str(e)}")
+                with self._lock:
+                    self._buffer.extendleft(reversed(entries))
+                return 0
+
+            audit_log_flushed.inc(len(entries))
+            return len(entries)
+
+    @property
+    def pending(self):
+        """缓冲区中等待写入的日志条数"""
+        with self._lock:
+            return len(self._buffer)
+
+    def _ensure_thread(self):
+        # gunicorn在主进程加载应用后fork工作进程，线程不会被继承，按进程启动
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+audit_log_flushed = metrics.counter('adghm_audit_log_flushed_total', '批量写入的操作日志条数')
+
+audit_log = AuditLogWriter()
+
+
+@event.listens_for(Session, 'after_flush')
+def _audit_log_after_flush(session, flush_context):
+    """记录当前事务中已有写入，之后记录的日志要等事务提交"""
+    session.info['audit_log_writes'] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _audit_log_bulk_execute(orm_execute_state):
+    """批量UPDATE/DELETE同样算作事务中的写入"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info['audit_log_writes'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _audit_log_after_commit(session):
+    """事务提交后把等待中的日志放入缓冲区"""
+    session.info.pop('audit_log_writes', None)
+    audit_log.enqueue(session.info.pop('audit_log_pending', None))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _audit_log_after_rollback(session):
+    """事务回滚时丢弃等待中的日志"""
+    session.info.pop('audit_log_writes', None)
+    session.info.pop('audit_log_pending', None)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+上游服务熔断器
+上游连续失败达到阈值后熔断，在恢复等待期内直接拒绝请求（快速失败），
+等待期结束后只放行一个探测请求（半开状态），探测成功才恢复正常。
+"""
+import threading
+import time
+from flask import g, has_request_context
+from app.utils.metrics import metrics
+
+
+class UpstreamUnavailableError(Exception):
+    """上游服务不可用（连接失败、超时或服务器错误）"""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """熔断器处于打开状态，请求未发送"""
+
+
+class CircuitBreaker:
+    """单个上游地址的熔断器"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=3, recovery_timeout=30.0):
+        """初始化熔断器
+
+        Args:
+            name: 熔断器名称，用于指标和错误信息
+            failure_threshold: 连续失败多少次后熔断
+            recovery_timeout: 熔断后等待多久（秒）再放行探测请求
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_success = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """判断当前是否允许发送请求
+
+        半开状态下同一时间只放行一个探测请求。
+
+        Returns:
+            bool: 是否允许
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def before_request(self):
+        """发送请求前检查熔断状态
+
+        Raises:
+            CircuitOpenError: 熔断器打开时
+        """
+        if not self.allow_request():
+            retry_in = max(self.recovery_timeout - (time.monotonic() - self.opened_at), 0)
+            raise CircuitOpenError(f"上游服务{self.name}暂时不可用（已熔断，约{int(retry_in) + 1}秒后重试）")
+
+    def record_success(self):
+        """记录一次成功的请求"""
+        with self._lock:
+            self.failures = 0
+            self.last_success = time.monotonic()
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._transition(self.CLOSED)
+
+    def record_failure(self):
+        """记录一次失败的请求"""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or \
+                    (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def release(self):
+        """请求没有得出上游健康与否的结论时（如参数错误）释放探测名额"""
+        with self._lock:
+            self._probing = False
+
+    @property
+    def is_open(self):
+        """熔断器是否处于打开状态且仍在恢复等待期内"""
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.recovery_timeout
+
+    def _transition(self, state):
+        self.state = state
+        breaker_transitions.inc(breaker=self.name, state=state)
+
+
+class CircuitBreakerRegistry:
+    """按上游地址管理熔断器"""
+
+    def __init__(self):
+        self.failure_threshold = 3
+        self.recovery_timeout = 30.0
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.failure_threshold = app.config.get('CIRCUIT_BREAKER_FAILURE_THRESHOLD', self.failure_threshold)
+        self.recovery_timeout = app.config.get('CIRCUIT_BREAKER_RECOVERY_TIMEOUT', self.recovery_timeout)
+        app.extensions['circuit_breakers'] = self
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _after_request(response):
+        # 响应中使用了上游的旧数据时通过响应头告知客户端
+        services = g.get('_stale_upstreams')
+        if services:
+            response.headers['X-Upstream-Stale'] = ', '.join(sorted(services))
+        return response
+
+    def get(self, name, target):
+        """获取（必要时创建）指定上游地址的熔断器
+
+        Args:
+            name: 上游服务名称
+            target: 上游地址，地址变化后使用新的熔断器
+
+        Returns:
+            CircuitBreaker: 熔断器
+        """
+        key = (name, target)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = CircuitBreaker(name, self.failure_threshold, self.recovery_timeout)
+                    self._breakers[key] = breaker
+        return breaker
+
+    def reset(self):
+        """清除所有熔断器状态"""
+        with self._lock:
+            self._breakers.clear()
+
+
+def mark_stale(service):
+    """标记当前请求的响应使用了上游服务的旧数据
+
+    Args:
+        service: 上游服务名称
+    """
+    if has_request_context():
+        if '_stale_upstreams' not in g:
+            g._stale_upstreams = set()
+        g._stale_upstreams.add(service)
+
+
+breaker_transitions = metrics.counter(
+    'adghm_circuit_breaker_transitions_total', '熔断器状态切换次数', ('breaker', 'state'))
+
+circuit_breakers = CircuitBreakerRegistry()
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+单行配置模型缓存
+在进程内缓存SystemConfig、AdGuardConfig等单行配置，配置保存时通过SQLAlchemy事件失效，
+并通过config_cache_versions表中的版本号把失效同步到其他工作进程。
+"""
+import threading
+import time
+from itertools import chain
+from flask import g, has_app_context
+from sqlalchemy import event, inspect as sa_inspect, select, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app import db
+from app.utils.metrics import metrics
+
+
+class ConfigCache:
+    """单行配置缓存
+
+    缓存中保存的是与会话分离的配置快照，读取时通过 ``Session.merge(load=False)``
+    挂接到当前请求的会话上，因此调用方修改配置后照常 ``commit`` 即可写回数据库。
+    """
+
+    def __init__(self, check_interval=1.0):
+        """初始化配置缓存
+
+        Args:
+            check_interval: 检查其他进程配置版本的最小间隔（秒）
+        """
+        self.check_interval = check_interval
+        self._models = {}
+        self._tracked = set()
+        self._entries = {}
+        self._versions = {}
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+
+    def register(self, model):
+        """注册需要缓存的单行配置模型（可作为类装饰器使用）"""
+        self._models[model.__tablename__] = model
+        return model
+
+    def track(self, model):
+        """登记只需要维护版本号、不缓存数据的模型（可作为类装饰器使用）
+
+        被登记模型的任何修改都会递增其版本号，供页面缓存等依赖这些数据的缓存判断是否失效。
+        """
+        self._tracked.add(model.__tablename__)
+        return model
+
+    def is_registered(self, obj):
+        """判断对象是否属于已注册的配置模型或登记了版本号的模型"""
+        name = getattr(type(obj), '__tablename__', None)
+        return name in self._models or name in self._tracked
+
+    def versions(self, *names):
+        """获取配置的当前版本号（按检查间隔与其他进程同步）
+
+        Args:
+            names: 需要的表名，不指定时返回全部
+
+        Returns:
+            dict: 表名到版本号的映射
+        """
+        self._sync_versions()
+        with self._lock:
+            if not names:
+                return dict(self._versions)
+            return {name: self._versions.get(name) for name in names}
+
+    def init_app(self, app):
+        """绑定Flask应用并初始化各配置的版本记录
+
+        Args:
+            app: Flask应用实例
+        """
+        from app.models.config_version import ConfigVersion
+
+        self.check_interval = app.config.get('CONFIG_CACHE_CHECK_INTERVAL', self.check_interval)
+        app.extensions['config_cache'] = self
+
+        with app.app_context():
+            try:
+                existing = {row[0] for row in db.session.execute(select(ConfigVersion.name))}
+                for name in chain(self._models, self._tracked):
+                    if name not in existing:
+                        db.session.add(ConfigVersion(name=name, version=1))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+    def get(self, model):
+        """获取配置对象，如果不存在则创建默认配置
+
+        Args:
+            model: 已注册的配置模型类
+
+        Returns:
+            挂接在当前会话上的配置对象
+        """
+        name = model.__tablename__
+        self._sync_versions()
+
+        with self._lock:
+            entry = self._entries.get(name)
+
+        if entry is not None:
+            snapshot = entry[0]
+            # 当前会话中已有该配置时直接返回，避免覆盖尚未提交的修改
+            existing = db.session.identity_map.get(sa_inspect(snapshot).key)
+            if existing is not None:
+                return existing
+            metrics.record_cache('config', hit=True)
+            return db.session.merge(snapshot, load=False)
+
+        metrics.record_cache('config', hit=False)
+        with self._lock:
+            version = self._versions.get(name)
+
+        config = model.query.first()
+        if not config:
+            config = model()
+            db.session.add(config)
+            db.session.commit()
+            return config
+
+        snapshot = self._snapshot(config)
+        with self._lock:
+            self._entries[name] = (snapshot, version)
+        return config
+
+    def invalidate(self, *names):
+        """使指定配置（不指定时为全部配置）的本地缓存失效"""
+        with self._lock:
+            if names:
+                for name in names:
+                    self._entries.pop(name, None)
+            else:
+                self._entries.clear()
+            # 下次读取时立即同步版本号，避免重新加载后又被判定为过期
+            self._last_check = 0.0
+
+    def clear(self):
+        """清空缓存和已知的版本号"""
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._last_check = 0.0
+
+    def _snapshot(self, config):
+        """复制配置对象的列属性，生成与会话分离的快照"""
+        mapper = sa_inspect(type(config))
+        snapshot = mapper.class_manager.new_instance()
+        for attr in mapper.column_attrs:
+            setattr(snapshot, attr.key, getattr(config, attr.key))
+        make_transient_to_detached(snapshot)
+        return snapshot
+
+    def _sync_versions(self):
+        """按间隔读取版本表，丢弃被其他进程修改过的配置缓存
+
+        同一个应用上下文（即同一个请求）内最多检查一次。
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        if has_app_context():
+            if g.get('_config_cache_synced_at') == self._last_check:
+                return
+        self._last_check = now
+        if has_app_context():
+            g._config_cache_synced_at = now
+
+        from app.models.config_version import ConfigVersion
+        try:
+            rows = db.session.execute(select(ConfigVersion.name, ConfigVersion.version)).all()
+        except Exception:
+            return
+
+        with self._lock:
+            for name, version in rows:
+                self._versions[name] = version
+                entry = self._entries.get(name)
+                if entry is not None and entry[1] != version:
+                    del self._entries[name]
+
+    def _bump_versions(self, connection, names):
+        """在当前事务中递增配置版本号"""
+        from app.models.config_version import ConfigVersion
+        table = ConfigVersion.__table__
+
+        for name in names:
+            result = connection.execute(
+                update(table).where(table.c.name == name).values(version=table.c.version + 1)
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(name=name, version=1))
+
+
+config_cache = ConfigCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _config_cache_after_flush(session, flush_context):
+    """记录本次flush中被修改的配置，并在同一事务中递增其版本号"""
+    changed = set()
+    for obj in chain(session.new, session.deleted):
+        if config_cache.is_registered(obj):
+            changed.add(type(obj).__tablename__)
+    for obj in session.dirty:
+        if config_cache.is_registered(obj) and session.is_modified(obj):
+            changed.add(type(obj).__tablename__)
+
+    if changed:
+        config_cache._bump_versions(session.connection(), changed)
+        session.info.setdefault('config_cache_changed', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _config_cache_after_commit(session):
+    """事务提交后使被修改配置的本地缓存失效"""
+    changed = session.info.pop('config_cache_changed', None)
+    if changed:
+        config_cache.invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _config_cache_after_rollback(session):
+    """事务回滚时丢弃未生效的修改记录"""
+    session.info.pop('config_cache_changed', None)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _config_cache_bulk_execute(orm_execute_state):
+    """批量UPDATE/DELETE不会经过flush，同样需要递增被修改模型的版本号"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    name = getattr(mapper.class_, '__tablename__', None) if mapper is not None else None
+    if name in config_cache._models or name in config_cache._tracked:
+        session = orm_execute_state.session
+        config_cache._bump_versions(session.connection(), {name})
+        session.info.setdefault('config_cache_changed', set()).add(name)
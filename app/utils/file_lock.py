@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+进程间文件锁
+用于多个工作进程同时启动时串行执行建表等初始化操作。
+"""
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为不加锁
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path):
+    """持有指定文件的排他锁直到代码块结束
+
+    Args:
+        path: 锁文件路径
+    """
+    if fcntl is None:
+        yield
+        return
+
+    with open(path, 'a+') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
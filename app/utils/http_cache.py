@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP条件缓存与响应压缩
+为标记了 ``http_cache`` 的视图计算强ETag、处理 If-None-Match 返回304并设置 Cache-Control；
+对所有较大的文本类响应按 Accept-Encoding 协商 br/gzip 压缩。
+"""
+import gzip
+import hashlib
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖，未安装时只使用gzip
+    brotli = None
+
+# 可以压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'application/x-apple-aspen-config',
+    'image/svg+xml',
+}
+
+
+def http_cache(max_age=0, private=True, must_revalidate=True):
+    """为视图设置HTTP缓存策略并启用ETag/304
+
+    Args:
+        max_age: 客户端可以直接使用缓存的秒数，0表示每次都需要重新验证
+        private: 是否只允许浏览器缓存（包含用户数据的响应应为True）
+        must_revalidate: 缓存过期后是否必须重新验证
+
+    Returns:
+        视图函数装饰器
+    """
+    directives = ['private' if private else 'public', f'max-age={int(max_age)}']
+    if max_age == 0:
+        directives.insert(1, 'no-cache')
+    if must_revalidate:
+        directives.append('must-revalidate')
+    policy = ', '.join(directives)
+
+    def decorator(view):
+        view._http_cache_policy = policy
+        return view
+    return decorator
+
+
+class HttpCache:
+    """条件缓存与压缩中间件"""
+
+    def __init__(self):
+        self.min_size = 1024
+        self.level = 6
+        self._app = None
+
+    def init_app(self, app):
+        """绑定Flask应用并注册响应钩子
+
+        Args:
+            app: Flask应用实例
+        """
+        self._app = app
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        self.level = app.config.get('COMPRESS_LEVEL', self.level)
+        app.extensions['http_cache'] = self
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def etag_for(data):
+        """计算响应内容的强ETag
+
+        Args:
+            data: 响应内容（bytes）
+
+        Returns:
+            str: ETag值（不含引号）
+        """
+        return hashlib.sha256(data).hexdigest()[:32]
+
+    @staticmethod
+    def matching_etag(etag):
+        """返回请求的If-None-Match中与内容ETag匹配的值（包括压缩表示的ETag）
+
+        Args:
+            etag: 内容的ETag
+
+        Returns:
+            str: 匹配的ETag，没有匹配时返回None
+        """
+        # 压缩后的表示使用不同的强ETag，两种表示都可以命中304
+        for candidate in [etag] + [f'{etag}-{name}' for name in ('gzip', 'br')]:
+            if request.if_none_match.contains(candidate):
+                return candidate
+        return None
+
+    def not_modified(self, etag):
+        """构造304响应，供视图在生成内容之前提前处理条件请求
+
+        Args:
+            etag: 客户端缓存的ETag
+
+        Returns:
+            Response: 304响应
+        """
+        response = Response(status=304)
+        response.set_etag(etag)
+        policy = self._policy()
+        if policy is not None:
+            response.headers['Cache-Control'] = policy
+        return response
+
+    def _policy(self):
+        view = self._app.view_functions.get(request.endpoint) if request.endpoint else None
+        return getattr(view, '_http_cache_policy', None)
+
+    def _choose_encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def _compressible(self, response):
+        mimetype = response.mimetype or ''
+        return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+    def _after_request(self, response):
+        if request.method not in ('GET', 'HEAD'):
+            return response
+        policy = self._policy()
+
+        # 文件响应（send_file/send_from_directory）自带ETag和条件请求处理，
+        # 只设置缓存策略，不读出文件内容计算ETag或压缩
+        if response.direct_passthrough:
+            if policy is not None and response.status_code in (200, 304):
+                response.headers['Cache-Control'] = policy
+            return response
+
+        if response.status_code != 200:
+            return response
+        # 其他流式响应（如SSE）不处理
+        if response.is_streamed or 'Content-Encoding' in response.headers:
+            return response
+
+        encoding = None
+        if self._compressible(response):
+            encoding = self._choose_encoding()
+            response.vary.add('Accept-Encoding')
+
+        if policy is None and encoding is None:
+            return response
+
+        data = response.get_data()
+
+        if len(data) < self.min_size:
+            encoding = None
+
+        if policy is not None:
+            response.headers['Cache-Control'] = policy
+            etag = self.etag_for(data)
+            if self.matching_etag(etag):
+                response.status_code = 304
+                response.set_data(b'')
+                response.headers.pop('Content-Length', None)
+                response.set_etag(f'{etag}-{encoding}' if encoding else etag)
+                return response
+            response.set_etag(f'{etag}-{encoding}' if encoding else etag)
+
+        if encoding:
+            if encoding == 'br':
+                compressed = brotli.compress(data, quality=min(self.level, 11))
+            else:
+                compressed = gzip.compress(data, compresslevel=self.level)
+            response.set_data(compressed)
+            response.headers['Content-Encoding'] = encoding
+
+        return response
+
+
+http_cache_middleware = HttpCache()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+查询日志过滤条件编译
+把过滤条件字典预先编译成一个判断函数：时间范围只解析一次，域名通配符编译为
+后缀集合或正则表达式，查询类型和拦截原因使用集合判断，过滤大量日志时每条日志只做最少的工作。
+"""
+import fnmatch
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Optional
+
+# 未带时区的时间按北京时间处理（与 app.utils.timezone.beijing_time 一致）
+DEFAULT_TZ = timezone(timedelta(hours=8))
+
+# 可以编译的过滤条件
+ALL_KEYS = ('domain', 'query_type', 'response_code', 'blocked', 'reason', 'start_time', 'end_time')
+
+_WILDCARD_CHARS = re.compile(r'[*?\[]')
+_PATTERN_SEPARATORS = re.compile(r'[\s,]+')
+
+
+def parse_time(value: str) -> datetime:
+    """解析ISO 8601时间，未带时区时按北京时间处理
+
+    Args:
+        value: 时间字符串，支持Z后缀和超过6位的小数秒
+
+    Returns:
+        datetime: 带时区的时间
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        from dateutil import parser
+        parsed = parser.isoparse(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=DEFAULT_TZ)
+    return parsed
+
+
+def is_blocked(log: Dict) -> bool:
+    """判断日志记录是否被拦截（拦截原因以Filtered开头）"""
+    return log.get('reason', '').startswith('Filtered')
+
+
+def has_wildcard(pattern: Optional[str]) -> bool:
+    """判断域名条件是否包含通配符"""
+    return bool(pattern) and bool(_WILDCARD_CHARS.search(pattern))
+
+
+def domain_search_term(pattern: str) -> str:
+    """从域名通配符中取出最长的字面片段，作为{{ project_name }}的search参数
+
+    {{ project_name }}的search参数只做子串匹配，不认识通配符。
+
+    Args:
+        pattern: 域名条件（可以用逗号或空格分隔多个）
+
+    Returns:
+        str: 可以交给服务端预先筛选的搜索词；多个条件时返回空字符串
+    """
+    patterns = [p for p in _PATTERN_SEPARATORS.split(pattern.strip()) if p]
+    if len(patterns) != 1:
+        return ''
+    fragments = [f.strip('.') for f in _WILDCARD_CHARS.split(patterns[0])]
+    return max(fragments, key=len, default='')
+
+
+def compile_domain_matcher(pattern: str) -> Callable[[str], bool]:
+    """把域名通配符编译成匹配函数
+
+    ``*.example.com`` 这样的条件放入后缀集合按标签逐级查找，``example.*`` 使用前缀匹配，
+    其余通配符合并为一个不区分大小写的正则表达式。每个域名的匹配结果会被记住。
+
+    Args:
+        pattern: 域名条件（可以用逗号或空格分隔多个）
+
+    Returns:
+        Callable[[str], bool]: 判断域名是否匹配的函数
+    """
+    suffixes = set()
+    prefixes = []
+    exact = set()
+    regexes = []
+    for item in _PATTERN_SEPARATORS.split(pattern.strip().lower()):
+        item = item.rstrip('.')
+        if not item:
+            continue
+        if not has_wildcard(item):
+            exact.add(item)
+        elif item.startswith('*.') and not has_wildcard(item[2:]):
+            suffixes.add(item[2:])
+        elif item.endswith('.*') and not has_wildcard(item[:-2]):
+            prefixes.append(item[:-1])
+        else:
+            regexes.append(fnmatch.translate(item))
+
+    prefixes = tuple(prefixes)
+    regex = re.compile('|'.join(regexes)).match if regexes else None
+
+    def match_name(name: str) -> bool:
+        name = name.rstrip('.').lower()
+        if name in exact:
+            return True
+        if suffixes:
+            # 依次检查 a.b.example.com 的每个上级域名
+            index = name.find('.')
+            while index != -1:
+                if name[index + 1:] in suffixes:
+                    return True
+                index = name.find('.', index + 1)
+        if prefixes and name.startswith(prefixes):
+            return True
+        return regex is not None and regex(name) is not None
+
+    # 日志中的域名重复率很高，记住每个域名的匹配结果
+    results = {}
+
+    def match(name: str) -> bool:
+        result = results.get(name)
+        if result is None:
+            result = results[name] = match_name(name)
+        return result
+
+    return match
+
+
+def _as_set(value) -> Optional[frozenset]:
+    """把单个值、逗号分隔的字符串或列表转换为集合"""
+    if value is None or value == '' or value == []:
+        return None
+    if isinstance(value, str):
+        value = _PATTERN_SEPARATORS.split(value.strip())
+    return frozenset(v for v in value if v)
+
+
+def compile_log_filter(filters: Optional[Dict], keys: Iterable[str] = ALL_KEYS) -> Callable[[Dict], bool]:
+    """把过滤条件编译为判断单条日志是否匹配的函数
+
+    Args:
+        filters: 过滤条件
+            - domain: 域名，包含通配符（* ? [ ]）时在本地匹配，可以用逗号分隔多个
+            - query_type: 查询类型，可以是列表或逗号分隔的多个
+            - response_code: 响应代码
+            - blocked: 是否被拦截
+            - reason: 拦截原因（不区分大小写的子串，可以是列表）
+            - start_time / end_time: 时间范围（ISO 8601）
+        keys: 需要在本地应用的过滤条件，其余条件交给服务端处理
+
+    Returns:
+        Callable[[Dict], bool]: 判断函数
+
+    Raises:
+        ValueError: 时间格式无效时
+    """
+    filters = filters or {}
+    keys = set(keys)
+    checks = []
+
+    domain = filters.get('domain') if 'domain' in keys else None
+    if has_wildcard(domain):
+        domain_match = compile_domain_matcher(domain)
+        checks.append(lambda log: domain_match(log.get('question', {}).get('name', '')))
+
+    query_types = _as_set(filters.get('query_type')) if 'query_type' in keys else None
+    if query_types:
+        checks.append(lambda log: log.get('question', {}).get('type') in query_types)
+
+    response_code = filters.get('response_code') if 'response_code' in keys else None
+    if response_code:
+        checks.append(lambda log: log.get('status') == response_code)
+
+    blocked = filters.get('blocked') if 'blocked' in keys else None
+    if blocked is not None:
+        blocked = bool(blocked)
+        checks.append(lambda log: is_blocked(log) == blocked)
+
+    reasons = _as_set(filters.get('reason')) if 'reason' in keys else None
+    if reasons:
+        reasons = tuple(reason.lower() for reason in reasons)
+
+        def reason_match(log):
+            reason = log.get('reason')
+            if not reason:
+                return False
+            reason = reason.lower()
+            return any(r in reason for r in reasons)
+        checks.append(reason_match)
+
+    start = parse_time(filters['start_time']) if 'start_time' in keys and filters.get('start_time') else None
+    end = parse_time(filters['end_time']) if 'end_time' in keys and filters.get('end_time') else None
+    if start is not None or end is not None:
+        lower = start or datetime.min.replace(tzinfo=timezone.utc)
+        upper = end or datetime.max.replace(tzinfo=timezone.utc)
+
+        def time_match(log):
+            value = log.get('time')
+            if not value:
+                return False
+            try:
+                log_time = parse_time(value)
+            except ValueError:
+                return False
+            return lower <= log_time <= upper
+        # 时间解析代价最高，放在最后
+        checks.append(time_match)
+
+    if not checks:
+        return lambda log: True
+    if len(checks) == 1:
+        return checks[0]
+    checks = tuple(checks)
+
+    def match_all(log):
+        for check in checks:
+            if not check(log):
+                return False
+        return True
+    return match_all
@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标采集
+提供Prometheus文本格式的 /metrics 端点，记录路由耗时、上游API调用耗时与重试、
+每个请求的数据库查询次数、缓存命中情况以及定时任务耗时。
+
+多进程部署时每个工作进程定期把自己的指标写入 METRICS_DIR 目录下以进程号命名的文件，
+/metrics 端点汇总目录中所有进程的指标后输出。部署新版本前应清空该目录。
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from urllib3.util.retry import Retry
+
+# 默认的耗时直方图分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 每个请求数据库查询次数的分桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    """转义标签值中的特殊字符"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    """把标签列表格式化为 {a="b",c="d"} 形式"""
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    """格式化样本值"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """指标基类，按标签值保存样本"""
+
+    type_name = ''
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._samples = {}
+
+    def _key(self, labels):
+        """根据标签字典生成样本键"""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'指标{self.name}的标签应为：{", ".join(self.labelnames)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def describe(self):
+        """返回可序列化的指标描述"""
+        return {
+            'type': self.type_name,
+            'help': self.documentation,
+            'labelnames': list(self.labelnames)
+        }
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        """计数器加上指定值
+
+        Args:
+            amount: 增加的数量
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self.registry.lock:
+            self._samples[key] = self._samples.get(key, 0) + amount
+
+    def samples(self):
+        """返回可序列化的样本列表"""
+        return [[list(key), value] for key, value in self._samples.items()]
+
+
+class Histogram(_Metric):
+    """直方图，记录观测值的分布、总和与次数"""
+
+    type_name = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        """记录一次观测值
+
+        Args:
+            value: 观测值
+            **labels: 标签值
+        """
+        key = self._key(labels)
+        with self.registry.lock:
+            sample = self._samples.get(key)
+            if sample is None:
+                # 各分桶的计数（非累计）+ 溢出桶，以及总和
+                sample = self._samples[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample['buckets'][index] += 1
+                    break
+            else:
+                sample['buckets'][-1] += 1
+            sample['sum'] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """记录代码块执行耗时的上下文管理器"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def describe(self):
+        description = super().describe()
+        description['buckets'] = list(self.buckets)
+        return description
+
+    def samples(self):
+        """返回可序列化的样本列表"""
+        return [
+            [list(key), {'buckets': list(sample['buckets']), 'sum': sample['sum']}]
+            for key, sample in self._samples.items()
+        ]
+
+
+class MetricsRegistry:
+    """指标注册表
+
+    负责创建指标、挂接Flask请求钩子和SQLAlchemy事件，并在多进程间汇总指标。
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._metrics = {}
+        self._upstream_listeners = []
+        self.directory = None
+        self.flush_interval = 5.0
+        self.token = None
+        self._last_flush = 0.0
+        self._job_starts = {}
+
+        self.http_requests = self.counter(
+            'adghm_http_requests_total', 'HTTP请求总数', ('endpoint', 'method', 'status'))
+        self.http_latency = self.histogram(
+            'adghm_http_request_duration_seconds', 'HTTP请求处理耗时', ('endpoint', 'method'))
+        self.db_queries = self.counter(
+            'adghm_db_queries_total', '执行的SQL语句总数')
+        self.request_db_queries = self.histogram(
+            'adghm_http_request_db_queries', '每个HTTP请求执行的SQL语句数', ('endpoint',),
+            buckets=QUERY_COUNT_BUCKETS)
+        self.upstream_requests = self.counter(
+            'adghm_upstream_requests_total', '上游API调用总数', ('service', 'endpoint', 'method', 'status'))
+        self.upstream_latency = self.histogram(
+            'adghm_upstream_request_duration_seconds', '上游API调用耗时（包含重试）', ('service', 'endpoint', 'method'))
+        self.upstream_retries = self.counter(
+            'adghm_upstream_retries_total', '上游API调用的重试次数', ('service', 'method'))
+        self.cache_requests = self.counter(
+            'adghm_cache_requests_total', '缓存读取次数', ('cache', 'result'))
+        self.job_runs = self.counter(
+            'adghm_scheduler_job_runs_total', '定时任务执行次数', ('job', 'result'))
+        self.job_duration = self.histogram(
+            'adghm_scheduler_job_duration_seconds', '定时任务执行耗时', ('job',))
+
+    def counter(self, name, documentation, labelnames=()):
+        """创建并注册计数器"""
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """创建并注册直方图"""
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'指标{metric.name}已注册')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def record_cache(self, cache, hit):
+        """记录一次缓存读取
+
+        Args:
+            cache: 缓存名称
+            hit: 是否命中
+        """
+        self.cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+    def add_upstream_listener(self, listener):
+        """注册上游API调用的监听函数（参数与 observe_upstream 相同）"""
+        if listener not in self._upstream_listeners:
+            self._upstream_listeners.append(listener)
+
+    def observe_upstream(self, service, endpoint, method, status, duration, detail=None):
+        """记录一次上游API调用
+
+        Args:
+            service: 上游服务名称（adguard、openlist、deepseek）
+            endpoint: API端点路径
+            method: HTTP方法
+            status: 响应状态码，请求异常时为error
+            duration: 耗时（秒）
+            detail: 请求参数，仅传给监听函数用于识别重复调用
+        """
+        method = method.upper()
+        self.upstream_requests.inc(service=service, endpoint=endpoint, method=method, status=status)
+        self.upstream_latency.observe(duration, service=service, endpoint=endpoint, method=method)
+        for listener in self._upstream_listeners:
+            listener(service, endpoint, method, status, duration, detail)
+
+    def init_app(self, app):
+        """绑定Flask应用，注册请求钩子，配置了 METRICS_TOKEN 时注册 /metrics 端点
+
+        指标中包含路由、上游接口及其错误率，没有配置令牌时不提供 /metrics，
+        指标仍然照常采集并写入指标目录。
+
+        Args:
+            app: Flask应用实例
+        """
+        self.directory = app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        self.token = app.config.get('METRICS_TOKEN')
+        app.extensions['metrics'] = self
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError:
+            self.directory = None
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        if self.token:
+            app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+        atexit.register(self.flush)
+
+    def instrument_scheduler(self, scheduler):
+        """监听定时任务的提交和完成事件，记录任务耗时
+
+        Args:
+            scheduler: flask_apscheduler.APScheduler 实例
+        """
+        from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+
+        def listener(event):
+            if event.code == EVENT_JOB_SUBMITTED:
+                with self.lock:
+                    self._job_starts[event.job_id] = time.perf_counter()
+                return
+
+            with self.lock:
+                start = self._job_starts.pop(event.job_id, None)
+            result = 'error' if event.code == EVENT_JOB_ERROR else 'success'
+            self.job_runs.inc(job=event.job_id, result=result)
+            if start is not None:
+                self.job_duration.observe(time.perf_counter() - start, job=event.job_id)
+
+        scheduler.add_listener(listener, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
+
+    def _before_request(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_queries = 0
+
+    def _after_request(self, response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+
+        endpoint = request.endpoint or 'unmatched'
+        if endpoint != 'metrics':
+            method = request.method
+            self.http_requests.inc(endpoint=endpoint, method=method, status=response.status_code)
+            self.http_latency.observe(time.perf_counter() - start, endpoint=endpoint, method=method)
+            self.request_db_queries.observe(g.get('_metrics_queries', 0), endpoint=endpoint)
+
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        return response
+
+    def _metrics_view(self):
+        """输出所有工作进程汇总后的指标（需要令牌）"""
+        auth = request.headers.get('Authorization', '')
+        if not self.token or (auth != f'Bearer {self.token}' and request.args.get('token') != self.token):
+            abort(403)
+
+        self.flush()
+        merged = self.collect_all()
+        return Response(self.render(merged), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    def snapshot(self):
+        """导出当前进程的指标快照"""
+        with self.lock:
+            return {
+                name: dict(metric.describe(), samples=metric.samples())
+                for name, metric in self._metrics.items()
+            }
+
+    def flush(self):
+        """把当前进程的指标写入共享目录"""
+        self._last_flush = time.monotonic()
+        if not self.directory:
+            return
+
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def collect_all(self):
+        """读取并合并所有工作进程的指标快照"""
+        snapshots = []
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        if not snapshots:
+            snapshots.append(self.snapshot())
+        return self.merge(snapshots)
+
+    @staticmethod
+    def merge(snapshots):
+        """合并多个进程的指标快照，计数器和直方图按标签求和"""
+        merged = {}
+        for snapshot in snapshots:
+            for name, data in snapshot.items():
+                target = merged.setdefault(name, {
+                    'type': data['type'],
+                    'help': data['help'],
+                    'labelnames': data['labelnames'],
+                    'buckets': data.get('buckets'),
+                    'samples': {}
+                })
+                for labels, value in data['samples']:
+                    key = tuple(labels)
+                    if data['type'] == 'histogram':
+                        current = target['samples'].get(key)
+                        if current is None:
+                            target['samples'][key] = {'buckets': list(value['buckets']), 'sum': value['sum']}
+                        else:
+                            current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+                            current['sum'] += value['sum']
+                    else:
+                        target['samples'][key] = target['samples'].get(key, 0) + value
+        return merged
+
+    @staticmethod
+    def render(merged):
+        """把合并后的指标渲染为Prometheus文本格式"""
+        lines = []
+        for name in sorted(merged):
+            data = merged[name]
+            lines.append(f'# HELP {name} {data["help"]}')
+            lines.append(f'# TYPE {name} {data["type"]}')
+            labelnames = data['labelnames']
+
+            for key in sorted(data['samples']):
+                labels = list(zip(labelnames, key))
+                value = data['samples'][key]
+
+                if data['type'] != 'histogram':
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+                    continue
+
+                cumulative = 0
+                bounds = list(data['buckets']) + [float('inf')]
+                for bound, count in zip(bounds, value['buckets']):
+                    cumulative += count
+                    bucket_labels = labels + [('le', _format_value(float(bound)))]
+                    lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(value["sum"])}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class MeteredRetry(Retry):
+    """记录重试次数的urllib3重试策略"""
+
+    def __init__(self, *args, service='upstream', **kwargs):
+        super().__init__(*args, **kwargs)
+        self.service = service
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.service = self.service
+        return retry
+
+    def increment(self, method=None, url=None, *args, **kwargs):
+        retry = super().increment(method, url, *args, **kwargs)
+        metrics.upstream_retries.inc(service=self.service, method=(method or '').upper())
+        return retry
+
+
+metrics = MetricsRegistry()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    """统计SQL语句数量，并累计到当前请求"""
+    metrics.db_queries.inc()
+    if has_request_context():
+        g._metrics_queries = g.get('_metrics_queries', 0) + 1
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+匿名页面整页缓存
+宣传页、使用指南等页面对未登录用户的渲染结果完全相同，缓存渲染后的HTML，
+命中时不再访问数据库和渲染Jinja模板。缓存键包含请求路径和相关配置的版本号，
+系统配置、捐赠配置或公告被修改后自动失效。
+"""
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, session, make_response, Response
+from flask_login import current_user
+from app.utils.config_cache import config_cache
+from app.utils.metrics import metrics
+
+
+class PageCache:
+    """整页缓存：进程内LRU，可选磁盘存储供多个工作进程共享"""
+
+    # 匿名页面渲染时依赖的数据（config_cache_versions中的表名），其中任意一项变化都会使缓存失效
+    DEPENDENCIES = ('system_config', 'donation_config', 'announcements')
+
+    def __init__(self, max_entries=128, ttl=600):
+        """初始化页面缓存
+
+        Args:
+            max_entries: 进程内最多缓存的页面数量
+            ttl: 缓存页面的最长有效期（秒）
+        """
+        self.enabled = True
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version_digest = None
+
+    def init_app(self, app):
+        """绑定Flask应用
+
+        Args:
+            app: Flask应用实例
+        """
+        self.enabled = app.config.get('PAGE_CACHE_ENABLED', self.enabled)
+        self.max_entries = app.config.get('PAGE_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.get('PAGE_CACHE_TTL', self.ttl)
+        self.directory = app.config.get('PAGE_CACHE_DIR')
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.extensions['page_cache'] = self
+
+    def cached(self, view):
+        """缓存视图对匿名用户的渲染结果（视图装饰器）
+
+        只缓存不带查询参数的GET/HEAD请求；已登录用户、有待显示的闪现消息
+        或视图修改了会话时照常渲染。
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self._cacheable():
+                return view(*args, **kwargs)
+
+            key = self._key()
+            body = self._get(key)
+            metrics.record_cache('page', hit=body is not None)
+            if body is not None:
+                response = Response(body, mimetype='text/html')
+                response.headers['X-Page-Cache'] = 'HIT'
+                return response
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200 and response.mimetype == 'text/html' \
+                    and not response.is_streamed and not session.modified:
+                self._set(key, response.get_data())
+                response.headers['X-Page-Cache'] = 'MISS'
+            return response
+        return wrapper
+
+    def clear(self):
+        """清空进程内缓存和磁盘缓存"""
+        with self._lock:
+            self._entries.clear()
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _cacheable(self):
+        if not self.enabled or request.method not in ('GET', 'HEAD') or request.query_string:
+            return False
+        if '_flashes' in session:
+            return False
+        return not current_user.is_authenticated
+
+    def _key(self):
+        """根据请求路径和配置版本号生成缓存键"""
+        versions = sorted(config_cache.versions(*self.DEPENDENCIES).items())
+        digest = hashlib.sha256(repr(versions).encode()).hexdigest()[:16]
+        if digest != self._version_digest:
+            self._on_version_change(digest)
+        return f'{digest}:{request.path}'
+
+    def _on_version_change(self, digest):
+        """配置版本变化后丢弃旧版本的缓存页面"""
+        with self._lock:
+            previous, self._version_digest = self._version_digest, digest
+            for key in [key for key in self._entries if not key.startswith(digest + ':')]:
+                del self._entries[key]
+        if previous and self.directory:
+            shutil.rmtree(os.path.join(self.directory, previous), ignore_errors=True)
+
+    def _disk_path(self, key):
+        digest, path = key.split(':', 1)
+        name = hashlib.sha256(path.encode()).hexdigest()[:32]
+        return os.path.join(self.directory, digest, name + '.html')
+
+    def _get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl:
+                    self._entries.move_to_end(key)
+                    return entry[0]
+                del self._entries[key]
+
+        if not self.directory:
+            return None
+        path = self._disk_path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if now - stored_at >= self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        self._remember(key, body, stored_at)
+        return body
+
+    def _set(self, key, body):
+        now = time.time()
+        self._remember(key, body, now)
+        if not self.directory:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，避免其他进程读到写了一半的页面
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _remember(self, key, body, stored_at):
+        with self._lock:
+            self._entries[key] = (body, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+page_cache = PageCache()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+请求预算追踪
+调试/性能分析用的中间件：记录每个请求发出的上游API调用和SQL语句及其耗时，
+标记重复的相同调用，并在路由超出预算时输出警告日志和响应头。
+
+通过 REQUEST_TRACE_ENABLED 开启；单个视图可以用 ``trace_budget`` 装饰器设置自己的预算。
+"""
+import json
+import logging
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.utils.metrics import metrics
+
+
+class RequestBudgetExceeded(Exception):
+    """请求超出上游调用或SQL语句预算（仅在 REQUEST_TRACE_RAISE 开启时抛出）"""
+
+
+def trace_budget(upstream=None, sql=None):
+    """为视图函数设置单独的请求预算
+
+    Args:
+        upstream: 允许的上游API调用次数
+        sql: 允许的SQL语句数量
+
+    Returns:
+        视图函数装饰器
+    """
+    def decorator(view):
+        view._trace_budget = {'upstream': upstream, 'sql': sql}
+        return view
+    return decorator
+
+
+class RequestTracer:
+    """请求追踪器"""
+
+    def __init__(self):
+        self.enabled = False
+        self.upstream_budget = 3
+        self.sql_budget = 30
+        self.raise_on_exceed = False
+        self.logger = logging.getLogger(__name__)
+        self._app = None
+
+    def init_app(self, app):
+        """绑定Flask应用并注册请求钩子
+
+        Args:
+            app: Flask应用实例
+        """
+        self.enabled = app.config.get('REQUEST_TRACE_ENABLED', False)
+        self.upstream_budget = app.config.get('REQUEST_TRACE_UPSTREAM_BUDGET', self.upstream_budget)
+        self.sql_budget = app.config.get('REQUEST_TRACE_SQL_BUDGET', self.sql_budget)
+        self.raise_on_exceed = app.config.get('REQUEST_TRACE_RAISE', False)
+        self._app = app
+        app.extensions['request_tracer'] = self
+
+        if not self.enabled:
+            return
+
+        metrics.add_upstream_listener(self._record_upstream)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _current_trace(self):
+        if not self.enabled or not has_request_context():
+            return None
+        return g.get('_request_trace')
+
+    def _before_request(self):
+        g._request_trace = {'start': time.perf_counter(), 'upstream': [], 'sql': []}
+
+    def _record_upstream(self, service, endpoint, method, status, duration, detail=None):
+        trace = self._current_trace()
+        if trace is None:
+            return
+        trace['upstream'].append({
+            'key': (service, method.upper(), endpoint, json.dumps(detail, sort_keys=True, default=str)),
+            'status': status,
+            'duration': duration
+        })
+
+    def record_sql(self, statement, parameters, duration):
+        """记录一条SQL语句"""
+        trace = self._current_trace()
+        if trace is None:
+            return
+        trace['sql'].append({
+            'statement': statement,
+            'parameters': repr(parameters),
+            'duration': duration
+        })
+
+    def _budget(self):
+        view = self._app.view_functions.get(request.endpoint) if request.endpoint else None
+        budget = getattr(view, '_trace_budget', None) or {}
+        upstream = budget.get('upstream')
+        sql = budget.get('sql')
+        return (
+            self.upstream_budget if upstream is None else upstream,
+            self.sql_budget if sql is None else sql
+        )
+
+    def summarize(self, trace):
+        """汇总一次请求的追踪结果
+
+        Args:
+            trace: 请求追踪记录
+
+        Returns:
+            Dict: 调用次数、耗时以及重复调用信息
+        """
+        upstream_calls = Counter(call['key'] for call in trace['upstream'])
+        identical_sql = Counter((item['statement'], item['parameters']) for item in trace['sql'])
+        repeated_statements = Counter(item['statement'] for item in trace['sql'])
+
+        return {
+            'elapsed': time.perf_counter() - trace['start'],
+            'upstream_count': len(trace['upstream']),
+            'upstream_time': sum(call['duration'] for call in trace['upstream']),
+            'sql_count': len(trace['sql']),
+            'sql_time': sum(item['duration'] for item in trace['sql']),
+            'duplicate_upstream': [
+                (f'{key[1]} {key[0]}:{key[2]}', count)
+                for key, count in upstream_calls.items() if count > 1
+            ],
+            'duplicate_sql': [
+                (statement, count) for (statement, _), count in identical_sql.items() if count > 1
+            ],
+            # 同一语句以不同参数重复执行，通常是N+1查询
+            'repeated_statements': [
+                (statement, count) for statement, count in repeated_statements.items() if count > 2
+            ]
+        }
+
+    def _after_request(self, response):
+        trace = g.pop('_request_trace', None)
+        if trace is None:
+            return response
+
+        summary = self.summarize(trace)
+        upstream_budget, sql_budget = self._budget()
+        exceeded = []
+        if summary['upstream_count'] > upstream_budget:
+            exceeded.append('upstream')
+        if summary['sql_count'] > sql_budget:
+            exceeded.append('sql')
+
+        response.headers['X-Upstream-Calls'] = str(summary['upstream_count'])
+        response.headers['X-SQL-Queries'] = str(summary['sql_count'])
+        response.headers['Server-Timing'] = ', '.join([
+            f"app;dur={summary['elapsed'] * 1000:.1f}",
+            f"upstream;dur={summary['upstream_time'] * 1000:.1f}",
+            f"db;dur={summary['sql_time'] * 1000:.1f}"
+        ])
+
+        if summary['duplicate_upstream'] or summary['duplicate_sql'] or summary['repeated_statements']:
+            response.headers['X-Trace-Duplicates'] = str(
+                len(summary['duplicate_upstream']) + len(summary['duplicate_sql']) + len(summary['repeated_statements'])
+            )
+            for call, count in summary['duplicate_upstream']:
+                self.logger.warning(f'{request.method} {request.path} 重复调用上游API {count}次：{call}')
+            for statement, count in summary['duplicate_sql']:
+                self.logger.warning(f'{request.method} {request.path} 重复执行相同SQL {count}次：{statement[:200]}')
+            for statement, count in summary['repeated_statements']:
+                self.logger.warning(f'{request.method} {request.path} 疑似N+1查询，语句执行{count}次：{statement[:200]}')
+
+        if exceeded:
+            response.headers['X-Budget-Exceeded'] = ','.join(exceeded)
+            message = (
+                f"{request.method} {request.path} 超出请求预算："
+                f"上游调用 {summary['upstream_count']}/{upstream_budget}，"
+                f"SQL语句 {summary['sql_count']}/{sql_budget}"
+            )
+            self.logger.warning(message)
+            if self.raise_on_exceed:
+                raise RequestBudgetExceeded(message)
+
+        return response
+
+
+request_tracer = RequestTracer()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _trace_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """记录SQL语句开始时间"""
+    if request_tracer.enabled:
+        conn.info.setdefault('_trace_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _trace_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    """记录SQL语句及耗时"""
+    if not request_tracer.enabled:
+        return
+    starts = conn.info.get('_trace_start')
+    if starts:
+        request_tracer.record_sql(statement, parameters, time.perf_counter() - starts.pop())
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+定时任务主进程选举
+多个工作进程同时运行时，通过实例目录下的文件锁保证只有一个进程启动APScheduler。
+持有锁的进程退出后操作系统会释放文件锁，其他进程在下一次重试时接管定时任务。
+"""
+import logging
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，退化为单进程模式
+    fcntl = None
+
+
+class SchedulerLeader:
+    """定时任务主进程选举器"""
+
+    def __init__(self, lock_path=None, retry_interval=15.0):
+        """初始化选举器
+
+        Args:
+            lock_path: 锁文件路径，不提供时使用实例目录下的 scheduler.lock
+            retry_interval: 非主进程重新尝试获取锁的间隔（秒）
+        """
+        self.lock_path = lock_path
+        self.retry_interval = retry_interval
+        self.is_leader = False
+        self.logger = logging.getLogger(__name__)
+        self._lock_file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self, app, scheduler):
+        """参与选举，成为主进程时启动调度器，否则在后台等待接管
+
+        Args:
+            app: Flask应用实例
+            scheduler: flask_apscheduler.APScheduler 实例
+        """
+        self.lock_path = self.lock_path or app.config.get('SCHEDULER_LOCK_FILE') or \
+            os.path.join(app.instance_path, 'scheduler.lock')
+        self.retry_interval = app.config.get('SCHEDULER_LEADER_RETRY_INTERVAL', self.retry_interval)
+
+        if self._try_become_leader(scheduler):
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._wait_for_leadership,
+            args=(scheduler,),
+            name='scheduler-leader-election',
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """停止等待接管（主进程的锁在进程退出时自动释放）"""
+        self._stop.set()
+
+    def _wait_for_leadership(self, scheduler):
+        while not self._stop.wait(self.retry_interval):
+            if self._try_become_leader(scheduler):
+                return
+
+    def _acquire_lock(self):
+        """以非阻塞方式获取文件锁
+
+        Returns:
+            bool: 是否获取成功
+        """
+        if fcntl is None:
+            return True
+
+        lock_file = open(self.lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        # 保持文件打开，进程存活期间一直持有锁
+        self._lock_file = lock_file
+        return True
+
+    def _try_become_leader(self, scheduler):
+        try:
+            if not self._acquire_lock():
+                return False
+        except OSError as e:
+            self.logger.error(f"获取定时任务锁失败: {str(e)}")
+            return False
+
+        self.is_leader = True
+        if not scheduler.running:
+            scheduler.start()
+        self.logger.info(f"进程 {os.getpid()} 成为定时任务主进程")
+        return True
+
+
+scheduler_leader = SchedulerLeader()
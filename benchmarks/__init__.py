@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""端到端基准测试：模拟的AdGuard Home服务和基准测试运行器"""
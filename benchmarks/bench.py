@@ -0,0 +1,484 @@
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试
+启动进程内的模拟AdGuard Home，用临时SQLite数据库创建Flask应用，
+通过测试客户端驱动热点路由，输出每个场景的吞吐量和p50/p99延迟。
+
+用法：
+    python -m benchmarks.bench                      # 默认规模
+    python -m benchmarks.bench --scenarios api_stats,client_ranking --requests 200
+    python -m benchmarks.bench --compare benchmarks/results/<commit>.json
+
+结果默认写入 benchmarks/results/<git提交>.json，便于在不同提交之间比较。
+"""
+import argparse
+import gzip
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_adguard import FakeAdGuardHome  # noqa: E402
+
+
+def percentile(values, pct):
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def git_commit():
+    """当前git提交的短哈希"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+class BenchmarkEnvironment:
+    """基准测试环境：临时数据库、模拟AdGuard Home和已登录的测试客户端"""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix='adghm-bench-')
+        self.fake = FakeAdGuardHome(
+            clients=args.clients,
+            log_lines=args.log_lines,
+            user_rules=args.user_rules,
+            latency=args.latency_ms / 1000
+        )
+        self.app = None
+        self.admin_id = None
+        self.user_id = None
+        self._user_seq = 0
+
+    def setup(self):
+        """启动模拟服务并创建应用和基础数据"""
+        os.environ.setdefault('METRICS_DIR', os.path.join(self.workdir, 'metrics'))
+        # 导出文件写在当前目录下的exports目录中
+        os.chdir(self.workdir)
+
+        from app.config import Config
+        Config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(self.workdir, 'bench.db')
+
+        base_url = self.fake.start()
+
+        from app import create_app, db
+        from app.models import AdGuardConfig, User
+
+        self.app = create_app()
+        with self.app.app_context():
+            config = AdGuardConfig.get_config()
+            config.api_base_url = base_url
+            config.auth_username = 'admin'
+            config.auth_password = 'admin'
+
+            admin = User(username='bench-admin', email='admin@bench.local', is_admin=True)
+            admin.set_password('bench')
+            user = User(username='bench-user', email='user@bench.local')
+            user.password_hash = admin.password_hash
+            db.session.add_all([admin, user])
+            db.session.commit()
+            self.admin_id = admin.id
+            self.user_id = user.id
+            self.password_hash = admin.password_hash
+
+            # 普通用户拥有前几个模拟客户端
+            self.seed_mappings([(user.id, i) for i in range(3)])
+
+    def teardown(self):
+        self.fake.stop()
+
+    @staticmethod
+    def reset_upstream_state():
+        """清除熔断器状态和上游旧数据缓存"""
+        from app.services.adguard_service import AdGuardService
+        from app.utils.circuit_breaker import circuit_breakers
+
+        circuit_breakers.reset()
+        with AdGuardService._last_known_good_lock:
+            AdGuardService._last_known_good.clear()
+
+    def seed_mappings(self, pairs):
+        """批量创建客户端映射
+
+        Args:
+            pairs: (用户ID, 模拟客户端序号) 列表
+        """
+        from app import db
+        from app.models import ClientMapping
+
+        if not pairs:
+            return
+        db.session.execute(ClientMapping.__table__.insert(), [
+            {
+                'user_id': user_id,
+                'client_name': self.fake.client_name(index),
+                'client_ids': json.dumps([self.fake.client_ip(index)])
+            }
+            for user_id, index in pairs
+        ])
+        db.session.commit()
+
+    def seed_users(self, count):
+        """批量创建带客户端映射的普通用户，返回用户ID列表"""
+        from app import db
+        from app.models import User
+
+        start = self._user_seq
+        self._user_seq += count
+        with self.app.app_context():
+            db.session.execute(User.__table__.insert(), [
+                {
+                    'username': f'bench-{i}',
+                    'email': f'bench-{i}@bench.local',
+                    'password_hash': self.password_hash,
+                    'is_admin': False
+                }
+                for i in range(start, start + count)
+            ])
+            db.session.commit()
+            ids = [
+                row[0] for row in db.session.query(User.id)
+                .filter(User.username.in_([f'bench-{i}' for i in range(start, start + count)])).all()
+            ]
+            # 映射到模拟服务中的客户端，删除时会真正调用/clients/delete
+            for offset, user_id in enumerate(ids):
+                index = (start + offset) % max(self.args.clients, 1)
+                name = self.fake.client_name(index)
+                self.fake.clients.setdefault(name, {'name': name, 'ids': [self.fake.client_ip(index)]})
+            self.seed_mappings([
+                (user_id, (start + offset) % max(self.args.clients, 1)) for offset, user_id in enumerate(ids)
+            ])
+        return ids
+
+    def client(self, user_id):
+        """创建以指定用户登录的测试客户端（与浏览器一样接受gzip压缩）"""
+        client = self.app.test_client()
+        if self.args.accept_encoding:
+            client.environ_base['HTTP_ACCEPT_ENCODING'] = self.args.accept_encoding
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+        return client
+
+
+_transfer = threading.local()
+
+
+def _check(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f'HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}')
+    # 记录响应体传输的字节数
+    _transfer.bytes = getattr(_transfer, 'bytes', 0) + len(response.get_data())
+    return response
+
+
+def _json(response):
+    """解析JSON响应（测试客户端不会自动解压）"""
+    data = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        data = gzip.decompress(data)
+    elif response.headers.get('Content-Encoding') == 'br':
+        import brotli
+        data = brotli.decompress(data)
+    return json.loads(data)
+
+
+class ConditionalClient:
+    """像浏览器一样保存ETag并发送If-None-Match的测试客户端"""
+
+    def __init__(self, client):
+        self.client = client
+        self.etags = {}
+
+    def get(self, url):
+        headers = {'If-None-Match': self.etags[url]} if url in self.etags else {}
+        response = self.client.get(url, headers=headers)
+        if response.headers.get('ETag'):
+            self.etags[url] = response.headers['ETag']
+        return response
+
+
+def build_scenarios(env):
+    """构建基准测试场景
+
+    每个场景返回 (准备函数, 单次请求函数)：准备函数在每个工作线程中调用一次，
+    其返回值作为单次请求函数的参数；单次请求函数返回前的准备时间不计入延迟。
+    """
+    args = env.args
+
+    def as_user():
+        return env.client(env.user_id)
+
+    def as_admin():
+        return env.client(env.admin_id)
+
+    def as_anonymous():
+        client = env.app.test_client()
+        if args.accept_encoding:
+            client.environ_base['HTTP_ACCEPT_ENCODING'] = args.accept_encoding
+        return client
+
+    def as_user_conditional():
+        return ConditionalClient(env.client(env.user_id))
+
+    def revalidate(client):
+        # 仪表板轮询的接口组合，第二次起应命中304
+        for url in ('/api/stats', '/api/client_ranking', '/api/blocked_services',
+                    '/api/dns-config', '/api/announcements/active'):
+            _check(client.get(url))
+
+    def marketing_pages(client):
+        # 未登录访客和爬虫访问的宣传页与使用指南
+        for url in ('/', '/about', '/features', '/guide', '/guide/ios-guide', '/pricing'):
+            _check(client.get(url))
+
+    def dashboard(client):
+        _check(client.get('/dashboard'))
+
+    def api_stats(client):
+        _check(client.get('/api/stats'))
+
+    def client_ranking(client):
+        _check(client.get('/api/client_ranking'))
+
+    def adguard_clients(client):
+        _check(client.get('/admin/adguard-clients'))
+
+    def as_admin_warmed():
+        # 先正常访问一次，使服务端保存最近一次成功的数据
+        client = as_admin()
+        _check(client.get('/admin/adguard-clients'))
+        return client
+
+    def outage(client):
+        # AdGuard Home故障期间访问需要上游数据的管理页面
+        env.fake.outage = True
+        try:
+            _check(client.get('/admin/adguard-clients'))
+        finally:
+            env.fake.outage = False
+
+    def admin_users(client):
+        _check(client.get('/admin/users'))
+
+    def query_log_paging(client):
+        # 管理员向后翻5页再逐页返回
+        data = _json(_check(client.get('/admin/query-log/api?page=1')))
+        for _ in range(4):
+            data = _json(_check(client.get(
+                f"/admin/query-log/api?page={data['page'] + 1}&older_than={data['next_older_than']}")))
+        while data['page'] > 1:
+            data = _json(_check(client.get(
+                f"/admin/query-log/api?page={data['page'] - 1}&older_than={data['prev_older_than'] or ''}")))
+
+    def advanced_search(client):
+        # 选择性较高的条件（约2.5%的日志匹配），点击“加载更多”直到显示200条结果
+        rows, older_than = 0, None
+        for _ in range(50):
+            data = _json(_check(client.post('/admin/api/query-log/advanced-search', json={
+                'filters': {'query_type': 'AAAA', 'domain': '*.doubleclick.net'},
+                'page_size': 50,
+                'older_than': older_than
+            })))['data']
+            rows += len(data['data'])
+            older_than = data['oldest']
+            if rows >= 200 or not data['has_more']:
+                break
+
+    def export(_):
+        from app.services.query_log_service import QueryLogService
+        with env.app.app_context():
+            if not QueryLogService().export_logs('csv', {'query_type': 'A'}, max_records=args.export_records):
+                raise RuntimeError('导出失败')
+
+    def bulk_delete(client):
+        user_ids = env.seed_users(args.bulk_size)
+        start = time.perf_counter()
+        _check(client.post('/admin/bulk-delete-users-optimized', json={'user_ids': user_ids}))
+        return time.perf_counter() - start
+
+    import_seq = [0]
+
+    def rewrite_import(client):
+        start = import_seq[0]
+        import_seq[0] += args.import_rules
+        url = f'{env.fake.base_url}/rewrites.txt?start={start}&count={args.import_rules}'
+        _check(client.post('/admin/api/dns-rewrite/import', json={'url': url}))
+
+    return {
+        'dashboard': (as_user, dashboard),
+        'api_stats': (as_user, api_stats),
+        'client_ranking': (as_user, client_ranking),
+        'admin_users': (as_admin, admin_users),
+        'adguard_clients': (as_admin, adguard_clients),
+        'revalidate': (as_user_conditional, revalidate),
+        'marketing_pages': (as_anonymous, marketing_pages),
+        'outage': (as_admin_warmed, outage),
+        'query_log_paging': (as_admin, query_log_paging),
+        'advanced_search': (as_admin, advanced_search),
+        'export': (as_admin, export),
+        'bulk_delete': (as_admin, bulk_delete),
+        'rewrite_import': (as_admin, rewrite_import),
+    }
+
+
+# 这些场景每次执行代价很高，只运行少量轮次
+HEAVY_SCENARIOS = {'export', 'bulk_delete', 'rewrite_import'}
+# 这些场景会切换模拟服务的状态，只能串行执行
+SERIAL_SCENARIOS = {'outage'}
+
+
+def run_scenario(prepare, action, requests, concurrency):
+    """执行一个场景并统计延迟
+
+    Returns:
+        Dict: 请求数、错误数、吞吐量以及延迟分位数（毫秒）
+    """
+    latencies = []
+    errors = []
+
+    transferred = []
+
+    def worker(count):
+        client = prepare()
+        _transfer.bytes = 0
+        for _ in range(count):
+            start = time.perf_counter()
+            try:
+                measured = action(client)
+                latencies.append(measured if measured is not None else time.perf_counter() - start)
+            except Exception as e:
+                errors.append(str(e))
+        transferred.append(_transfer.bytes)
+
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, [count for count in per_worker if count]))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'bytes_per_request': round(sum(transferred) / len(latencies)) if latencies else 0
+    }
+
+
+def print_results(results, baseline=None):
+    """以表格形式输出结果，提供基线时同时输出变化百分比"""
+    header = f"{'scenario':<18}{'reqs':>6}{'err':>5}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}{'bytes':>10}"
+    if baseline:
+        header += f"{'Δp50':>9}{'Δp99':>9}"
+    print(header)
+    print('-' * len(header))
+
+    for name, result in results.items():
+        line = (f"{name:<18}{result['requests']:>6}{result['errors']:>5}"
+                f"{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result.get('bytes_per_request', 0):>10}")
+        base = (baseline or {}).get(name)
+        if base:
+            for key in ('p50_ms', 'p99_ms'):
+                if base[key]:
+                    line += f"{(result[key] - base[key]) / base[key] * 100:>+8.1f}%"
+                else:
+                    line += f"{'n/a':>9}"
+        print(line)
+        if result['first_error']:
+            print(f"    首个错误：{result['first_error']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='ADGHM 端到端基准测试')
+    parser.add_argument('--clients', type=int, default=10000, help='模拟的持久客户端数量')
+    parser.add_argument('--log-lines', type=int, default=1000000, help='模拟的查询日志条数')
+    parser.add_argument('--user-rules', type=int, default=50000, help='模拟的自定义过滤规则条数')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='模拟服务每个请求的延迟（毫秒）')
+    parser.add_argument('--requests', type=int, default=100, help='轻量场景的请求次数')
+    parser.add_argument('--heavy-requests', type=int, default=5, help='导出、批量删除、导入场景的执行次数')
+    parser.add_argument('--concurrency', type=int, default=4, help='并发的测试客户端数量')
+    parser.add_argument('--bulk-size', type=int, default=500, help='每次批量删除的用户数')
+    parser.add_argument('--export-records', type=int, default=5000, help='每次导出的最大记录数')
+    parser.add_argument('--import-rules', type=int, default=1000, help='每次导入的DNS重写规则数')
+    parser.add_argument('--accept-encoding', default='gzip, deflate, br', help='测试客户端发送的Accept-Encoding，空字符串表示不压缩')
+    parser.add_argument('--scenarios', default='', help='逗号分隔的场景名称，默认全部')
+    parser.add_argument('--output', default=None, help='结果JSON文件路径')
+    parser.add_argument('--compare', default=None, help='用于比较的基线结果JSON文件')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = BenchmarkEnvironment(args)
+    print(f'准备基准测试环境（{env.workdir}）...')
+    env.setup()
+
+    try:
+        scenarios = build_scenarios(env)
+        selected = [name.strip() for name in args.scenarios.split(',') if name.strip()] or list(scenarios)
+        unknown = [name for name in selected if name not in scenarios]
+        if unknown:
+            raise SystemExit(f"未知场景：{', '.join(unknown)}（可选：{', '.join(scenarios)}）")
+
+        results = {}
+        for name in selected:
+            prepare, action = scenarios[name]
+            heavy = name in HEAVY_SCENARIOS
+            print(f'运行场景 {name} ...')
+            results[name] = run_scenario(
+                prepare, action,
+                requests=args.heavy_requests if heavy else args.requests,
+                concurrency=1 if heavy or name in SERIAL_SCENARIOS else args.concurrency
+            )
+            # 故障场景会打开熔断器并留下旧数据，场景结束后清除，避免之后的场景测到熔断状态
+            env.reset_upstream_state()
+    finally:
+        env.teardown()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f).get('results')
+
+    print()
+    print_results(results, baseline)
+
+    commit = git_commit()
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results', f'{commit}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({
+            'commit': commit,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+            'upstream_requests': env.fake.request_counts,
+            'results': results
+        }, f, ensure_ascii=False, indent=2)
+    print(f'\n结果已写入 {output}')
+
+
+if __name__ == '__main__':
+    main()
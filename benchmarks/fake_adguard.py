@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+进程内的AdGuard Home模拟服务
+按 openapi/openapi.yaml 中的响应格式实现基准测试用到的 /control 接口，
+支持配置响应延迟和数据规模（客户端数量、查询日志条数、自定义规则条数）。
+
+查询日志按序号即时生成，不会把上百万条日志全部放进内存。
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+QUERY_TYPES = ['A', 'AAAA', 'HTTPS', 'CNAME', 'TXT']
+REASONS = ['NotFilteredNotFound', 'NotFilteredNotFound', 'NotFilteredNotFound', 'FilteredBlackList', 'Rewrite']
+DOMAINS = [
+    'example.com', 'api.github.com', 'doubleclick.net', 'googleads.g.doubleclick.net',
+    'www.baidu.com', 'cdn.jsdelivr.net', 'tracker.example.org', 'time.apple.com'
+]
+
+
+class FakeAdGuardHome:
+    """模拟AdGuard Home API
+
+    Args:
+        clients: 持久客户端数量
+        log_lines: 查询日志总条数
+        user_rules: 自定义过滤规则条数
+        rewrites: DNS重写规则条数
+        latency: 每个请求的额外延迟（秒）
+        log_interval: 相邻两条查询日志的时间间隔（秒）
+    """
+
+    def __init__(self, clients=10000, log_lines=1000000, user_rules=50000,
+                 rewrites=1000, latency=0.0, log_interval=0.05):
+        self.latency = latency
+        self.log_lines = log_lines
+        self.log_interval = log_interval
+        self.newest = datetime.now(timezone.utc).replace(microsecond=0)
+        self.lock = threading.Lock()
+        self.request_counts = {}
+        # 为True时所有 /control/ 接口返回503，用于模拟服务故障
+        self.outage = False
+
+        self.clients = {
+            self.client_name(i): {
+                'name': self.client_name(i),
+                'ids': [self.client_ip(i)],
+                'use_global_settings': True,
+                'filtering_enabled': True,
+                'parental_enabled': False,
+                'safebrowsing_enabled': False,
+                'safesearch_enabled': False,
+                'use_global_blocked_services': True,
+                'blocked_services': [],
+                'upstreams': [],
+                'tags': []
+            }
+            for i in range(clients)
+        }
+        self.user_rules = [f'||blocked-{i}.example.com^' for i in range(user_rules)]
+        self.rewrites = [
+            {'domain': f'host-{i}.lan', 'answer': f'10.1.{i // 256 % 256}.{i % 256}'}
+            for i in range(rewrites)
+        ]
+        self.allowed_clients = [self.client_ip(i) for i in range(clients)]
+        self.blocked_services = [
+            {'id': name, 'name': name.title(), 'icon_svg': '', 'rules': [f'||{name}.com^'], 'group_id': 'social'}
+            for name in ('youtube', 'tiktok', 'facebook', 'twitter', 'bilibili', 'weibo')
+        ]
+        self.blocked_service_ids = []
+
+        self._server = None
+        self._thread = None
+
+    @staticmethod
+    def client_name(index):
+        """第index个客户端的名称"""
+        return f'client-{index}'
+
+    @staticmethod
+    def client_ip(index):
+        """第index个客户端的IP"""
+        return f'10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}'
+
+    # ------------------------------------------------------------------
+    # 服务生命周期
+    # ------------------------------------------------------------------
+
+    def start(self, host='127.0.0.1', port=0):
+        """在后台线程中启动HTTP服务
+
+        Returns:
+            str: 服务的基础URL
+        """
+        self._server = make_server(host, port, self.wsgi_app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        """停止HTTP服务"""
+        if self._server:
+            self._server.shutdown()
+            self._server = None
+
+    @property
+    def base_url(self):
+        return f'http://{self._server.host}:{self._server.port}'
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # 查询日志
+    # ------------------------------------------------------------------
+
+    def log_time(self, index):
+        """第index条日志的时间（序号越大越早）"""
+        return self.newest - timedelta(seconds=index * self.log_interval)
+
+    def log_entry(self, index):
+        """按序号生成一条查询日志"""
+        client_index = index % max(len(self.clients), 1)
+        reason = REASONS[index % len(REASONS)]
+        return {
+            'answer': [],
+            'cached': False,
+            'client': self.client_ip(client_index),
+            'client_info': {'name': self.client_name(client_index), 'whois': {}, 'disallowed': False},
+            'client_proto': '',
+            'elapsedMs': f'{(index % 50) / 10:.1f}',
+            'question': {'class': 'IN', 'name': DOMAINS[index % len(DOMAINS)], 'type': QUERY_TYPES[index % len(QUERY_TYPES)]},
+            'reason': reason,
+            'rules': [{'filter_list_id': 0, 'text': '||doubleclick.net^'}] if reason == 'FilteredBlackList' else [],
+            'status': 'NOERROR',
+            'time': self.log_time(index).isoformat(timespec='milliseconds').replace('+00:00', 'Z'),
+            'upstream': 'https://dns.example:443/dns-query'
+        }
+
+    def first_index_older_than(self, older_than):
+        """计算比older_than更早的第一条日志序号"""
+        if not older_than:
+            return 0
+        moment = datetime.fromisoformat(older_than.replace('Z', '+00:00'))
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        elapsed = (self.newest - moment).total_seconds()
+        index = int(elapsed / self.log_interval)
+        while index < self.log_lines and self.log_time(index) >= moment:
+            index += 1
+        return max(index, 0)
+
+    def query_log(self, args):
+        limit = int(args.get('limit') or 500)
+        search = (args.get('search') or '').strip()
+        status = args.get('response_status') or 'all'
+        index = self.first_index_older_than(args.get('older_than'))
+
+        data = []
+        # 与真实服务一样，过滤条件下也只扫描有限的条数
+        scanned = 0
+        while index < self.log_lines and len(data) < limit and scanned < limit * 20:
+            entry = self.log_entry(index)
+            index += 1
+            scanned += 1
+            if search and search not in entry['question']['name'] and search not in entry['client']:
+                continue
+            if status == 'blocked' and entry['reason'] != 'FilteredBlackList':
+                continue
+            data.append(entry)
+
+        oldest = data[-1]['time'] if data else ''
+        return {'data': data, 'oldest': oldest}
+
+    # ------------------------------------------------------------------
+    # 请求分发
+    # ------------------------------------------------------------------
+
+    def wsgi_app(self, environ, start_response):
+        request = Request(environ)
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            key = f'{request.method} {request.path}'
+            self.request_counts[key] = self.request_counts.get(key, 0) + 1
+
+        if self.outage and request.path.startswith('/control/'):
+            return Response(json.dumps({'message': 'service unavailable'}), status=503,
+                            mimetype='application/json')(environ, start_response)
+
+        try:
+            payload = self.dispatch(request)
+        except KeyError as e:
+            payload = Response(json.dumps({'message': f'not found: {e}'}), status=400, mimetype='application/json')
+
+        if isinstance(payload, Response):
+            return payload(environ, start_response)
+        if isinstance(payload, str):
+            return Response(payload, mimetype='text/plain')(environ, start_response)
+        return Response(json.dumps(payload), mimetype='application/json')(environ, start_response)
+
+    def dispatch(self, request):
+        path = request.path
+        body = request.get_json(silent=True) or {}
+
+        if path == '/rewrites.txt':
+            # 供DNS重写导入使用的外部规则文件
+            start = int(request.args.get('start') or 0)
+            count = int(request.args.get('count') or 1000)
+            return '\n'.join(
+                f'10.2.{i // 256 % 256}.{i % 256} import-{i}.lan' for i in range(start, start + count)
+            )
+
+        if path == '/control/status':
+            return {'version': 'v0.107.0-fake', 'running': True, 'protection_enabled': True,
+                    'dns_addresses': ['127.0.0.1'], 'dns_port': 53, 'http_port': 80}
+        if path == '/control/stats':
+            return self.stats()
+        if path == '/control/querylog':
+            return self.query_log(request.args)
+
+        if path == '/control/clients':
+            return {'clients': list(self.clients.values()), 'auto_clients': [], 'supported_tags': []}
+        if path == '/control/clients/add':
+            self.clients[body['name']] = body
+            return 'OK'
+        if path == '/control/clients/update':
+            data = body.get('data', {})
+            self.clients.pop(body['name'], None)
+            self.clients[data.get('name', body['name'])] = data
+            return 'OK'
+        if path == '/control/clients/delete':
+            if body.get('name') not in self.clients:
+                return Response(json.dumps({'message': 'client not found'}), status=400, mimetype='application/json')
+            del self.clients[body['name']]
+            return 'OK'
+
+        if path == '/control/filtering/status':
+            return {'enabled': True, 'interval': 24, 'filters': [], 'whitelist_filters': [],
+                    'user_rules': self.user_rules}
+        if path == '/control/filtering/set_rules':
+            self.user_rules = list(body.get('rules', []))
+            return 'OK'
+
+        if path == '/control/access/list':
+            return {'allowed_clients': self.allowed_clients, 'disallowed_clients': [], 'blocked_hosts': []}
+        if path == '/control/access/set':
+            self.allowed_clients = list(body.get('allowed_clients', []))
+            return 'OK'
+
+        if path == '/control/rewrite/list':
+            return self.rewrites
+        if path == '/control/rewrite/add':
+            self.rewrites.append({'domain': body['domain'], 'answer': body['answer']})
+            return 'OK'
+        if path == '/control/rewrite/delete':
+            self.rewrites = [r for r in self.rewrites if r != {'domain': body['domain'], 'answer': body['answer']}]
+            return 'OK'
+        if path == '/control/rewrite/update':
+            target, update = body['target'], body['update']
+            self.rewrites = [update if r == target else r for r in self.rewrites]
+            return 'OK'
+
+        if path == '/control/blocked_services/all':
+            return {'blocked_services': self.blocked_services, 'groups': [{'id': 'social'}]}
+        if path == '/control/blocked_services/get':
+            return {'ids': self.blocked_service_ids, 'schedule': {'time_zone': 'Local'}}
+        if path == '/control/blocked_services/update':
+            self.blocked_service_ids = list(body.get('ids', []))
+            return 'OK'
+
+        return Response(json.dumps({'message': 'not found'}), status=404, mimetype='application/json')
+
+    def stats(self):
+        count = len(self.clients)
+        top_clients = [{self.client_ip(i): (count - i) * 10} for i in range(min(count, 100))]
+        return {
+            'time_units': 'hours',
+            'num_dns_queries': self.log_lines,
+            'num_blocked_filtering': self.log_lines // 5,
+            'num_replaced_safebrowsing': 0,
+            'num_replaced_safesearch': 0,
+            'num_replaced_parental': 0,
+            'avg_processing_time': 0.002,
+            'top_queried_domains': [{domain: 1000 - i} for i, domain in enumerate(DOMAINS)],
+            'top_blocked_domains': [{'doubleclick.net': 500}],
+            'top_clients': top_clients,
+            'dns_queries': [self.log_lines // 24] * 24,
+            'blocked_filtering': [self.log_lines // 120] * 24,
+            'replaced_safebrowsing': [0] * 24,
+            'replaced_parental': [0] * 24
+        }
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='启动模拟的AdGuard Home服务')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--log-lines', type=int, default=1000000)
+    parser.add_argument('--user-rules', type=int, default=50000)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    fake = FakeAdGuardHome(clients=args.clients, log_lines=args.log_lines,
+                           user_rules=args.user_rules, latency=args.latency_ms / 1000)
+    print(f' * Fake AdGuard Home running on {fake.start(port=args.port)}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
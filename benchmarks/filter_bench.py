@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+查询日志过滤微基准测试
+用模拟AdGuard Home的日志生成器构造大量日志，测量 AdGuardService._filter_logs
+和 QueryLogService._apply_additional_filters 在几组典型过滤条件下的耗时。
+
+用法：
+    python -m benchmarks.filter_bench                  # 默认100万条日志
+    python -m benchmarks.filter_bench --entries 200000 --repeat 5
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.fake_adguard import FakeAdGuardHome  # noqa: E402
+
+
+def build_logs(count):
+    """生成count条查询日志（时间间隔1秒，从新到旧）"""
+    fake = FakeAdGuardHome(clients=1000, log_lines=count, user_rules=0, rewrites=0, log_interval=1.0)
+    return fake, [fake.log_entry(i) for i in range(count)]
+
+
+def build_cases(fake, count):
+    """典型的过滤条件组合"""
+    start = fake.log_time(count * 3 // 4).isoformat()
+    end = fake.log_time(count // 4).isoformat()
+    return {
+        'time_range': {'start_time': start, 'end_time': end},
+        'type_blocked': {'query_type': 'A', 'blocked': True},
+        'reason_time': {'reason': 'filtered', 'start_time': start, 'end_time': end},
+        'domain_wildcard': {'domain': '*.doubleclick.net'},
+        'combined': {'query_type': 'A', 'start_time': start, 'end_time': end, 'domain': '*.doubleclick.net, *.apple.com'},
+    }
+
+
+def measure(func, repeat):
+    durations = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), len(result)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='查询日志过滤微基准测试')
+    parser.add_argument('--entries', type=int, default=1000000, help='日志条数')
+    parser.add_argument('--repeat', type=int, default=3, help='每组条件重复次数（取中位数）')
+    args = parser.parse_args(argv)
+
+    from app.services.adguard_service import AdGuardService
+    from app.services.query_log_service import QueryLogService
+
+    print(f'生成{args.entries}条日志...')
+    fake, logs = build_logs(args.entries)
+
+    # 过滤方法不依赖上游配置，直接构造不连接服务器的实例
+    adguard = AdGuardService.__new__(AdGuardService)
+    query_log = QueryLogService.__new__(QueryLogService)
+    query_log.logger = logging.getLogger('filter_bench')
+
+    print(f"{'case':<18}{'path':<12}{'matched':>10}{'ms':>10}{'ns/log':>10}")
+    print('-' * 60)
+    for name, filters in build_cases(fake, args.entries).items():
+        for path, func in (
+            ('adguard', lambda: adguard._filter_logs(logs, filters)),
+            ('query_log', lambda: query_log._apply_additional_filters(logs, filters)),
+        ):
+            try:
+                seconds, matched = measure(func, args.repeat)
+            except Exception as e:
+                print(f'{name:<18}{path:<12}{"error":>10}  {e}')
+                continue
+            print(f'{name:<18}{path:<12}{matched:>10}{seconds * 1000:>10.1f}{seconds * 1e9 / args.entries:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""gunicorn 配置
+
+用法：gunicorn -c gunicorn.conf.py wsgi:app
+可通过环境变量调整监听地址、工作进程数和线程数。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('ADGHM_BIND', '0.0.0.0:80')
+workers = int(os.environ.get('ADGHM_WORKERS') or min(multiprocessing.cpu_count() * 2 + 1, 8))
+threads = int(os.environ.get('ADGHM_THREADS') or 4)
+timeout = int(os.environ.get('ADGHM_TIMEOUT') or 120)
+# 在主进程中加载应用，建表和配置版本初始化只执行一次
+preload_app = True
+
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    """工作进程fork之后：丢弃从主进程继承的数据库连接，并参与定时任务主进程选举"""
+    from app import db, start_scheduler_leader
+    from wsgi import app
+
+    with app.app_context():
+        db.engine.dispose()
+    start_scheduler_leader(app)
+
+
+def worker_exit(server, worker):
+    """工作进程退出前写入缓冲区中剩余的操作日志"""
+    from app.utils.audit_log import audit_log
+
+    audit_log.flush()
@@ -4,10 +4,10 @@ from app import create_app
 class APILogFilter(logging.Filter):
     """过滤特定API请求的日志"""
     def filter(self, record):
-        # 过滤掉 /api/stats 和 /api/client_ranking 的请求日志
+        # 过滤掉 /api/stats、/api/client_ranking 和 /metrics 的请求日志
         if hasattr(record, 'getMessage'):
             message = record.getMessage()
-            if '/api/stats' in message or '/api/client_ranking' in message:
+            if '/api/stats' in message or '/api/client_ranking' in message or '/metrics' in message:
                 return False
         return True
 
@@ -0,0 +1,9 @@
+"""生产环境WSGI入口
+
+配合 gunicorn 使用：gunicorn -c gunicorn.conf.py wsgi:app
+应用在主进程中预加载（只执行一次建表），定时任务在工作进程fork之后通过选举启动，
+保证多个工作进程中只有一个运行定时任务。
+"""
+from app import create_app
+
+app = create_app(start_scheduler=False)